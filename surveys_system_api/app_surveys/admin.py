@@ -1,25 +1,150 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from app_surveys import sharding
+from app_surveys.db_routers import answer_shards, shard_for_survey
 from app_surveys.models import Survey, Question, Choice, Answer
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц: в PostgreSQL количество строк берется из оценки планировщика
+    (pg_class.reltuples без фильтров, EXPLAIN с фильтрами) вместо точного COUNT(*) по всей таблице.
+    Если оценка меньше ADMIN_ESTIMATED_COUNT_THRESHOLD, выполняется точный подсчет.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self._estimate()
+        if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100_000):
+            return estimate
+        return super().count
+
+    def _estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Базовый класс админки больших таблиц: оценка количества строк и без повторного полного подсчета."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class SurveyFilter(admin.SimpleListFilter):
+    """Фильтр по опросу: только последние по дате окончания опросы (выборка по индексу survey_active_window_idx)."""
+    title = 'опрос'
+    parameter_name = 'survey'
+    survey_lookup = 'survey_id'
+    limit = 50
+
+    def lookups(self, request, model_admin):
+        return Survey.objects.order_by('-date_end').values_list('id', 'title')[:self.limit]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(**{self.survey_lookup: self.value()})
+        return queryset
+
+
 class SurveyAdmin(admin.ModelAdmin):
     list_display = ('title', 'date_start', 'date_end')
+    list_filter = (('date_end', admin.DateFieldListFilter),)
 
 
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(LargeTableAdmin):
     list_display = ('question_text', 'question_type', 'survey')
+    list_select_related = ('survey',)
+    list_filter = ('question_type', SurveyFilter)
+    raw_id_fields = ('survey',)
 
 
-class ChoiceAdmin(admin.ModelAdmin):
+class ChoiceAdmin(LargeTableAdmin):
     list_display = ('question', 'choice_text')
+    list_select_related = ('question',)
+    raw_id_fields = ('question',)
 
 
-class AnswerAdmin(admin.ModelAdmin):
-    list_display = ('user', 'question', 'choice', 'answer_text')
+class AnswerShardFilter(admin.SimpleListFilter):
+    """Фильтр по шарду ответов (при шардировании): список читается из одной базы, см. AnswerAdmin.get_queryset."""
+    title = 'шард'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in answer_shards()]
+
+    def queryset(self, request, queryset):
+        return queryset
+
+
+class AnswerAdmin(LargeTableAdmin):
+    """
+    Админка ответов. При шардировании список читается из шарда выбранного опроса или из шарда, выбранного
+    фильтром (по умолчанию - из первого): соединения с опросами и вопросами в шарде невозможны, поэтому
+    фильтры по ним отключаются, а связанные объекты загружаются из основной базы отдельными запросами.
+    """
+    list_display = ('user', 'question', 'choice', 'choices', 'answer_text')
+    list_select_related = ('user', 'question', 'choice')
+    list_filter = (SurveyFilter, 'question__question_type',
+                   ('survey__date_end', admin.DateFieldListFilter))
+    raw_id_fields = ('user', 'question', 'choice')
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not answer_shards():
+            return queryset
+        return queryset.using(self._shard(request)).prefetch_related(*self.list_select_related)
+
+    @staticmethod
+    def _shard(request):
+        survey_id = request.GET.get(SurveyFilter.parameter_name, '')
+        if survey_id.isdigit():
+            return shard_for_survey(int(survey_id))
+        shard = request.GET.get(AnswerShardFilter.parameter_name)
+        return shard if shard in answer_shards() else answer_shards()[0]
+
+    def get_list_select_related(self, request):
+        return () if answer_shards() else super().get_list_select_related(request)
+
+    def get_list_filter(self, request):
+        return (AnswerShardFilter, SurveyFilter) if answer_shards() else super().get_list_filter(request)
+
+    def get_object(self, request, object_id, from_field=None):
+        if not answer_shards():
+            return super().get_object(request, object_id, from_field)
+        # ID не указывает на шард (ответы переносятся между шардами с сохранением ID), поэтому ответ ищется во всех
+        field = self.model._meta.pk if from_field is None else self.model._meta.get_field(from_field)
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        for answers in sharding.scatter(super().get_queryset(request)):
+            answer = answers.filter(**{field.name: object_id}).first()
+            if answer is not None:
+                return answer
+        return None
 
 
 admin.site.register(Survey, SurveyAdmin)
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(Choice, ChoiceAdmin)
 admin.site.register(Answer, AnswerAdmin)
-
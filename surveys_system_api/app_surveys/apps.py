@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AppSurveysConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_surveys'
+
+    def ready(self):
+        from app_surveys import sharding, signals  # noqa: F401
+        post_migrate.connect(sharding.reserve_ids, sender=self)
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from app_surveys import sharding
+from app_surveys.db_routers import answer_shards
+from app_surveys.models import Answer, ArchivedAnswer, Survey
+
+# Поля, переносимые между основной таблицей ответов и архивом (ID сохраняется)
+COLUMNS = ('id', 'user_id', 'question_id', 'survey_id', 'choice_id', 'answer_text', 'choices', 'respondent',
+           'created_at')
+
+
+def surveys_to_archive(after_days, now=None):
+    """Опросы, завершенные больше after_days дней назад, у которых остались ответы в основной таблице."""
+    if now is None:
+        now = timezone.now()
+    ended = Survey.objects.filter(date_end__lt=now - timedelta(days=after_days))
+    if not answer_shards():
+        return ended.filter(Exists(Answer.objects.filter(survey_id=OuterRef('pk'))))
+    # ответы лежат в шардах: опросы с ответами ищутся в шарде каждого опроса пачками ID
+    survey_ids = []
+    for using, ids in sharding.split(list(ended.values_list('id', flat=True)), lambda survey_id: survey_id).items():
+        for start in range(0, len(ids), sharding.BATCH_SIZE):
+            survey_ids.extend(Answer.objects.using(using).filter(survey_id__in=ids[start:start + sharding.BATCH_SIZE])
+                              .values_list('survey_id', flat=True).distinct())
+    return ended.filter(id__in=survey_ids)
+
+
+def _move(source, target, survey_id, batch_size):
+    """
+    Переносит строки ответов опроса из таблицы source в target пачками по batch_size:
+    INSERT ... SELECT и DELETE в одной транзакции на пачку. Сигналы не отправляются,
+    поскольку результаты опроса (счетчики, частоты слов, индексы) при переносе не меняются.
+    Архив опроса хранится в том же шарде, что и его ответы.
+    """
+    using = sharding.db_for_survey(survey_id)
+    columns = ', '.join(COLUMNS)
+    moved = 0
+    while True:
+        ids = list(source.objects.using(using).filter(survey_id=survey_id)
+                   .order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return moved
+        placeholders = ', '.join(['%s'] * len(ids))
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {target._meta.db_table} ({columns}) '
+                f'SELECT {columns} FROM {source._meta.db_table} WHERE id IN ({placeholders})', ids)
+            cursor.execute(f'DELETE FROM {source._meta.db_table} WHERE id IN ({placeholders})', ids)
+        moved += len(ids)
+
+
+def archive_survey(survey_id, batch_size=1000):
+    """Переносит ответы опроса в архив. Возвращает количество перенесенных ответов."""
+    return _move(Answer, ArchivedAnswer, survey_id, batch_size)
+
+
+def restore_survey(survey_id, batch_size=1000):
+    """Возвращает ответы опроса из архива в основную таблицу (например, если опрос продлили)."""
+    return _move(ArchivedAnswer, Answer, survey_id, batch_size)
+
+
+def survey_answers(survey_id):
+    """Ответы опроса из основной таблицы и архива (в шарде опроса) - для чтения результатов."""
+    return [sharding.for_survey(model.objects.filter(survey_id=survey_id), survey_id)
+            for model in (Answer, ArchivedAnswer)]
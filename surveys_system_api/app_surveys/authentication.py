@@ -0,0 +1,66 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from rest_framework import authentication, exceptions, permissions
+
+RESPONDENT_HEADER = 'HTTP_X_RESPONDENT_TOKEN'
+RESPONDENT_SALT = 'app_surveys.respondent'
+
+
+class Respondent:
+    """Анонимный респондент, определяемый только подписанным токеном (без сессии и строки в базе данных)."""
+
+    def __init__(self, respondent_id):
+        self.id = respondent_id
+
+    def __eq__(self, other):
+        return isinstance(other, Respondent) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+def make_respondent_token(respondent_id=None):
+    """Подписанный токен нового (или указанного) анонимного респондента."""
+    respondent_id = respondent_id or uuid.uuid4()
+    return signing.TimestampSigner(salt=RESPONDENT_SALT).sign(respondent_id.hex)
+
+
+def parse_respondent_token(token):
+    """Респондент из токена; signing.BadSignature, если токен поддельный или просрочен."""
+    value = signing.TimestampSigner(salt=RESPONDENT_SALT).unsign(
+        token, max_age=getattr(settings, 'RESPONDENT_TOKEN_MAX_AGE', 30 * 24 * 3600))
+    try:
+        return Respondent(uuid.UUID(hex=value))
+    except ValueError:
+        raise signing.BadSignature('Некорректный идентификатор респондента')
+
+
+def get_respondent(request):
+    """Анонимный респондент запроса DRF или None."""
+    return request.auth if isinstance(request.auth, Respondent) else None
+
+
+class RespondentTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Аутентификация анонимного респондента по заголовку X-Respondent-Token. Пользователь остается анонимным,
+    а request.auth содержит Respondent: проверка подписи не обращается ни к базе данных, ни к сессиям.
+    """
+
+    def authenticate(self, request):
+        token = request.META.get(RESPONDENT_HEADER)
+        if not token:
+            return None
+        try:
+            return AnonymousUser(), parse_respondent_token(token)
+        except signing.BadSignature:
+            raise exceptions.AuthenticationFailed('Недействительный токен респондента.')
+
+
+class IsAuthenticatedOrRespondent(permissions.BasePermission):
+    """Доступ для аутентифицированных пользователей и анонимных респондентов с токеном."""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated) or get_respondent(request) is not None
@@ -0,0 +1,93 @@
+import json
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework import permissions
+from rest_framework.response import Response
+
+from app_surveys import sharding
+
+# Заголовки и параметры окружения, переносимые из пакетного запроса во вложенные
+_INHERITED_META = ('SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'REMOTE_ADDR')
+
+
+def _error(status_code, detail):
+    return {'status': status_code, 'body': {'detail': detail}}
+
+
+def _sub_request(request, method, path, body):
+    """
+    Вложенный запрос с заголовками пакетного. Пользователь уже аутентифицирован пакетным запросом
+    и передается во вложенный без повторной проверки (как при принудительной аутентификации DRF).
+    """
+    url = urlsplit(path)
+    content = json.dumps(body).encode() if body is not None else b''
+    environ = {key: value for key, value in request.META.items()
+               if key.startswith('HTTP_') or key in _INHERITED_META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': BytesIO(content),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub_request = WSGIRequest(environ)
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def _body(response):
+    if isinstance(response, Response):
+        return response.data
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content) if response.content else None
+    return response.content.decode(response.charset)
+
+
+def _run_one(request, prefix, item, use_primary):
+    path = item['path']
+    if not path.startswith(prefix):
+        return _error(400, f'Путь должен начинаться с {prefix}')
+    sub_request = _sub_request(request, item['method'], path, item.get('body'))
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        return _error(404, 'Страница не найдена.')
+    if match.url_name == 'batch':
+        return _error(400, 'Вложенные пакетные запросы не поддерживаются.')
+    sub_request.use_primary = use_primary
+    response = match.func(sub_request, *match.args, **match.kwargs)
+    if response.streaming:
+        return _error(400, 'Потоковые ответы в пакетном запросе не поддерживаются.')
+    return {'status': response.status_code, 'body': _body(response)}
+
+
+def run_batch(request, items, prefix, atomic=False):
+    """
+    Выполняет вложенные запросы к API в текущем процессе по порядку. При atomic=True все запросы выполняются
+    в одной транзакции (в основной базе и шардах ответов): первый ответ с ошибкой (статус >= 400) прекращает
+    выполнение и откатывает изменения предыдущих запросов. Возвращает (ответы, откачена ли транзакция).
+    """
+    # после записи в пакете чтения идут в основную базу, чтобы видеть только что сохраненные данные
+    use_primary = atomic or any(item['method'] not in permissions.SAFE_METHODS for item in items)
+    if not atomic:
+        return [_run_one(request, prefix, item, use_primary) for item in items], False
+
+    responses = []
+    # вложенные запросы могут писать ответы в шарды разных опросов, поэтому транзакция открывается во всех базах
+    with sharding.atomic() as databases:
+        for item in items:
+            responses.append(_run_one(request, prefix, item, use_primary))
+            if responses[-1]['status'] >= 400:
+                for using in databases:
+                    transaction.set_rollback(True, using=using)
+                return responses, True
+    return responses, False
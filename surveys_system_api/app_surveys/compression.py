@@ -0,0 +1,129 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli ответы сжимаются только gzip
+    brotli = None
+
+# Уровни сжатия ответов, сжимаемых на каждый запрос: компромисс между размером и временем процессора
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Ответы, кэшируемые вне обработки запроса (прогрев), сжимаются один раз, поэтому максимальными уровнями
+CACHED_GZIP_LEVEL = 9
+CACHED_BROTLI_QUALITY = 11
+
+# Сжимаются только ответы API. HTML-страницы (админка, Browsable API, Swagger UI) содержат CSRF-токен рядом
+# с отражаемыми данными запроса, и их сжатие открывает атаку BREACH
+COMPRESSIBLE_TYPES = ('application/json', 'application/openapi+json')
+_accept_encoding_re = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Лучшее из поддерживаемых сжатий по заголовку Accept-Encoding (None - без сжатия)."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        match = _accept_encoding_re.fullmatch(part)
+        if match is None:
+            continue
+        try:
+            weights[match[1].lower()] = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+    best, best_weight = None, 0
+    for encoding in available_encodings():
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(content, encoding, cached=False):
+    if encoding == 'br':
+        return brotli.compress(content, quality=CACHED_BROTLI_QUALITY if cached else BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=CACHED_GZIP_LEVEL if cached else GZIP_LEVEL, mtime=0)
+
+
+def precompress(content, best=False):
+    """
+    Тело ответа и его сжатые варианты {кодировка: байты} для хранения в кэше. Максимальные уровни (best)
+    в десятки раз медленнее, поэтому используются только вне обработки запроса.
+    """
+    payloads = {'identity': content}
+    for encoding in available_encodings():
+        payloads[encoding] = compress(content, encoding, cached=best)
+    return payloads
+
+
+class CompressionMiddleware:
+    """
+    Middleware сжатия ответов gzip или brotli по заголовку Accept-Encoding. Если у ответа есть атрибут
+    precompressed {кодировка: байты}, используются готовые сжатые байты. Потоковые ответы (в том числе SSE)
+    и небольшие ответы не сжимаются. Ответы, устанавливающие CSRF-cookie, не сжимаются ни при каком типе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if settings.CSRF_COOKIE_NAME in response.cookies:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        precompressed = getattr(response, 'precompressed', None) or {}
+        content = precompressed.get(encoding)
+        if content is None:
+            if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 500):
+                return response
+            content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # сжатое представление не совпадает побайтно с исходным
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+def _definition_key(survey_id):
+    return f'survey-definition:{survey_id}'
+
+
+def _definitions_cache():
+    # общий для процессов кэш: иначе сброс после изменения опроса дошел бы только до обработавшего его процесса
+    return caches[getattr(settings, 'SHARED_CACHE', 'default')]
+
+
+def get_survey_definition(survey_id):
+    """Закэшированное описание опроса {кодировка: байты} или None."""
+    return _definitions_cache().get(_definition_key(survey_id))
+
+
+def store_survey_definition(survey_id, content, best=False):
+    payloads = precompress(content, best)
+    _definitions_cache().set(_definition_key(survey_id), payloads, getattr(settings, 'SURVEY_CACHE_SECONDS', 300))
+    return payloads
+
+
+def invalidate_survey_definition(survey_id):
+    _definitions_cache().delete(_definition_key(survey_id))
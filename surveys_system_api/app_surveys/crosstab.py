@@ -0,0 +1,196 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from app_surveys import archive
+from app_surveys.models import Answer, Choice, Question
+
+
+def _bitset(positions):
+    """Собирает множество номеров респондентов в битовую маску (бит N установлен, если номер N в множестве)."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    bits = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def respondent_key(user_id, respondent):
+    """
+    Респондент ответа, как его считают итоги опроса (app_surveys.results): пользователь или анонимный
+    респондент с токеном. Для анонимного ответа без токена - None: такой ответ не связать с другими ответами
+    того же человека, поэтому в таблицы сопряженности он не попадает.
+    """
+    if user_id is not None:
+        return user_id
+    if respondent is None:
+        return None
+    # у сохраняемого ответа респондент может быть строкой, в выборках из базы данных - UUID
+    return respondent if isinstance(respondent, uuid.UUID) else uuid.UUID(str(respondent))
+
+
+class SurveyIndex:
+    """
+    Индекс респондентов опроса: для каждого варианта ответа - битовая маска респондентов, выбравших его.
+    Для текстовых вопросов вариант равен None. Респонденты (пользователи и анонимные респонденты с токеном)
+    нумеруются в порядке появления, номер задает бит в масках.
+    """
+
+    def __init__(self, survey_id, questions, respondents, positions):
+        self.survey_id = survey_id
+        # {question_id: [choice_id, ...]} в порядке вариантов
+        self.questions = questions
+        # {(question_id, choice_id): битовая маска респондентов}
+        self.respondents = respondents
+        # {респондент (respondent_key): номер бита}
+        self.positions = positions
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, survey_id):
+        questions = {question_id: [None] if question_type == 'text' else []
+                     for question_id, question_type in Question.objects.filter(survey_id=survey_id)
+                     .values_list('id', 'question_type').order_by('id')}
+        for question_id, choice_id in (Choice.objects.filter(question__survey_id=survey_id)
+                                       .values_list('question_id', 'id').order_by('id')):
+            questions[question_id].append(choice_id)
+
+        positions, members = {}, defaultdict(list)
+        for answers in archive.survey_answers(survey_id):
+            rows = (answers.exclude(user__isnull=True, respondent__isnull=True)
+                    .values_list('question_id', 'choice_id', 'choices', 'user_id', 'respondent')
+                    .order_by().iterator(chunk_size=10000))
+            for question_id, choice_id, choices, user_id, respondent in rows:
+                position = positions.setdefault(respondent_key(user_id, respondent), len(positions))
+                for key in Answer.choice_keys(choice_id, choices):
+                    members[(question_id, key)].append(position)
+        respondents = {key: _bitset(key_positions) for key, key_positions in members.items()}
+        return cls(survey_id, questions, respondents, positions)
+
+    def apply(self, question_id, choice_id, respondent, delta):
+        """Инкрементально добавляет (delta > 0) или убирает (delta < 0) ответ респондента (respondent_key)."""
+        key = (question_id, choice_id)
+        with self._lock:
+            position = self.positions.setdefault(respondent, len(self.positions))
+            bits = self.respondents.get(key, 0)
+            if delta > 0:
+                bits |= 1 << position
+            else:
+                bits &= ~(1 << position)
+            self.respondents[key] = bits
+
+    def question_respondents(self, question_id):
+        """Маска респондентов, ответивших на вопрос хотя бы одним вариантом."""
+        bits = 0
+        for choice_id in self.questions[question_id]:
+            bits |= self.respondents.get((question_id, choice_id), 0)
+        return bits
+
+    def distribution(self, question_id, given=-1):
+        """
+        Распределение ответов на вопрос среди респондентов из маски given (по умолчанию - все респонденты).
+        Возвращает [(choice_id, количество), ...].
+        """
+        return [(choice_id, (self.respondents.get((question_id, choice_id), 0) & given).bit_count())
+                for choice_id in self.questions[question_id]]
+
+    def crosstab(self, row_question_id, column_question_id, given=-1):
+        """Таблица сопряженности: для каждого варианта первого вопроса - распределение ответов на второй."""
+        rows = []
+        for choice_id in self.questions[row_question_id]:
+            row_bits = self.respondents.get((row_question_id, choice_id), 0) & given
+            rows.append((choice_id, row_bits.bit_count(), self.distribution(column_question_id, row_bits)))
+        both = self.question_respondents(row_question_id) & self.question_respondents(column_question_id) & given
+        return both.bit_count(), rows
+
+
+class IndexRegistry:
+    """
+    Индексы опросов процесса: строятся при первом обращении, обновляются инкрементально при сохранении ответов
+    в этом процессе и перестраиваются не реже, чем раз в CROSSTAB_INDEX_TTL секунд (изменения из других процессов).
+    Индекс опроса строит один поток: при первом обращении остальные потоки ждут его, а устаревший индекс
+    перестраивается в фоне и отдается, пока новый не готов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        # индексы, которые сейчас строятся: {survey_id: threading.Event}
+        self._building = {}
+
+    def get(self, survey_id):
+        ttl = getattr(settings, 'CROSSTAB_INDEX_TTL', 60)
+        with self._lock:
+            index = self._indexes.get(survey_id)
+            if index is not None:
+                self._indexes.move_to_end(survey_id)
+                if time.monotonic() - index.built_at < ttl or survey_id in self._building:
+                    return index
+            building = self._building.get(survey_id)
+            started = building is None
+            if started:
+                building = self._building[survey_id] = threading.Event()
+        if index is not None:
+            threading.Thread(target=self._rebuild, args=(survey_id, building), daemon=True).start()
+            return index
+        if started:
+            return self._build(survey_id, building)
+        building.wait()
+        # индекс сброшен во время построения или построение завершилось ошибкой
+        return self.peek(survey_id) or SurveyIndex.build(survey_id)
+
+    def _build(self, survey_id, building):
+        """Строит индекс и сохраняет его, если за время построения индекс опроса не сбрасывали."""
+        try:
+            index = SurveyIndex.build(survey_id)
+            with self._lock:
+                if self._building.get(survey_id) is building:
+                    self._indexes[survey_id] = index
+                    self._indexes.move_to_end(survey_id)
+                    while len(self._indexes) > getattr(settings, 'CROSSTAB_INDEX_MAX_SURVEYS', 100):
+                        self._indexes.popitem(last=False)
+            return index
+        finally:
+            with self._lock:
+                if self._building.get(survey_id) is building:
+                    del self._building[survey_id]
+            building.set()
+
+    def _rebuild(self, survey_id, building):
+        try:
+            self._build(survey_id, building)
+        finally:
+            # соединения с базой данных принадлежат потоку и иначе остались бы открытыми
+            connections.close_all()
+
+    def peek(self, survey_id):
+        with self._lock:
+            return self._indexes.get(survey_id)
+
+    def apply(self, survey_id, question_id, choice_id, respondent, delta):
+        """Применяет изменение ответа респондента (respondent_key) к индексу опроса, если он уже построен."""
+        if respondent is None:
+            return
+        index = self.peek(survey_id)
+        if index is not None:
+            index.apply(question_id, choice_id, respondent, delta)
+
+    def invalidate(self, survey_id):
+        with self._lock:
+            self._indexes.pop(survey_id, None)
+            self._building.pop(survey_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._building.clear()
+
+
+registry = IndexRegistry()
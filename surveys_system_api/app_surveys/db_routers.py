@@ -0,0 +1,173 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import permissions
+
+from app_surveys.authentication import get_respondent
+
+APP_LABEL = 'app_surveys'
+PRIMARY_DB = 'default'
+# Модели, строки которых при шардировании хранятся в шарде своего опроса
+SHARDED_MODELS = ('answer', 'archivedanswer', 'answerrollup')
+
+_use_primary = ContextVar('use_primary', default=False)
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+@contextmanager
+def request_scope():
+    """Изолирует выбор базы данных в пределах одного запроса."""
+    token = _use_primary.set(False)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Направляет все чтения внутри блока в основную базу данных."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+def _shared_cache():
+    # следующий запрос пользователя может обработать другой процесс, поэтому кэш процесса не подходит
+    return caches[getattr(settings, 'SHARED_CACHE', 'default')]
+
+
+def pin_user(user_id):
+    """Закрепляет пользователя за основной базой на REPLICA_PIN_SECONDS после записи."""
+    _shared_cache().set(_pin_key(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    return bool(_shared_cache().get(_pin_key(user_id)))
+
+
+def answer_shards():
+    """Алиасы шардов ответов из settings.ANSWER_SHARDS; пустой список - ответы не шардируются."""
+    return getattr(settings, 'ANSWER_SHARDS', [])
+
+
+def shard_for_survey(survey_id):
+    """
+    Шард ответов опроса по рандеву-хешированию: у каждой пары (шард, опрос) свой вес, опрос достается шарду
+    с наибольшим весом. При добавлении шарда переезжают только ответы опросов, доставшихся новому шарду.
+    """
+    return max(answer_shards(), key=lambda alias: hashlib.blake2b(f'{alias}:{survey_id}'.encode(), digest_size=8)
+               .digest())
+
+
+def is_sharded(model):
+    return model._meta.app_label == APP_LABEL and model._meta.model_name in SHARDED_MODELS
+
+
+def _survey_id(instance):
+    """Опрос объекта-подсказки роутера: ответа, опроса, вопроса или варианта ответа."""
+    model_name = instance._meta.model_name
+    if model_name == 'survey':
+        return instance.pk
+    if model_name == 'choice':
+        return instance.question.survey_id
+    return getattr(instance, 'survey_id', None)
+
+
+class AnswerShardRouter:
+    """
+    Роутер шардов ответов (включается непустым settings.ANSWER_SHARDS): ответы и архивные ответы хранятся
+    в шарде своего опроса. Запись и чтение с подсказкой instance (ответ, опрос, вопрос, вариант) направляются
+    в шард опроса; чтения без подсказки решает следующий роутер, поэтому выборки ответов опроса строятся
+    через app_surveys.sharding. Связанные с ответом из шарда объекты других приложений (пользователь)
+    читаются из основной базы.
+    """
+
+    def _db(self, model, hints):
+        if not answer_shards():
+            return None
+        instance = hints.get('instance')
+        if is_sharded(model):
+            survey_id = _survey_id(instance) if instance is not None else None
+            return shard_for_survey(survey_id) if survey_id is not None else None
+        if instance is not None and is_sharded(type(instance)) and model._meta.app_label != APP_LABEL:
+            return PRIMARY_DB
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+
+class PrimaryReplicaRouter:
+    """
+    Роутер баз данных: записи идут в основную базу, чтения моделей приложения - в одну из реплик
+    из settings.DATABASE_REPLICAS, если запрос не закреплен за основной базой.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if _use_primary.get() or not replicas:
+            return PRIMARY_DB
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryPinningMixin:
+    """
+    Миксин для ViewSet: запросы на запись и чтения пользователя в течение короткого окна после его записи
+    выполняются на основной базе, чтобы пользователь всегда видел свои только что сохраненные данные.
+    Вложенные запросы пакета с записью помечаются атрибутом use_primary.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with request_scope():
+            return super().dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def _pin_subject(request):
+        """Кого закреплять за основной базой: пользователя или анонимного респондента с токеном."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.pk
+        respondent = get_respondent(request)
+        return f'respondent:{respondent.id}' if respondent is not None else None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        subject = self._pin_subject(request)
+        if (request.method not in permissions.SAFE_METHODS or getattr(request, 'use_primary', False)
+                or (subject is not None and is_pinned(subject))):
+            _use_primary.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in permissions.SAFE_METHODS and response.status_code < 400:
+            subject = self._pin_subject(request)
+            if subject is not None:
+                pin_user(subject)
+        return response
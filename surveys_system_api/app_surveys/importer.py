@@ -0,0 +1,313 @@
+import csv
+import io
+import json
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app_surveys import search, sharding, timeline
+from app_surveys.models import Answer, Choice, ImportCheckpoint, Question, Survey
+
+RECORD_TYPES = ('survey', 'question', 'choice', 'answer')
+QUESTION_TYPES = {code for code, _ in Question.CHOICES}
+# Столбцы, загружаемые командой COPY в таблицу ответов
+ANSWER_COLUMNS = ('user_id', 'question_id', 'survey_id', 'choice_id', 'answer_text', 'choices', 'created_at')
+MAX_REPORTED_ERRORS = 100
+
+
+class RecordError(Exception):
+    """Ошибка в записи импортируемого файла."""
+
+
+def read_records(path, skip=0):
+    """
+    Потоково читает записи из файла JSON Lines (одна запись на строку) или CSV с заголовком.
+    Возвращает пары (номер записи, словарь); первые skip записей пропускаются.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith('.csv'):
+            rows = (_from_csv(row) for row in csv.DictReader(file))
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for number, record in enumerate(rows, start=1):
+            if number > skip:
+                yield number, record
+
+
+def _from_csv(row):
+    record = {key: value if value != '' else None for key, value in row.items()}
+    if record.get('choices'):
+        record['choices'] = record['choices'].split('|')
+    return record
+
+
+def _text(record, field, required=True, max_length=200):
+    value = record.get(field)
+    if value is None or value == '':
+        if required:
+            raise RecordError(f'не заполнено поле {field}')
+        return None
+    value = str(value)
+    if len(value) > max_length:
+        raise RecordError(f'поле {field} длиннее {max_length} символов')
+    return value
+
+
+def _datetime(record, field, required=True):
+    value = record.get(field)
+    if not value:
+        if required:
+            raise RecordError(f'не заполнено поле {field}')
+        return None
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise RecordError(f'некорректная дата в поле {field}: {value}')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class SurveyImporter:
+    """
+    Импорт опросов, вопросов, вариантов и ответов пачками. Записи ссылаются друг на друга внешними ID
+    исходной системы; соответствие внешних ID новым хранится для опросов, вопросов и вариантов
+    (ответы не запоминаются, поэтому память не зависит от их количества). Родительские записи
+    должны идти в файле раньше дочерних.
+
+    Как и при ответе через API, пользователь отвечает на вопрос один раз: ответ, повторяющий уже сохраненный
+    (или другой ответ той же пачки), считается некорректной записью. С checkpoint состояние импорта
+    сохраняется в той же транзакции, что и пачка.
+    """
+
+    def __init__(self, batch_size=5000, using=None, checkpoint=None):
+        self.batch_size = batch_size
+        self.using = using or router.db_for_write(Answer)
+        self.checkpoint = checkpoint
+        self.surveys, self.questions, self.choices = {}, {}, {}
+        self.question_types = {}
+        self.question_surveys = {}
+        self.choice_questions = {}
+        self.loaded = Counter()
+        # хранятся только первые MAX_REPORTED_ERRORS ошибок, остальные лишь подсчитываются
+        self.errors = []
+        self.error_count = 0
+
+    def _error(self, position, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((position, message))
+
+    # состояние для возобновления импорта
+
+    def state(self, position):
+        return {'position': position, 'surveys': self.surveys, 'questions': self.questions, 'choices': self.choices,
+                'question_types': self.question_types, 'question_surveys': self.question_surveys,
+                'choice_questions': self.choice_questions,
+                'loaded': dict(self.loaded), 'error_count': self.error_count}
+
+    def restore(self, state):
+        self.surveys, self.questions, self.choices = state['surveys'], state['questions'], state['choices']
+        self.question_types = state['question_types']
+        self.question_surveys = state['question_surveys']
+        self.choice_questions = {int(key): value for key, value in state['choice_questions'].items()}
+        self.loaded = Counter(state['loaded'])
+        self.error_count = state['error_count']
+        return state['position']
+
+    def run(self, records, on_batch=None):
+        """Загружает записи пачками; после фиксации каждой пачки вызывает on_batch(номер последней записи)."""
+        batch, position = [], 0
+        for position, record in records:
+            batch.append((position, record))
+            if len(batch) >= self.batch_size:
+                self._flush(batch, position)
+                batch = []
+                if on_batch:
+                    on_batch(position)
+        if batch:
+            self._flush(batch, position)
+            if on_batch:
+                on_batch(position)
+
+    def _flush(self, batch, position):
+        by_type = defaultdict(list)
+        for position, record in batch:
+            record_type = record.get('type')
+            if record_type not in RECORD_TYPES:
+                self._error(position, f'неизвестный тип записи: {record_type}')
+                continue
+            by_type[record_type].append((position, record))
+        # при сбое между фиксациями шардов и основной базы контрольная точка не сдвигается,
+        # а повторно загружаемые ответы пользователей отсекаются проверкой на повторный ответ
+        with sharding.atomic(self.using):
+            # родительские записи пачки создаются раньше дочерних, чтобы дочерние могли на них сослаться
+            self._load_surveys(by_type['survey'])
+            self._load_questions(by_type['question'])
+            self._load_choices(by_type['choice'])
+            self._load_answers(by_type['answer'])
+            if self.checkpoint:
+                save_checkpoint(self.checkpoint, self.state(position), using=self.using)
+
+    def _valid(self, records, build):
+        """Пары (внешний ID, объект) для записей, прошедших проверку; ошибки запоминаются."""
+        valid = []
+        for position, record in records:
+            try:
+                valid.append((record.get('id'), build(record)))
+            except RecordError as error:
+                self._error(position, str(error))
+        return valid
+
+    def _create(self, model, valid, mapping):
+        objects = model.objects.using(self.using).bulk_create([obj for _, obj in valid], batch_size=self.batch_size)
+        for (external_id, _), obj in zip(valid, objects):
+            if external_id is not None:
+                mapping[str(external_id)] = obj.id
+        self.loaded[model._meta.model_name] += len(objects)
+        return objects
+
+    def _ref(self, record, field, mapping):
+        value = record.get(field)
+        if value is None or str(value) not in mapping:
+            raise RecordError(f'{field} = {value} не найден среди импортированных записей')
+        return mapping[str(value)]
+
+    def _load_surveys(self, records):
+        def build(record):
+            survey = Survey(title=_text(record, 'title'), description=_text(record, 'description'),
+                            date_end=_datetime(record, 'date_end'))
+            survey.imported_date_start = _datetime(record, 'date_start', required=False)
+            return survey
+
+        valid = self._valid(records, build)
+        for survey in self._create(Survey, valid, self.surveys):
+            # date_start заполняется автоматически при создании; исторические даты переносятся отдельно
+            if survey.imported_date_start is not None:
+                Survey.objects.using(self.using).filter(id=survey.id).update(date_start=survey.imported_date_start)
+
+    def _load_questions(self, records):
+        def build(record):
+            question_type = record.get('question_type')
+            if question_type not in QUESTION_TYPES:
+                raise RecordError(f'неизвестный тип вопроса: {question_type}')
+            return Question(survey_id=self._ref(record, 'survey', self.surveys),
+                            question_text=_text(record, 'question_text'), question_type=question_type)
+
+        for question in self._create(Question, self._valid(records, build), self.questions):
+            self.question_types[str(question.id)] = question.question_type
+            self.question_surveys[str(question.id)] = question.survey_id
+
+    def _load_choices(self, records):
+        def build(record):
+            question_id = self._ref(record, 'question', self.questions)
+            if self.question_types[str(question_id)] == 'text':
+                raise RecordError('у текстового вопроса не может быть вариантов ответа')
+            return Choice(question_id=question_id, choice_text=_text(record, 'choice_text'))
+
+        for choice in self._create(Choice, self._valid(records, build), self.choices):
+            self.choice_questions[choice.id] = choice.question_id
+
+    def _answer_row(self, record, users):
+        question_id = self._ref(record, 'question', self.questions)
+        question_type = self.question_types[str(question_id)]
+        username = record.get('user')
+        user_id = None
+        if username:
+            if username not in users:
+                raise RecordError(f'пользователь {username} не найден')
+            user_id = users[username]
+        choice_id, choices, answer_text = None, None, None
+        if question_type == 'text':
+            answer_text = _text(record, 'answer_text')
+        else:
+            refs = record.get('choices') or ([record['choice']] if record.get('choice') is not None else [])
+            if not refs:
+                raise RecordError('не выбран вариант ответа')
+            choice_ids = sorted({self._ref({'choice': ref}, 'choice', self.choices) for ref in refs})
+            if any(self.choice_questions[choice] != question_id for choice in choice_ids):
+                raise RecordError(f'вариант ответа не относится к вопросу {record.get("question")}')
+            if question_type == 'many_options':
+                choices = choice_ids
+            elif len(choice_ids) > 1:
+                raise RecordError('в вопросе с одним вариантом ответа выбрано несколько вариантов')
+            else:
+                choice_id = choice_ids[0]
+        # дата ответа в исходной системе; без нее ответ считается поступившим во время импорта
+        created_at = _datetime(record, 'created_at', required=False) or timezone.now()
+        return (user_id, question_id, self.question_surveys[str(question_id)], choice_id, answer_text, choices,
+                created_at)
+
+    def _load_answers(self, records):
+        if not records:
+            return
+        usernames = {record['user'] for _, record in records if record.get('user')}
+        users = dict(User.objects.using(self.using).filter(username__in=usernames).values_list('username', 'id'))
+        candidates = []
+        for position, record in records:
+            try:
+                candidates.append((position, record, self._answer_row(record, users)))
+            except RecordError as error:
+                self._error(position, str(error))
+        answered = self._answered({(row[0], row[1], row[2]) for _, _, row in candidates if row[0] is not None})
+        rows, terms, rollups = [], defaultdict(Counter), Counter()
+        for position, record, row in candidates:
+            if row[0] is not None:
+                if (row[0], row[1]) in answered:
+                    self._error(position, f'пользователь {record["user"]} уже отвечал на вопрос {record["question"]}')
+                    continue
+                answered.add((row[0], row[1]))
+            rows.append(row)
+            if row[4]:
+                terms[row[1]].update(search.tokenize(row[4]))
+            rollups.update(timeline.changes(row[2], row[6], 1))
+        for using, shard_rows in sharding.split(rows, lambda row: row[2], self.using).items():
+            if connections[using].vendor == 'postgresql':
+                self._copy_answers(using, shard_rows)
+            else:
+                Answer.objects.using(using).bulk_create(
+                    (Answer(**dict(zip(ANSWER_COLUMNS, row))) for row in shard_rows), batch_size=self.batch_size)
+        # ответы загружаются без сигналов, поэтому частоты слов обновляются здесь одним запросом на вопрос,
+        # а счетчики графика ответов - одним запросом на шард
+        for question_id, question_terms in terms.items():
+            search.update_terms(question_id, question_terms)
+        timeline.update(rollups)
+        self.loaded['answer'] += len(rows)
+
+    def _answered(self, keys):
+        """Пары (пользователь, вопрос) из keys {(пользователь, вопрос, опрос)}, на которые уже есть ответ."""
+        answered = set()
+        for using, shard_keys in sharding.split(list(keys), lambda key: key[2], self.using).items():
+            answers = Answer.objects.using(using).filter(user_id__in={key[0] for key in shard_keys},
+                                                         question_id__in={key[1] for key in shard_keys})
+            answered.update(answers.values_list('user_id', 'question_id'))
+        return answered
+
+    def _copy_answers(self, using, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for user_id, question_id, survey_id, choice_id, answer_text, choices, created_at in rows:
+            writer.writerow([
+                '' if user_id is None else user_id, question_id, survey_id, '' if choice_id is None else choice_id,
+                # пустая строка без кавычек в CSV-режиме COPY означает NULL
+                answer_text, '' if choices is None else json.dumps(choices), created_at.isoformat(),
+            ])
+        buffer.seek(0)
+        with connections[using].cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {Answer._meta.db_table} ({", ".join(ANSWER_COLUMNS)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def load_checkpoint(key, using=None):
+    checkpoint = ImportCheckpoint.objects.using(using or router.db_for_write(ImportCheckpoint)).filter(key=key).first()
+    return checkpoint.state if checkpoint is not None else None
+
+
+def save_checkpoint(key, state, using=None):
+    ImportCheckpoint.objects.using(using or router.db_for_write(ImportCheckpoint)).update_or_create(
+        key=key, defaults={'state': state})
+
+
+def delete_checkpoint(key, using=None):
+    ImportCheckpoint.objects.using(using or router.db_for_write(ImportCheckpoint)).filter(key=key).delete()
+
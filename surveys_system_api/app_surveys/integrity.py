@@ -0,0 +1,59 @@
+"""
+Проверка ссылочной целостности ответов. Внешние ключи ответов и архивных ответов не проверяются базой данных
+шардов (миграция 0016): строки хранятся в шардах, а опросы, вопросы, варианты и пользователи - в основной базе,
+и ограничение между базами невозможно. Внешний ключ счетчиков графика ответов не проверяется ни в одной базе.
+Каскадное удаление выполняет Django, поэтому висячие ссылки появляются только при изменениях в обход ORM
+(SQL вручную, частичное восстановление из резервной копии); их находит и удаляет команда check_answer_integrity.
+"""
+from app_surveys.db_routers import answer_shards
+from app_surveys.models import Answer, AnswerRollup, ArchivedAnswer
+
+CHECKS = (
+    (Answer, ('survey', 'question', 'choice', 'user')),
+    (ArchivedAnswer, ('survey', 'question', 'choice', 'user')),
+    (AnswerRollup, ('survey',)),
+)
+BATCH_SIZE = 1000
+
+
+def databases():
+    """Базы, в которых хранятся ответы: шарды или только основная база."""
+    return answer_shards() or ['default']
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def _missing(model, ids):
+    """ID из ids, которых нет в основной базе (читается основная база, а не реплика с отставанием)."""
+    missing = set()
+    for batch in _batches(ids):
+        missing |= set(batch) - set(model.objects.using('default').filter(id__in=batch).values_list('id', flat=True))
+    return missing
+
+
+def orphans(using):
+    """Висячие ссылки в базе using: [(модель, поле, множество ID отсутствующих объектов), ...]."""
+    found = []
+    for model, names in CHECKS:
+        for name in names:
+            field = model._meta.get_field(name)
+            ids = (model.objects.using(using).filter(**{f'{field.attname}__isnull': False})
+                   .values_list(field.attname, flat=True).distinct())
+            missing = _missing(field.related_model, set(ids))
+            if missing:
+                found.append((model, name, missing))
+    return found
+
+
+def delete_orphans(using, model, name, missing):
+    """Удаляет строки model в базе using, ссылающиеся полем name на отсутствующие объекты; возвращает их число."""
+    attname = model._meta.get_field(name).attname
+    deleted = 0
+    for batch in _batches(missing):
+        # удаление через ORM, чтобы обработчики сигналов обновили счетчики и индексы
+        deleted += model.objects.using(using).filter(**{f'{attname}__in': batch}).delete()[1].get(model._meta.label, 0)
+    return deleted
@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+
+from app_surveys import archive
+from app_surveys.throttling import shared_lock
+
+# сколько раз пересчитывается снимок результатов, если во время подсчета публикуются изменения
+SNAPSHOT_ATTEMPTS = 3
+
+
+def _cache():
+    return caches[getattr(settings, 'SHARED_CACHE', 'default')]
+
+
+class Subscription:
+    """Подписка одного клиента на изменения результатов опроса, начиная с изменения после номера position."""
+
+    def __init__(self, feed, survey_id, position, maxsize):
+        self.feed = feed
+        self.survey_id = survey_id
+        self.position = position
+        self.maxsize = maxsize
+        self.overflowed = False
+
+    def get(self, timeout):
+        """
+        Ждет изменения не дольше timeout секунд, опрашивая ленту раз в RESULTS_STREAM_POLL_SECONDS,
+        и забирает все накопившиеся. Возвращает Counter {(question_id, choice_id): изменение} или None,
+        если изменений не было.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            deltas = self._poll()
+            remaining = deadline - time.monotonic()
+            if deltas is not None or self.overflowed or remaining <= 0:
+                return deltas
+            time.sleep(min(getattr(settings, 'RESULTS_STREAM_POLL_SECONDS', 0.5), remaining))
+
+    def _poll(self):
+        current = self.feed.sequence(self.survey_id)
+        if current == self.position:
+            return None
+        if current < self.position or current - self.position > self.maxsize:
+            # номер сброшен (запись вытеснена из кэша) или клиент не успевает читать: поток завершится,
+            # клиент переподключится и получит новый снимок
+            self.overflowed = True
+            return None
+        keys = [self.feed.delta_key(self.survey_id, number) for number in range(self.position + 1, current + 1)]
+        found = _cache().get_many(keys)
+        if len(found) < len(keys):
+            # изменения старше RESULTS_STREAM_RETENTION_SECONDS уже удалены
+            self.overflowed = True
+            return None
+        merged = Counter()
+        for key in keys:
+            merged.update(dict(found[key]))
+        self.position = current
+        return merged
+
+
+class ResultsFeed:
+    """
+    Лента изменений результатов, общая для процессов сервера: изменение ответа публикуется один раз в общий кэш
+    (settings.SHARED_CACHE) под очередным номером опроса, и подписчики любого процесса дочитывают изменения
+    после последнего полученного номера.
+    """
+
+    def __init__(self, prefix='live'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # подписчики этого процесса, только для подсчета
+        self._subscribers = {}
+
+    def sequence_key(self, survey_id):
+        return f'{self.prefix}:{survey_id}:sequence'
+
+    def delta_key(self, survey_id, number):
+        return f'{self.prefix}:{survey_id}:{number}'
+
+    def sequence(self, survey_id):
+        """Номер последнего опубликованного изменения опроса (0, если изменений не было)."""
+        return _cache().get(self.sequence_key(survey_id), 0)
+
+    def subscribe(self, survey_id, position):
+        subscription = Subscription(self, survey_id, position,
+                                    maxsize=getattr(settings, 'RESULTS_STREAM_QUEUE_SIZE', 1000))
+        with self._lock:
+            self._subscribers.setdefault(survey_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, survey_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(survey_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[survey_id]
+
+    def subscriber_count(self, survey_id):
+        with self._lock:
+            return len(self._subscribers.get(survey_id, ()))
+
+    def publish(self, survey_id, delta):
+        cache = _cache()
+        sequence_key = self.sequence_key(survey_id)
+        # номер выдается под блокировкой, иначе одновременные публикации из разных процессов получат один номер;
+        # изменение записывается раньше номера, чтобы подписчик, увидевший номер, нашел и изменение
+        with shared_lock(cache, sequence_key):
+            number = cache.get(sequence_key, 0) + 1
+            cache.set(self.delta_key(survey_id, number), list(delta.items()),
+                      timeout=getattr(settings, 'RESULTS_STREAM_RETENTION_SECONDS', 300))
+            cache.set(sequence_key, number, timeout=None)
+
+
+feed = ResultsFeed()
+
+
+def _by_key(item):
+    (question_id, choice_id), _ = item
+    return question_id, choice_id or 0
+
+
+def _encode(counts, field):
+    return [{'question': question_id, 'choice': choice_id, field: value}
+            for (question_id, choice_id), value in sorted(counts.items(), key=_by_key) if value]
+
+
+def results_counts(survey_id):
+    """
+    Текущее количество ответов по каждому варианту (для текстовых вопросов choice = None),
+    включая ответы, перенесенные в архив.
+    """
+    counts = Counter()
+    for answers in archive.survey_answers(survey_id):
+        rows = (answers.filter(choices__isnull=True)
+                .values_list('question_id', 'choice_id')
+                .annotate(count=Count('id'))
+                .order_by())
+        counts.update({(question_id, choice_id): count for question_id, choice_id, count in rows})
+        # ответы с несколькими вариантами хранятся списком и разворачиваются здесь
+        for question_id, choices in (answers.filter(choices__isnull=False)
+                                     .values_list('question_id', 'choices').iterator()):
+            counts.update((question_id, choice_id) for choice_id in choices)
+    return counts
+
+
+def snapshot(survey_id):
+    """
+    Снимок результатов и номер последнего учтенного в нем изменения ленты. Изменения, опубликованные
+    во время подсчета, могли как войти в снимок, так и нет, поэтому подсчет тогда повторяется; если номер
+    так и не установился, они считаются вошедшими в снимок.
+    """
+    for _ in range(SNAPSHOT_ATTEMPTS):
+        before = feed.sequence(survey_id)
+        counts = results_counts(survey_id)
+        after = feed.sequence(survey_id)
+        if after == before:
+            break
+    return counts, after
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def stream_results(survey_id, subscription, snapshot):
+    """Генератор Server-Sent Events: снимок результатов, затем изменения по мере фиксации ответов."""
+    heartbeat = getattr(settings, 'RESULTS_STREAM_HEARTBEAT_SECONDS', 15)
+    try:
+        yield format_event('snapshot', _encode(snapshot, 'count'))
+        while True:
+            deltas = subscription.get(timeout=heartbeat)
+            if subscription.overflowed:
+                break
+            if deltas is None:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event('delta', _encode(deltas, 'delta'))
+        yield format_event('reset', {})
+    finally:
+        feed.unsubscribe(survey_id, subscription)
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app_surveys import archive
+
+
+class Command(BaseCommand):
+    """
+    Переносит ответы давно завершенных опросов в архивную таблицу. Запускается по расписанию (cron);
+    повторный запуск безопасен и продолжает перенос с того места, где он прервался.
+    """
+    help = 'Переносит ответы опросов, завершенных больше N дней назад, в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after-days', type=int, default=settings.ANSWER_ARCHIVE_AFTER_DAYS,
+                            help='сколько дней должно пройти после окончания опроса')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='только вывести опросы для переноса')
+        parser.add_argument('--restore', type=int, nargs='+', metavar='SURVEY_ID',
+                            help='вернуть ответы указанных опросов из архива в основную таблицу')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            for survey_id in options['restore']:
+                restored = archive.restore_survey(survey_id, options['batch_size'])
+                self.stdout.write(f'опрос {survey_id}: возвращено ответов: {restored}')
+            return
+
+        surveys = archive.surveys_to_archive(options['after_days']).order_by('date_end').values_list('id', 'title')
+        total = 0
+        started = time.perf_counter()
+        for survey_id, title in list(surveys):
+            if options['dry_run']:
+                self.stdout.write(f'опрос {survey_id} «{title}»')
+                continue
+            moved = archive.archive_survey(survey_id, options['batch_size'])
+            total += moved
+            self.stdout.write(f'опрос {survey_id} «{title}»: перенесено ответов: {moved}')
+        if not options['dry_run']:
+            self.stdout.write(f'всего перенесено: {total} за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,76 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app_surveys.models import Survey
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк выборки активных опросов на большом объеме завершенных опросов.
+    Все созданные данные откатываются по окончании замера.
+    """
+    help = 'Замеряет время выборки активных опросов при большом количестве завершенных опросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--historical', type=int, default=1_000_000, help='количество завершенных опросов')
+        parser.add_argument('--active', type=int, default=20, help='количество активных опросов')
+        parser.add_argument('--repeat', type=int, default=200, help='количество повторов замера')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+        historical = options['historical']
+        self.stdout.write(f'Создание {historical} завершенных опросов...')
+        for offset in range(0, historical, batch_size):
+            size = min(batch_size, historical - offset)
+            Survey.objects.bulk_create(
+                Survey(title='архив', description='архив', date_end=now - timedelta(days=1 + (offset + i) % 3650))
+                for i in range(size)
+            )
+        Survey.objects.bulk_create(
+            Survey(title='активный', description='активный', date_end=now + timedelta(days=30))
+            for _ in range(options['active'])
+        )
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE app_surveys_survey')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+        queryset = Survey.objects.active()
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+            cursor.execute(explain + sql, params)
+            plan = '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            found = len(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(plan)
+        self.stdout.write(
+            f'найдено активных: {found}; '
+            f'медиана: {statistics.median(timings):.3f} мс; '
+            f'p95: {sorted(timings)[int(len(timings) * 0.95) - 1]:.3f} мс'
+        )
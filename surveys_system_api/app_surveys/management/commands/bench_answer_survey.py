@@ -0,0 +1,88 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from app_surveys.models import Answer, Question, Survey
+
+
+class _Rollback(Exception):
+    pass
+
+
+# Выборки ответов одного опроса: через соединение с вопросами и по опросу, продублированному в ответе
+QUERIES = {
+    'количество ответов': lambda answers: answers.count(),
+    'итоги по вопросам': lambda answers: list(answers.values('question_id').annotate(count=Count('id')).order_by()),
+    'респонденты': lambda answers: answers.filter(user__isnull=False).values('user_id').distinct().count(),
+    'выгрузка': lambda answers: sum(1 for _ in answers.values_list('id', 'user_id', 'question_id', 'choice_id',
+                                                                     'answer_text').iterator(chunk_size=5000)),
+    'пачка архивации': lambda answers: list(answers.order_by('id').values_list('id', flat=True)[:1000]),
+}
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк выборок ответов одного опроса до и после дублирования опроса в ответе: фильтр
+    question__survey_id (соединение с таблицей вопросов) против survey_id (индекс таблицы ответов).
+    Все созданные данные откатываются по окончании замера.
+    """
+    help = 'Сравнивает выборки ответов опроса через вопросы и по полю Answer.survey'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=10_000_000, help='всего ответов')
+        parser.add_argument('--surveys', type=int, default=1000, help='количество опросов')
+        parser.add_argument('--questions', type=int, default=10, help='вопросов в опросе')
+        parser.add_argument('--repeat', type=int, default=5, help='количество повторов замера')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        survey_ids = self._seed(options)
+        survey_id = survey_ids[len(survey_ids) // 2]
+        self.stdout.write(f'{"запрос":<20} {"через вопросы, мс":>18} {"по опросу, мс":>14} {"ускорение":>10}')
+        for name, query in QUERIES.items():
+            joined = self._measure(query, Answer.objects.filter(question__survey_id=survey_id), options['repeat'])
+            direct = self._measure(query, Answer.objects.filter(survey_id=survey_id), options['repeat'])
+            self.stdout.write(f'{name:<20} {joined:>18.1f} {direct:>14.1f} {joined / direct:>9.1f}x')
+
+    def _seed(self, options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+        surveys = Survey.objects.bulk_create(
+            Survey(title='опрос', description='опрос', date_end=now) for _ in range(options['surveys']))
+        questions = Question.objects.bulk_create(
+            (Question(survey=survey, question_text='вопрос', question_type='text')
+             for survey in surveys for _ in range(options['questions'])), batch_size=batch_size)
+        question_surveys = [(question.id, question.survey_id) for question in questions]
+        total = options['answers']
+        self.stdout.write(f'Создание {total} ответов на {len(questions)} вопросов...')
+        for offset in range(0, total, batch_size):
+            Answer.objects.bulk_create(
+                Answer(question_id=question_surveys[number % len(question_surveys)][0],
+                       survey_id=question_surveys[number % len(question_surveys)][1], answer_text='ответ')
+                for number in range(offset, min(offset + batch_size, total)))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return [survey.id for survey in surveys]
+
+    @staticmethod
+    def _measure(query, answers, repeat):
+        # первый прогон не учитывается: он читает страницы таблиц с диска
+        query(answers)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query(answers)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
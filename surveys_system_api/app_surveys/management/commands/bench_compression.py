@@ -0,0 +1,83 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from app_surveys import compression
+from app_surveys.models import Choice, Question, Survey
+from app_surveys.serializers import SurveySerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк сжатия описания опроса: размер и время сжатия на каждый запрос в сравнении
+    с отдачей заранее сжатого варианта из кэша. Созданный опрос откатывается по окончании замера.
+    """
+    help = 'Замеряет размер и время сжатия описания опроса со 100 вопросами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--choices', type=int, default=5, help='вариантов ответа на вопрос')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        survey = Survey.objects.create(title='Ежеквартальный опрос удовлетворенности', description='Бенчмарк',
+                                       date_end=timezone.now() + timedelta(days=30))
+        question_types = [code for code, _ in Question.CHOICES]
+        questions = Question.objects.bulk_create(
+            Question(survey=survey, question_text=f'Насколько вы довольны аспектом работы сервиса № {number}?',
+                     question_type=question_types[number % len(question_types)])
+            for number in range(options['questions'])
+        )
+        Choice.objects.bulk_create(
+            Choice(question=question, choice_text=f'Вариант ответа {number}')
+            for question in questions if question.question_type != 'text'
+            for number in range(options['choices'])
+        )
+        survey = Survey.objects.prefetch_related('questions__choices').get(pk=survey.pk)
+        repeat = options['repeat']
+
+        def render():
+            return JSONRenderer().render(SurveySerializer(survey).data)
+
+        content = render()
+        self.stdout.write(f'вопросов: {options["questions"]}; JSON: {len(content)} байт; '
+                          f'сериализация: {_median_ms(render, repeat):.2f} мс')
+        self.stdout.write(f'{"сжатие":<28}{"байт":>10}{"доля":>8}{"мс":>10}')
+        for encoding in compression.available_encodings():
+            for cached in (False, True):
+                compressed = compression.compress(content, encoding, cached=cached)
+                elapsed = _median_ms(lambda: compression.compress(content, encoding, cached=cached), repeat)
+                label = f'{encoding} ({"один раз, в кэш" if cached else "на каждый запрос"})'
+                self.stdout.write(f'{label:<28}{len(compressed):>10}{len(compressed) / len(content):>8.1%}'
+                                  f'{elapsed:>10.3f}')
+
+        compression.store_survey_definition(survey.id, content)
+        hit = _median_ms(lambda: compression.get_survey_definition(survey.id), repeat)
+        self.stdout.write(f'чтение сжатого описания из кэша: {hit:.3f} мс')
+        compression.invalidate_survey_definition(survey.id)
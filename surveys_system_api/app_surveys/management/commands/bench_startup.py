@@ -0,0 +1,87 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном процессе: загрузка WSGI-приложения и первый запрос к нему
+BOOT_SCRIPT = '''
+import io, json, sys, time
+started = time.perf_counter()
+from surveys_system_api.wsgi import application
+booted = time.perf_counter()
+from django.conf import settings
+host = next((h for h in settings.ALLOWED_HOSTS if h not in ('*', '')), 'localhost').lstrip('.')
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': host,
+    'SERVER_PORT': '80', 'HTTP_HOST': host, 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': False,
+    'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+statuses = []
+b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+finished = time.perf_counter()
+print(json.dumps({
+    'boot_ms': (booted - started) * 1000,
+    'first_request_ms': (finished - booted) * 1000,
+    'status': statuses[0],
+}))
+'''
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк холодного старта воркера: время загрузки WSGI-приложения и первого запроса
+    в свежем процессе, а также самые тяжелые импорты по данным python -X importtime.
+    """
+    help = 'Замеряет время старта воркера и обработки первого запроса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/surveys/', help='адрес первого запроса')
+        parser.add_argument('--runs', type=int, default=5, help='количество запусков')
+        parser.add_argument('--top', type=int, default=10, help='сколько самых тяжелых импортов показать')
+        parser.add_argument('--max-boot-ms', type=float, default=None,
+                            help='завершиться с ошибкой, если медиана старта больше порога')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', '')}
+        results = []
+        imports = []
+        for _ in range(options['runs']):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT, options['path']],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if process.returncode:
+                raise CommandError(process.stderr[-2000:])
+            results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+            imports = self.parse_importtime(process.stderr)
+
+        boot = statistics.median(result['boot_ms'] for result in results)
+        first_request = statistics.median(result['first_request_ms'] for result in results)
+        self.stdout.write('Время импорта по пакетам (мс):')
+        for package, self_time in imports[:options['top']]:
+            self.stdout.write(f'  {self_time / 1000:8.1f}  {package}')
+        self.stdout.write(
+            f'старт воркера: {boot:.1f} мс; первый запрос ({results[0]["status"]}): {first_request:.1f} мс; '
+            f'итого: {boot + first_request:.1f} мс (медиана по {len(results)} запускам)'
+        )
+        if options['max_boot_ms'] is not None and boot + first_request > options['max_boot_ms']:
+            raise CommandError(f'Время старта {boot + first_request:.1f} мс превышает {options["max_boot_ms"]} мс')
+
+    @staticmethod
+    def parse_importtime(output):
+        """Суммирует собственное время импорта модулей по пакетам верхнего уровня (в микросекундах)."""
+        packages = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            self_time, _, name = line[len('import time:'):].split('|')
+            if not self_time.strip().isdigit():
+                continue
+            package = name.strip().split('.')[0]
+            packages[package] = packages.get(package, 0) + int(self_time)
+        return sorted(packages.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_surveys import integrity
+
+
+class Command(BaseCommand):
+    """
+    Ищет ответы, архивные ответы и счетчики графика ответов, которые ссылаются на отсутствующие опросы, вопросы,
+    варианты или пользователей: в шардах внешние ключи этих таблиц не проверяются базой данных
+    (app_surveys.integrity).
+    Завершается с ошибкой, если висячие ссылки найдены и не удалены, поэтому подходит для запуска по расписанию.
+    """
+    help = 'Проверяет ссылочную целостность ответов, внешние ключи которых не проверяются базой данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='удалить строки с висячими ссылками')
+
+    def handle(self, *args, **options):
+        remaining = 0
+        for using in integrity.databases():
+            for model, name, missing in integrity.orphans(using):
+                label = f'{using}: {model._meta.label}.{name}'
+                self.stdout.write(f'{label}: ссылки на отсутствующие объекты ({len(missing)}): '
+                                  f'{", ".join(map(str, sorted(missing)[:20]))}')
+                if options['delete']:
+                    deleted = integrity.delete_orphans(using, model, name, missing)
+                    self.stdout.write(f'{label}: удалено строк: {deleted}')
+                else:
+                    remaining += 1
+        if remaining:
+            raise CommandError('Найдены висячие ссылки; удалите их с --delete')
+        self.stdout.write('висячих ссылок нет')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app_surveys import results
+from app_surveys.models import Survey
+
+
+class Command(BaseCommand):
+    """
+    Сохраняет снимки итоговых результатов завершенных опросов. Запускается по расписанию,
+    чтобы первое обращение к итогам не тратило время на подсчет.
+    """
+    help = 'Подсчитывает и сохраняет итоги завершенных опросов, у которых еще нет снимка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', action='store_true', help='пересчитать и существующие снимки')
+        parser.add_argument('--survey', type=int, nargs='+', metavar='SURVEY_ID', help='только указанные опросы')
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.filter(date_end__lt=timezone.now())
+        if options['survey']:
+            surveys = surveys.filter(id__in=options['survey'])
+        if not options['refresh']:
+            surveys = surveys.filter(frozen_results__isnull=True)
+        frozen = 0
+        for survey in surveys.order_by('id'):
+            results.freeze(survey, refresh=options['refresh'])
+            frozen += 1
+        self.stdout.write(f'сохранено снимков итогов: {frozen}')
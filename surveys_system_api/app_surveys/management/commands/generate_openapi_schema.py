@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from surveys_system_api.schema import generate_schema
+
+
+class Command(BaseCommand):
+    """Генерирует OpenAPI-схему в файл, который затем отдается без построения схемы на лету."""
+    help = 'Сохраняет OpenAPI-схему в файл OPENAPI_SCHEMA_FILE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_FILE, help='путь к файлу схемы')
+
+    def handle(self, *args, **options):
+        content = generate_schema()
+        with open(options['output'], 'wb') as schema_file:
+            schema_file.write(content)
+        self.stdout.write(f'Схема сохранена в {options["output"]} ({len(content)} байт)')
@@ -0,0 +1,62 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_surveys.importer import SurveyImporter, delete_checkpoint, load_checkpoint, read_records
+
+
+class Command(BaseCommand):
+    """
+    Массовый импорт опросов и ответов из файла JSON Lines или CSV. Файл читается потоково, записи загружаются
+    пачками (PostgreSQL - командой COPY, другие базы - bulk_create). Вместе с каждой пачкой в базе данных
+    сохраняется контрольная точка, и прерванный импорт продолжается с места остановки.
+    """
+    help = 'Импортирует опросы, вопросы, варианты ответов и ответы из файла JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл .jsonl/.json (запись на строку) или .csv')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help='имя контрольной точки (по умолчанию полный путь к файлу)')
+        parser.add_argument('--restart', action='store_true', help='начать заново, не учитывая контрольную точку')
+        parser.add_argument('--max-errors', type=int, default=1000,
+                            help='прервать импорт, если некорректных записей больше')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        checkpoint = options['checkpoint'] or os.path.abspath(path)
+        importer = SurveyImporter(batch_size=options['batch_size'], checkpoint=checkpoint)
+
+        skip = 0
+        if options['restart']:
+            delete_checkpoint(checkpoint)
+        state = load_checkpoint(checkpoint)
+        if state is not None:
+            skip = importer.restore(state)
+            self.stdout.write(f'продолжение импорта с записи {skip + 1}')
+        loaded_before = sum(importer.loaded.values())
+        started = time.perf_counter()
+
+        def on_batch(position):
+            loaded = sum(importer.loaded.values()) - loaded_before
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'записей обработано: {position}; загружено: {loaded}; '
+                              f'{loaded / elapsed:.0f} записей/с')
+            if importer.error_count > options['max_errors']:
+                raise CommandError(f'Слишком много некорректных записей: {importer.error_count}')
+
+        try:
+            importer.run(read_records(path, skip=skip), on_batch=on_batch)
+        finally:
+            for position, message in importer.errors:
+                self.stderr.write(f'запись {position}: {message}')
+
+        elapsed = time.perf_counter() - started
+        loaded = sum(importer.loaded.values()) - loaded_before
+        self.stdout.write(
+            'загружено: ' + ', '.join(f'{name}: {count}' for name, count in sorted(importer.loaded.items()))
+            + f'; некорректных записей: {importer.error_count}'
+        )
+        self.stdout.write(f'за {elapsed:.1f} с: {loaded / elapsed if elapsed else 0:.0f} записей/с')
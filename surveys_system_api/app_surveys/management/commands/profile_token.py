@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_surveys.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    """Выдает подписанное значение заголовка X-Profile для профилирования запросов."""
+    help = 'Выводит значение заголовка X-Profile, включающего профилирование запроса'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'X-Profile: {make_profile_token()}')
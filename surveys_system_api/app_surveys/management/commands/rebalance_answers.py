@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_surveys import sharding, timeline
+from app_surveys.db_routers import answer_shards
+
+
+class Command(BaseCommand):
+    """
+    Переносит ответы и архивные ответы в шарды их опросов после изменения ANSWER_SHARDS (например, после
+    добавления шарда: ему достаются часть опросов). Ответы переносятся с сохранением ID; повторный запуск
+    безопасен и завершает прерванный перенос. Пока ответы опроса переносятся, чтения его результатов
+    видят только уже перенесенную часть.
+    """
+    help = 'Переносит ответы в шарды их опросов после изменения ANSWER_SHARDS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=sharding.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='только вывести опросы для переноса')
+
+    def handle(self, *args, **options):
+        if not answer_shards():
+            raise CommandError('Шардирование ответов не настроено (ANSWER_SHARDS пуст)')
+        total = 0
+        started = time.perf_counter()
+        for survey_id, source in list(sharding.misplaced_surveys()):
+            target = sharding.db_for_survey(survey_id)
+            if options['dry_run']:
+                self.stdout.write(f'опрос {survey_id}: {source} -> {target}')
+                continue
+            moved = sharding.move_survey(survey_id, source, options['batch_size'])
+            # счетчики графика ответов пересчитываются в новом шарде по перенесенным ответам
+            timeline.rebuild(survey_id)
+            total += moved
+            self.stdout.write(f'опрос {survey_id}: {source} -> {target}, перенесено ответов: {moved}')
+        if not options['dry_run']:
+            self.stdout.write(f'всего перенесено: {total} за {time.perf_counter() - started:.1f} с')
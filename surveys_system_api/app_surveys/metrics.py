@@ -0,0 +1,176 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+class RequestStats:
+    """Статистика одного запроса: запросы к базе, время работы с базой и сериализации."""
+
+    def __init__(self):
+        self.queries = []
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self._serialization_depth = 0
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """Обертка для connection.execute_wrapper: замеряет каждый SQL-запрос."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries.append((sql, duration))
+
+
+@contextmanager
+def serialization_timer():
+    """Учитывает время сериализации; вложенные сериалайзеры не учитываются повторно."""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    stats._serialization_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._serialization_depth -= 1
+        if not stats._serialization_depth:
+            stats.serialization_time += time.perf_counter() - started
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus с метками по представлению."""
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, label, value):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{view="{label}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {total:g}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Счетчик в формате Prometheus с метками по представлению."""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._series = {}
+
+    def inc(self, label, value=1):
+        self._series[label] = self._series.get(label, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{{view="{label}"}} {value:g}')
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            'api_request_duration_seconds', 'Время обработки запроса.', DURATION_BUCKETS)
+        self.db_queries = Histogram(
+            'api_db_queries', 'Количество SQL-запросов на один запрос.', QUERY_COUNT_BUCKETS)
+        self.db_duration = Histogram(
+            'api_db_duration_seconds', 'Суммарное время SQL-запросов на один запрос.', DURATION_BUCKETS)
+        self.serialization_duration = Histogram(
+            'api_serialization_duration_seconds', 'Время сериализации ответа.', DURATION_BUCKETS)
+        self.response_size = Histogram(
+            'api_response_size_bytes', 'Размер тела ответа.', SIZE_BUCKETS)
+        self.slow_requests = Counter(
+            'api_slow_requests_total', 'Количество запросов дольше порога METRICS_SLOW_REQUEST_SECONDS.')
+        self.shed_requests = Counter(
+            'api_shed_requests_total', 'Количество запросов, отклоненных с 503 из-за перегрузки процесса.')
+        self.statement_timeouts = Counter(
+            'api_statement_timeouts_total', 'Количество SQL-запросов, прерванных по истечении лимита времени.')
+        self.throttled_requests = Counter(
+            'api_throttled_requests_total', 'Количество запросов, отклоненных с 429 из-за превышения лимита частоты.')
+
+    @property
+    def metrics(self):
+        return [self.request_duration, self.db_queries, self.db_duration, self.serialization_duration,
+                self.response_size, self.slow_requests, self.shed_requests, self.statement_timeouts,
+                self.throttled_requests]
+
+    def observe_request(self, label, duration, stats, response_size, slow=False):
+        with self._lock:
+            self.request_duration.observe(label, duration)
+            self.db_queries.observe(label, stats.query_count)
+            self.db_duration.observe(label, stats.db_time)
+            self.serialization_duration.observe(label, stats.serialization_time)
+            if response_size is not None:
+                self.response_size.observe(label, response_size)
+            if slow:
+                self.slow_requests.inc(label)
+
+    def observe_shed(self, label):
+        with self._lock:
+            self.shed_requests.inc(label)
+
+    def observe_statement_timeout(self, label):
+        with self._lock:
+            self.statement_timeouts.inc(label)
+
+    def observe_throttled(self, label):
+        with self._lock:
+            self.throttled_requests.inc(label)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in self.metrics:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def view_label(view_func, method):
+    """Метка представления вида 'SurveysViewSet.list'."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
@@ -0,0 +1,58 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from app_surveys import metrics
+
+logger = logging.getLogger('app_surveys.metrics')
+
+
+class MetricsMiddleware:
+    """
+    Middleware для сбора метрик запроса: время обработки, количество и время SQL-запросов,
+    время сериализации и размер ответа. Медленные запросы логируются в формате JSON.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        request._metrics_view = 'unresolved'
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+        duration = time.perf_counter() - started
+
+        label = request._metrics_view
+        size = None if response.streaming else len(response.content)
+        threshold = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', None)
+        slow = bool(threshold) and duration >= threshold
+        metrics.registry.observe_request(label, duration, stats, size, slow=slow)
+        if slow:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'view': label,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'db_queries': stats.query_count,
+                'db_time_ms': round(stats.db_time * 1000, 3),
+                'serialization_time_ms': round(stats.serialization_time * 1000, 3),
+                'response_size': size,
+            }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = metrics.view_label(view_func, request.method)
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.4 on 2026-10-19 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_surveys', '0005_alter_answer_choice'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='survey',
+            index=models.Index(fields=['date_end', 'date_start'], name='survey_active_window_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from itertools import groupby
+
+from django.db import migrations, transaction
+from django.db.models import Max
+
+BATCH_SIZE = 1000
+
+
+def merge_answers(apps, schema_editor):
+    """
+    Сворачивает ответы на вопросы с выбором нескольких вариантов (по строке на вариант) в одну строку
+    на пользователя и вопрос со списком выбранных вариантов. Ответы анонимных пользователей
+    не объединяются: каждый становится отдельной строкой с одним вариантом.
+
+    Таблица обходится диапазонами ID по BATCH_SIZE строк, каждый диапазон - отдельной транзакцией.
+    Для пар (пользователь, вопрос), встреченных в диапазоне, сворачиваются и строки за его пределами:
+    у обработанных строк заполнен список вариантов, поэтому следующие диапазоны их уже не выбирают.
+    """
+    db = schema_editor.connection.alias
+    Answer = apps.get_model('app_surveys', 'Answer')
+    pending = Answer.objects.using(db).filter(question__question_type='many_options', choices__isnull=True)
+    max_id = pending.aggregate(max_id=Max('id'))['max_id'] or 0
+    for start in range(0, max_id, BATCH_SIZE):
+        with transaction.atomic(using=db):
+            in_range = pending.filter(id__gt=start, id__lte=start + BATCH_SIZE)
+            to_update = [Answer(id=answer_id, choice=None, choices=[choice_id] if choice_id else [])
+                         for answer_id, choice_id in in_range.filter(user__isnull=True).values_list('id', 'choice')]
+            keys = set(in_range.filter(user__isnull=False).values_list('user_id', 'question_id'))
+            # строки пар с первой строкой в прежних диапазонах уже свернуты, поэтому ищутся только дальше start
+            rows = (pending.filter(id__gt=start, user_id__in={user_id for user_id, _ in keys},
+                                   question_id__in={question_id for _, question_id in keys})
+                    .order_by('user_id', 'question_id', 'id')
+                    .values_list('id', 'user_id', 'question_id', 'choice_id'))
+            to_delete = []
+            for key, group in groupby(rows, key=lambda row: (row[1], row[2])):
+                if key not in keys:
+                    continue
+                group = list(group)
+                choices = sorted({choice_id for _, _, _, choice_id in group if choice_id})
+                to_update.append(Answer(id=group[0][0], choice=None, choices=choices))
+                to_delete.extend(answer_id for answer_id, _, _, _ in group[1:])
+            Answer.objects.using(db).bulk_update(to_update, ['choices', 'choice'], batch_size=BATCH_SIZE)
+            Answer.objects.using(db).filter(id__in=to_delete).delete()
+
+
+def split_answers(apps, schema_editor):
+    """Обратная операция: по строке на каждый выбранный вариант. Таблица обходится диапазонами ID."""
+    db = schema_editor.connection.alias
+    Answer = apps.get_model('app_surveys', 'Answer')
+    # новые строки получают ID больше max_id и пустой список вариантов, поэтому обход их не затрагивает
+    max_id = Answer.objects.using(db).aggregate(max_id=Max('id'))['max_id'] or 0
+    for start in range(0, max_id, BATCH_SIZE):
+        with transaction.atomic(using=db):
+            answers = Answer.objects.using(db).filter(id__gt=start, id__lte=start + BATCH_SIZE,
+                                                      choices__isnull=False)
+            for answer in answers:
+                choices = answer.choices
+                if choices:
+                    Answer.objects.using(db).bulk_create(
+                        Answer(user_id=answer.user_id, question_id=answer.question_id, choice_id=choice_id)
+                        for choice_id in choices[1:]
+                    )
+                    answer.choice_id = choices[0]
+                answer.choices = None
+                answer.save(update_fields=['choice', 'choices'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app_surveys', '0007_answer_choices'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_answers, split_answers),
+    ]
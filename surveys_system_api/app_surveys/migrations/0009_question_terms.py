@@ -0,0 +1,31 @@
+# Generated by Django 4.1.4 on 2026-10-19 16:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_surveys', '0008_merge_multiple_choice_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='слово')),
+                ('count', models.IntegerField(default=0, verbose_name='количество ответов')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='app_surveys.question', verbose_name='вопрос')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='questionterm',
+            index=models.Index(fields=['question', '-count'], name='question_term_count_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionterm',
+            constraint=models.UniqueConstraint(fields=('question', 'term'), name='question_term_unique'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+import re
+from collections import Counter
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+SEARCH_FIELDS = [
+    ('app_surveys_answer', 'answer_text'),
+    ('app_surveys_question', 'question_text'),
+]
+
+# Копия настроек и разбиения на слова из app_surveys.search на момент создания миграции: миграция не должна
+# меняться вместе с кодом приложения
+SEARCH_CONFIG = 'russian'
+
+TERM_MIN_LENGTH = 3
+TERM_MAX_LENGTH = 100
+STOP_WORDS = frozenset("""
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+    меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+    вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+    будто чего раз тоже себе под будет тогда кто этот того потому этого какой совсем ним здесь этом один
+    почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+    над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+    иногда лучше чуть том нельзя такой им более всегда конечно всю между
+    the and for are but not you all any can had her was one our out has his how its may new now see who
+    did get him let put say she too use that with this from they will would there their what about which
+""".split())
+
+
+def tokenize(text):
+    """Множество значимых слов текста в нижнем регистре."""
+    return {word for word in re.findall(r'\w+', (text or '').lower())
+            if TERM_MIN_LENGTH <= len(word) <= TERM_MAX_LENGTH and word not in STOP_WORDS and not word.isdigit()}
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    PostgreSQL: GIN-индексы по выражению to_tsvector, с которым ищет app_surveys.search. Индексы строятся
+    CREATE INDEX CONCURRENTLY, без блокировки записи в таблицы на время построения.
+    SQLite: внешние таблицы FTS5 с триггерами синхронизации (для локального запуска).
+    """
+    vendor = schema_editor.connection.vendor
+    for table, field in SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(
+                f"CREATE INDEX CONCURRENTLY {table}_{field}_fts_idx ON {table} "
+                f"USING GIN (to_tsvector('{SEARCH_CONFIG}', coalesce({field}, '')))")
+        elif vendor == 'sqlite':
+            fts = f'{table}_fts'
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5({field}, content='{table}', content_rowid='id')")
+            schema_editor.execute(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {field}) VALUES (new.id, new.{field}); END")
+            schema_editor.execute(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {field}) VALUES ('delete', old.id, old.{field}); END")
+            schema_editor.execute(
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {field} ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {field}) VALUES ('delete', old.id, old.{field}); "
+                f"INSERT INTO {fts}(rowid, {field}) VALUES (new.id, new.{field}); END")
+            schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, field in SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {table}_{field}_fts_idx')
+        elif vendor == 'sqlite':
+            fts = f'{table}_fts'
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def fill_question_terms(apps, schema_editor):
+    """Начальное заполнение частот слов по уже сохраненным текстовым ответам."""
+    Answer = apps.get_model('app_surveys', 'Answer')
+    QuestionTerm = apps.get_model('app_surveys', 'QuestionTerm')
+    db = schema_editor.connection.alias
+    counts = Counter()
+    answers = (Answer.objects.using(db).exclude(answer_text__isnull=True).exclude(answer_text='')
+               .values_list('question_id', 'answer_text').iterator(chunk_size=BATCH_SIZE))
+    for question_id, answer_text in answers:
+        counts.update((question_id, term) for term in tokenize(answer_text))
+    with transaction.atomic(using=db):
+        QuestionTerm.objects.using(db).bulk_create(
+            (QuestionTerm(question_id=question_id, term=term, count=count)
+             for (question_id, term), count in counts.items()),
+            batch_size=BATCH_SIZE)
+
+
+def clear_question_terms(apps, schema_editor):
+    apps.get_model('app_surveys', 'QuestionTerm').objects.using(schema_editor.connection.alias).delete()
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('app_surveys', '0009_question_terms'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(fill_question_terms, clear_question_terms),
+    ]
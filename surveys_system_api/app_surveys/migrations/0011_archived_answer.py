@@ -0,0 +1,27 @@
+# Generated by Django 4.1.4 on 2026-10-19 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_surveys', '0010_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAnswer',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('answer_text', models.CharField(blank=True, max_length=200, null=True, verbose_name='текст ответа')),
+                ('choices', models.JSONField(blank=True, null=True, verbose_name='выбранные варианты')),
+                ('choice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to='app_surveys.choice', verbose_name='выбор')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to='app_surveys.question', verbose_name='вопрос')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.4 on 2026-10-19 16:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_surveys', '0011_archived_answer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyResults',
+            fields=[
+                ('survey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='frozen_results', serialize=False, to='app_surveys.survey', verbose_name='опрос')),
+                ('payload', models.TextField(verbose_name='результаты (JSON)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата подсчета')),
+            ],
+        ),
+    ]
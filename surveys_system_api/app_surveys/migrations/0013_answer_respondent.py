@@ -0,0 +1,44 @@
+# Generated by Django 4.1.4 on 2026-10-19 16:59
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """Как в 0015_backfill_answer_survey: CREATE INDEX CONCURRENTLY на PostgreSQL, обычный CREATE INDEX на остальных."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # индекс по таблице ответов строится без блокировки записи, а CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('app_surveys', '0012_survey_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='respondent',
+            field=models.UUIDField(blank=True, null=True, verbose_name='анонимный респондент'),
+        ),
+        migrations.AddField(
+            model_name='archivedanswer',
+            name='respondent',
+            field=models.UUIDField(blank=True, null=True, verbose_name='анонимный респондент'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='answer',
+            index=models.Index(fields=['respondent', 'question'], name='answer_respondent_question_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.4 on 2026-10-19 17:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_surveys', '0013_answer_respondent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='survey',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='app_surveys.survey', verbose_name='опрос'),
+        ),
+        migrations.AddField(
+            model_name='archivedanswer',
+            name='survey',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to='app_surveys.survey', verbose_name='опрос'),
+        ),
+    ]
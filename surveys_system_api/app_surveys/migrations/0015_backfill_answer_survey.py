@@ -0,0 +1,61 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """
+    На PostgreSQL индекс строится CREATE INDEX CONCURRENTLY, без блокировки записи в таблицу на время
+    построения; на остальных базах данных (SQLite при локальном запуске) - обычным CREATE INDEX.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+def backfill_survey(apps, schema_editor):
+    """
+    Заполняет опрос в существующих ответах и архивных ответах. Таблица обходится диапазонами ID
+    по BATCH_SIZE строк, каждый диапазон - отдельной транзакцией, чтобы не блокировать всю таблицу
+    на время заполнения.
+    """
+    db = schema_editor.connection.alias
+    Question = apps.get_model('app_surveys', 'Question')
+    survey = Subquery(Question.objects.filter(id=OuterRef('question_id')).values('survey_id')[:1])
+    for model_name in ('Answer', 'ArchivedAnswer'):
+        model = apps.get_model('app_surveys', model_name)
+        max_id = model.objects.using(db).aggregate(max_id=Max('id'))['max_id'] or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            with transaction.atomic(using=db):
+                (model.objects.using(db).filter(id__gt=start, id__lte=start + BATCH_SIZE, survey__isnull=True)
+                 .update(survey_id=survey))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('app_surveys', '0014_answer_survey'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_survey, migrations.RunPython.noop),
+        # индексы строятся после заполнения: так быстрее, чем обновлять их на каждой пачке
+        AddIndexConcurrentlyIfSupported(
+            model_name='answer',
+            index=models.Index(fields=['survey', 'question'], name='answer_survey_question_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='archivedanswer',
+            index=models.Index(fields=['survey', 'question'], name='archived_survey_question_idx'),
+        ),
+    ]
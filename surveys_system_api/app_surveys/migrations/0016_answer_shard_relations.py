@@ -0,0 +1,105 @@
+# Generated by Django 4.1.4 on 2026-10-19 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+ANSWER_TABLE, ANSWER_FIELD = 'app_surveys_answer', 'answer_text'
+# миграции выполняются в основной базе и в шардах ответов (реплики не мигрируются)
+PRIMARY_DB = 'default'
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    SQLite выполняет изменение внешнего ключа перестройкой таблицы, при которой удаляются ее триггеры,
+    поэтому триггеры синхронизации таблицы FTS5 с ответами (миграция 0010) создаются заново.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    table, field, fts = ANSWER_TABLE, ANSWER_FIELD, f'{ANSWER_TABLE}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    schema_editor.execute(
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {field}) VALUES (new.id, new.{field}); END")
+    schema_editor.execute(
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {field}) VALUES ('delete', old.id, old.{field}); END")
+    schema_editor.execute(
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {field} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {field}) VALUES ('delete', old.id, old.{field}); "
+        f"INSERT INTO {fts}(rowid, {field}) VALUES (new.id, new.{field}); END")
+    schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+class AlterFieldOnShards(migrations.AlterField):
+    """
+    Изменяет поле только в шардах ответов. В основной базе ответы ссылаются на опросы, вопросы, варианты
+    и пользователей той же базы, поэтому ограничения внешних ключей там остаются (хотя в состоянии моделей
+    их нет: изменение этих полей в будущих миграциях должно это учитывать).
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != PRIMARY_DB:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != PRIMARY_DB:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_surveys', '0015_backfill_answer_survey'),
+    ]
+
+    # Внешние ключи ответов не проверяются базой данных шардов: там таблицы опросов, вопросов и пользователей
+    # пусты. В основной базе (в том числе без шардирования) ограничения остаются; висячие ссылки в шардах
+    # находит команда check_answer_integrity
+    operations = [
+        # при откате триггеры восстанавливаются после обратной перестройки таблицы
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        AlterFieldOnShards(
+            model_name='answer',
+            name='choice',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='app_surveys.choice', verbose_name='выбор'),
+        ),
+        AlterFieldOnShards(
+            model_name='answer',
+            name='question',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='app_surveys.question', verbose_name='вопрос'),
+        ),
+        AlterFieldOnShards(
+            model_name='answer',
+            name='survey',
+            field=models.ForeignKey(db_constraint=False, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='app_surveys.survey', verbose_name='опрос'),
+        ),
+        AlterFieldOnShards(
+            model_name='answer',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='answers', to=settings.AUTH_USER_MODEL, verbose_name='пользователь'),
+        ),
+        AlterFieldOnShards(
+            model_name='archivedanswer',
+            name='choice',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to='app_surveys.choice', verbose_name='выбор'),
+        ),
+        AlterFieldOnShards(
+            model_name='archivedanswer',
+            name='question',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to='app_surveys.question', verbose_name='вопрос'),
+        ),
+        AlterFieldOnShards(
+            model_name='archivedanswer',
+            name='survey',
+            field=models.ForeignKey(db_constraint=False, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to='app_surveys.survey', verbose_name='опрос'),
+        ),
+        AlterFieldOnShards(
+            model_name='archivedanswer',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_answers', to=settings.AUTH_USER_MODEL, verbose_name='пользователь'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
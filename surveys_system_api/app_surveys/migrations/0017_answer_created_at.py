@@ -0,0 +1,64 @@
+# Generated by Django 4.1.4 on 2026-10-19 17:59
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """Как в 0015_backfill_answer_survey: CREATE INDEX CONCURRENTLY на PostgreSQL, обычный CREATE INDEX на остальных."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # индекс по таблице ответов строится без блокировки записи, а CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('app_surveys', '0016_answer_shard_relations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('minute', 'Минута'), ('hour', 'Час'), ('day', 'День')], max_length=10, verbose_name='интервал')),
+                ('start', models.DateTimeField(verbose_name='начало интервала')),
+                ('count', models.IntegerField(default=0, verbose_name='количество ответов')),
+            ],
+        ),
+        # столбцы без значения по умолчанию: добавляются без перезаписи таблиц, у прежних ответов остаются NULL
+        migrations.AddField(
+            model_name='answer',
+            name='created_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='дата ответа'),
+        ),
+        migrations.AddField(
+            model_name='archivedanswer',
+            name='created_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='дата ответа'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='answer',
+            index=models.Index(fields=['survey', 'created_at'], name='answer_survey_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='answerrollup',
+            name='survey',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='answer_rollups', to='app_surveys.survey', verbose_name='опрос'),
+        ),
+        migrations.AddConstraint(
+            model_name='answerrollup',
+            constraint=models.UniqueConstraint(fields=('survey', 'bucket', 'start'), name='answer_rollup_unique'),
+        ),
+    ]
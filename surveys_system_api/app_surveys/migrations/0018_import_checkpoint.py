@@ -0,0 +1,21 @@
+# Generated by Django 4.1.4 on 2026-10-19 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_surveys', '0017_answer_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='импорт')),
+                ('state', models.JSONField(verbose_name='состояние')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='дата сохранения')),
+            ],
+        ),
+    ]
@@ -1,5 +1,18 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from app_surveys.db_routers import answer_shards, shard_for_survey
+
+
+class SurveyQuerySet(models.QuerySet):
+    """Набор запросов для модели Опрос."""
+
+    def active(self, now=None):
+        """Опросы, активные на момент now (по умолчанию - текущий момент, с учетом часового пояса)."""
+        if now is None:
+            now = timezone.now()
+        return self.filter(date_end__gte=now, date_start__lte=now)
 
 
 class Survey(models.Model):
@@ -9,9 +22,40 @@ class Survey(models.Model):
     date_end = models.DateTimeField(verbose_name='дата окончания')
     description = models.CharField(max_length=200, verbose_name='описание')
 
+    objects = SurveyQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # date_end идет первым: почти все опросы в истории уже завершены,
+            # поэтому условие date_end >= now отсекает их по индексу
+            models.Index(fields=['date_end', 'date_start'], name='survey_active_window_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def clone(self, date_end, title=None):
+        """
+        Копия опроса с вопросами и вариантами ответов (без ответов). Независимо от размера опроса
+        выполняется фиксированное число запросов: по одной выборке и одной пакетной вставке
+        для вопросов и для вариантов.
+        """
+        with transaction.atomic(using=router.db_for_write(Survey)):
+            survey = Survey.objects.create(title=title or self.title, description=self.description, date_end=date_end)
+            questions = list(Question.objects.filter(survey=self).order_by('id')
+                             .values_list('id', 'question_text', 'question_type'))
+            created = Question.objects.bulk_create(
+                Question(survey=survey, question_text=question_text, question_type=question_type)
+                for _, question_text, question_type in questions
+            )
+            new_ids = {old_id: question.id for (old_id, _, _), question in zip(questions, created)}
+            Choice.objects.bulk_create(
+                Choice(question_id=new_ids[question_id], choice_text=choice_text)
+                for question_id, choice_text in (Choice.objects.filter(question__survey=self).order_by('id')
+                                                 .values_list('question_id', 'choice_text'))
+            )
+        return survey
+
 
 class Question(models.Model):
     """Модель вопроса."""
@@ -39,16 +83,203 @@ class Choice(models.Model):
         return self.choice_text
 
 
+class AnswerQuerySet(models.QuerySet):
+    """Набор запросов для модели Ответ."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create не вызывает save(), поэтому опрос ответов заполняется здесь одним запросом на пачку,
+        а незаполненная дата ответа - текущим временем. При шардировании ответы вставляются в шарды своих опросов.
+        """
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            if obj.created_at is None:
+                obj.created_at = now
+        question_ids = {obj.question_id for obj in objs if obj.survey_id is None}
+        if question_ids:
+            # вопросы хранятся в основной базе, а не в шарде
+            using = router.db_for_write(Question) if answer_shards() else self.db
+            surveys = dict(Question.objects.using(using).filter(id__in=question_ids).values_list('id', 'survey_id'))
+            for obj in objs:
+                if obj.survey_id is None:
+                    obj.survey_id = surveys.get(obj.question_id)
+        if not answer_shards():
+            return super().bulk_create(objs, *args, **kwargs)
+        shards = {}
+        for obj in objs:
+            shards.setdefault(shard_for_survey(obj.survey_id), []).append(obj)
+        for using, shard_objs in shards.items():
+            super(AnswerQuerySet, self.using(using)).bulk_create(shard_objs, *args, **kwargs)
+        return objs
+
+
 class Answer(models.Model):
     """
     Модель ответа.
     """
-    user = models.ForeignKey(User, related_name='answers', on_delete=models.CASCADE, verbose_name='пользователь', blank=True, null=True)
-    question = models.ForeignKey(Question, related_name='answers', on_delete=models.CASCADE, verbose_name='вопрос')
-    choice = models.ForeignKey(Choice, related_name='answers', on_delete=models.CASCADE, verbose_name='выбор', blank=True, null=True)
+    # Внешние ключи ответа не проверяются базой данных шардов (app_surveys.sharding): ответы хранятся в шардах,
+    # а пользователи, опросы, вопросы и варианты - в основной базе. В основной базе ограничения остаются
+    # (миграция 0016). Каскадное удаление выполняет Django, висячие ссылки в шардах находит команда
+    # check_answer_integrity (app_surveys.integrity).
+    user = models.ForeignKey(User, related_name='answers', on_delete=models.CASCADE, verbose_name='пользователь', blank=True, null=True,
+                             db_constraint=False)
+    question = models.ForeignKey(Question, related_name='answers', on_delete=models.CASCADE, verbose_name='вопрос',
+                                 db_constraint=False)
+    # Опрос вопроса, продублированный в ответе: выборки ответов опроса идут по индексу без соединения с вопросами.
+    # Заполняется при сохранении; в базе допускает NULL, чтобы столбец добавлялся без перестройки таблицы.
+    survey = models.ForeignKey(Survey, related_name='answers', on_delete=models.CASCADE, verbose_name='опрос',
+                               null=True, editable=False, db_index=False, db_constraint=False)
+    choice = models.ForeignKey(Choice, related_name='answers', on_delete=models.CASCADE, verbose_name='выбор', blank=True, null=True,
+                               db_constraint=False)
     answer_text = models.CharField(max_length=200, verbose_name='текст ответа', blank=True, null=True)
+    # Для вопросов с выбором нескольких вариантов все выбранные варианты хранятся в одной строке
+    # списком ID, вместо отдельной строки на каждый вариант
+    choices = models.JSONField(verbose_name='выбранные варианты', blank=True, null=True)
+    # Анонимный респондент из подписанного токена (для ответов без пользователя)
+    respondent = models.UUIDField(verbose_name='анонимный респондент', blank=True, null=True)
+    # Заполняется при сохранении; NULL - ответы, сохраненные до появления поля (время их поступления неизвестно)
+    created_at = models.DateTimeField(verbose_name='дата ответа', null=True, editable=False)
+
+    objects = AnswerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'question'], name='answer_user_question_idx'),
+            models.Index(fields=['respondent', 'question'], name='answer_respondent_question_idx'),
+            # выборки по опросу и итоги опроса с группировкой по вопросу
+            models.Index(fields=['survey', 'question'], name='answer_survey_question_idx'),
+            # ответы опроса за период и пересчет счетчиков AnswerRollup
+            models.Index(fields=['survey', 'created_at'], name='answer_survey_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        question = self.question
+        if self.survey_id != question.survey_id:
+            self.survey_id = question.survey_id
+        if self.created_at is None and self._state.adding:
+            self.created_at = timezone.now()
+        if answer_shards():
+            # ответ всегда сохраняется в шард своего опроса, даже если передан using (его передает, например,
+            # QuerySet.create); при смене опроса на опрос из другого шарда ответ переезжает туда
+            using = shard_for_survey(self.survey_id)
+            if not self._state.adding and self._state.db not in (None, using):
+                Answer.objects.using(self._state.db).filter(pk=self.pk).delete()
+            kwargs['using'] = using
+        super().save(*args, **kwargs)
 
     def __str__(self):
         if self.answer_text:
             return self.answer_text
-        return self.choice.choice_text
+        if self.choices is not None:
+            return ', '.join(Choice.objects.filter(id__in=self.choices).values_list('choice_text', flat=True))
+        return self.choice.choice_text if self.choice_id else ''
+
+    @staticmethod
+    def choice_keys(choice_id, choices):
+        """ID выбранных вариантов ответа; для текстового ответа - [None]."""
+        if choices is not None:
+            return choices
+        return [choice_id]
+
+
+class QuestionTerm(models.Model):
+    """
+    Модель частоты слова в текстовых ответах на вопрос: в скольких ответах встречается слово.
+    Обновляется инкрементально при сохранении и удалении ответов.
+    """
+    question = models.ForeignKey(Question, related_name='terms', on_delete=models.CASCADE, verbose_name='вопрос')
+    term = models.CharField(max_length=100, verbose_name='слово')
+    count = models.IntegerField(default=0, verbose_name='количество ответов')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'term'], name='question_term_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['question', '-count'], name='question_term_count_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class AnswerRollup(models.Model):
+    """
+    Модель количества ответов опроса за интервал времени (минуту, час или день) для графика поступления ответов.
+    Обновляется инкрементально при сохранении и удалении ответов; архивные ответы остаются в счетчиках.
+    """
+    BUCKETS = (
+        ('minute', 'Минута'),
+        ('hour', 'Час'),
+        ('day', 'День'),
+    )
+    # При шардировании счетчики хранятся в шарде ответов опроса, поэтому внешний ключ не проверяется базой данных
+    survey = models.ForeignKey(Survey, related_name='answer_rollups', on_delete=models.CASCADE, verbose_name='опрос',
+                               db_constraint=False)
+    bucket = models.CharField(max_length=10, choices=BUCKETS, verbose_name='интервал')
+    start = models.DateTimeField(verbose_name='начало интервала')
+    count = models.IntegerField(default=0, verbose_name='количество ответов')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['survey', 'bucket', 'start'], name='answer_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.start:%Y-%m-%d %H:%M}: {self.count}'
+
+
+class ArchivedAnswer(models.Model):
+    """
+    Модель ответа в архиве: ответы на давно завершенные опросы переносятся сюда командой archive_answers
+    с сохранением ID, чтобы основная таблица ответов и ее индексы оставались небольшими.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, related_name='archived_answers', on_delete=models.CASCADE,
+                             verbose_name='пользователь', blank=True, null=True, db_constraint=False)
+    question = models.ForeignKey(Question, related_name='archived_answers', on_delete=models.CASCADE,
+                                 verbose_name='вопрос', db_constraint=False)
+    survey = models.ForeignKey(Survey, related_name='archived_answers', on_delete=models.CASCADE,
+                               verbose_name='опрос', null=True, editable=False, db_index=False, db_constraint=False)
+    choice = models.ForeignKey(Choice, related_name='archived_answers', on_delete=models.CASCADE,
+                               verbose_name='выбор', blank=True, null=True, db_constraint=False)
+    answer_text = models.CharField(max_length=200, verbose_name='текст ответа', blank=True, null=True)
+    choices = models.JSONField(verbose_name='выбранные варианты', blank=True, null=True)
+    respondent = models.UUIDField(verbose_name='анонимный респондент', blank=True, null=True)
+    created_at = models.DateTimeField(verbose_name='дата ответа', null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['survey', 'question'], name='archived_survey_question_idx'),
+        ]
+
+    def __str__(self):
+        return self.answer_text or str(Answer.choice_keys(self.choice_id, self.choices))
+
+
+class SurveyResults(models.Model):
+    """
+    Модель неизменяемого снимка итоговых результатов завершенного опроса: JSON сохраняется уже закодированным
+    и отдается без повторного подсчета и сериализации.
+    """
+    survey = models.OneToOneField(Survey, primary_key=True, related_name='frozen_results', on_delete=models.CASCADE,
+                                  verbose_name='опрос')
+    payload = models.TextField(verbose_name='результаты (JSON)')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата подсчета')
+
+    def __str__(self):
+        return f'Результаты опроса {self.survey_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Модель контрольной точки массового импорта (команда import_surveys). Сохраняется в одной транзакции
+    с пачкой записей, поэтому после сбоя импорт продолжается ровно с первой незафиксированной записи.
+    """
+    key = models.CharField(max_length=255, primary_key=True, verbose_name='импорт')
+    state = models.JSONField(verbose_name='состояние')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='дата сохранения')
+
+    def __str__(self):
+        return self.key
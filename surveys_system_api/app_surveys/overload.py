@@ -0,0 +1,242 @@
+"""
+Защита от перегрузки: ограничение времени SQL-запросов представления и сброс лишних запросов,
+когда процесс уже обрабатывает слишком много запросов одновременно. В обоих случаях клиент
+получает 503 с заголовком Retry-After, а событие учитывается в метриках.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import cached_property
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connections
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve, reverse
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from app_surveys import metrics
+
+# код ошибки PostgreSQL query_canceled: запрос прерван по statement_timeout
+QUERY_CANCELED = '57014'
+# как часто (в инструкциях виртуальной машины SQLite) проверяется, не истекло ли время запроса
+SQLITE_PROGRESS_STEPS = 1000
+# префикс запроса на PostgreSQL: лимит действует до конца транзакции, а вне транзакции - только на сам запрос
+TIMEOUT_PREFIX = 'SET LOCAL statement_timeout = {}; '
+
+
+def retry_after():
+    return getattr(settings, 'LOAD_SHEDDING_RETRY_AFTER', 1)
+
+
+class StatementTimeout(OperationalError):
+    """SQL-запрос прерван, потому что выполнялся дольше отведенного представлению времени."""
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'overloaded'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # обработчик исключений DRF выставляет по атрибуту wait заголовок Retry-After
+        self.wait = retry_after()
+
+
+def _is_timeout(error):
+    cause = error.__cause__
+    return getattr(cause, 'pgcode', None) == QUERY_CANCELED or str(error) == 'interrupted'
+
+
+class _TimeoutWrapper:
+    """
+    Обертка для connection.execute_wrapper. На PostgreSQL добавляет к каждому запросу SET LOCAL statement_timeout
+    в той же строке запроса, без отдельного обращения к базе: вне транзакции лимит действует только на этот
+    запрос, в транзакции - до ее конца (после блока он снимается). Запросам серверных курсоров (QuerySet.iterator)
+    лимит выставляется отдельным запросом. На SQLite, где такой настройки нет, прерывает запрос обработчиком
+    прогресса.
+    """
+
+    def __init__(self, milliseconds, label):
+        self.seconds = milliseconds / 1000
+        self.label = label
+        # соединения SQLite с обработчиком прогресса
+        self.configured = set()
+        # соединения PostgreSQL, в транзакции которых лимит выставлен через SET LOCAL
+        self.in_transaction = set()
+
+    @property
+    def milliseconds(self):
+        return int(self.seconds * 1000)
+
+    def __call__(self, execute, sql, params, many, context):
+        connection = context['connection']
+        if connection.vendor == 'postgresql':
+            if getattr(context['cursor'].cursor, 'name', None):
+                return self._execute_named(execute, sql, params, many, context)
+            sql = TIMEOUT_PREFIX.format(self.milliseconds) + sql
+            if connection.in_atomic_block:
+                self.in_transaction.add(connection.alias)
+        elif connection.vendor == 'sqlite':
+            deadline = time.monotonic() + self.seconds
+            connection.connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+            self.configured.add(connection.alias)
+        return self._execute(execute, sql, params, many, context)
+
+    def _execute_named(self, execute, sql, params, many, context):
+        """
+        Запрос серверного курсора psycopg2 отправляется как DECLARE ... CURSOR FOR запрос, и префикс с SET в нем
+        недопустим: лимит выставляется отдельным запросом через обычный курсор того же соединения.
+        """
+        connection = context['connection']
+        if connection.in_atomic_block:
+            with connection.connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s', [self.milliseconds])
+            self.in_transaction.add(connection.alias)
+            return self._execute(execute, sql, params, many, context)
+        # вне транзакции курсор объявляется WITH HOLD и выполняет запрос целиком при DECLARE,
+        # поэтому лимит сессии снимается сразу после него
+        with connection.connection.cursor() as cursor:
+            cursor.execute('SET statement_timeout = %s', [self.milliseconds])
+        try:
+            return self._execute(execute, sql, params, many, context)
+        finally:
+            with connection.connection.cursor() as cursor:
+                cursor.execute('SET statement_timeout TO DEFAULT')
+
+    def _execute(self, execute, sql, params, many, context):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if not _is_timeout(error):
+                raise
+            metrics.registry.observe_statement_timeout(self.label)
+            raise StatementTimeout(f'SQL-запрос выполнялся дольше {self.seconds:g} с') from error
+
+    def reset(self):
+        for alias in self.configured:
+            connection = connections[alias]
+            if connection.connection is not None:
+                connection.connection.set_progress_handler(None, 0)
+        for alias in self.in_transaction:
+            connection = connections[alias]
+            if not connection.in_atomic_block or connection.needs_rollback:
+                # транзакция завершена или будет откачена: вместе с ней сброшен и лимит
+                continue
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL statement_timeout TO DEFAULT')
+            except DatabaseError:
+                # транзакция прервана: лимит сбросит ее откат во внешнем блоке atomic
+                pass
+
+
+@contextmanager
+def statement_timeout(milliseconds, label='unknown'):
+    """Ограничивает время каждого SQL-запроса внутри блока; 0 - без ограничения."""
+    if not milliseconds:
+        yield
+        return
+    wrapper = _TimeoutWrapper(milliseconds, label)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            yield
+    finally:
+        wrapper.reset()
+
+
+class StatementTimeoutMixin:
+    """
+    Миксин для ViewSet: SQL-запросы действия ограничиваются по времени. Лимит действия задается в
+    statement_timeouts (миллисекунды), для остальных действий - settings.DB_STATEMENT_TIMEOUT_MS.
+    Прерванный запрос превращается в ответ 503 с заголовком Retry-After.
+    """
+    statement_timeouts = {}
+
+    def get_statement_timeout(self):
+        default = getattr(settings, 'DB_STATEMENT_TIMEOUT_MS', 0)
+        return self.statement_timeouts.get(getattr(self, 'action', None), default)
+
+    def initial(self, request, *args, **kwargs):
+        # блок открывается до аутентификации, чтобы ограничение касалось и ее запросов
+        self._statement_timeout.enter_context(
+            statement_timeout(self.get_statement_timeout(), f'{type(self).__name__}.{self.action}'))
+        super().initial(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, StatementTimeout):
+            exc = Overloaded('Запрос выполнялся слишком долго, повторите его позже.', 'statement_timeout')
+        return super().handle_exception(exc)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._statement_timeout = ExitStack()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # блок закрывается и тогда, когда исключение не превратилось в ответ
+            self._statement_timeout.close()
+
+
+class LoadSheddingMiddleware:
+    """
+    Middleware сброса нагрузки: если процесс уже обрабатывает LOAD_SHEDDING_MAX_IN_FLIGHT запросов,
+    новые запросы сразу получают 503 с Retry-After, не занимая соединения с базой. Эндпоинты метрик
+    и готовности не ограничиваются, чтобы перегрузку было видно в мониторинге. Запрос занимает место,
+    пока сервер не закроет ответ: потоковый ответ (SSE) учитывается все время, пока открыт поток.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    @cached_property
+    def exempt_paths(self):
+        return {reverse('metrics'), reverse('readiness')}
+
+    def __call__(self, request):
+        limit = getattr(settings, 'LOAD_SHEDDING_MAX_IN_FLIGHT', 0)
+        if not limit or request.path_info in self.exempt_paths:
+            return self.get_response(request)
+        with self._lock:
+            shed = self.in_flight >= limit
+            if not shed:
+                self.in_flight += 1
+        if shed:
+            return self.shed(request)
+        release = self._release()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        # сервер закрывает ответ, когда отправил его целиком
+        response._resource_closers.append(release)
+        return response
+
+    def _release(self):
+        released = False
+
+        def release():
+            nonlocal released
+            with self._lock:
+                if not released:
+                    released = True
+                    self.in_flight -= 1
+
+        return release
+
+    def shed(self, request):
+        try:
+            label = metrics.view_label(resolve(request.path_info).func, request.method)
+        except Resolver404:
+            label = 'unresolved'
+        request._metrics_view = label
+        metrics.registry.observe_shed(label)
+        response = JsonResponse({'detail': Overloaded.default_detail}, status=Overloaded.status_code,
+                                json_dumps_params={'ensure_ascii': False})
+        response['Retry-After'] = str(retry_after())
+        return response
@@ -0,0 +1,133 @@
+import cProfile
+import io
+import pstats
+import random
+import time
+import uuid
+from contextlib import ExitStack
+from operator import itemgetter
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+from app_surveys import metrics
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_SALT = 'app_surveys.profiling'
+PROFILE_STATS_LIMIT = 50
+
+
+def make_profile_token():
+    """Подписанное значение заголовка X-Profile для профилирования запроса."""
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign(uuid.uuid4().hex)
+
+
+def is_valid_profile_token(value):
+    try:
+        signing.TimestampSigner(salt=PROFILE_SALT).unsign(
+            value, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class ProfileStore:
+    """
+    Кольцевой буфер профилей в общем для процессов кэше (settings.SHARED_CACHE): профиль, снятый одним воркером,
+    доступен через API любого другого. Хранит не больше maxlen последних профилей, ячейка буфера - номер записи
+    по модулю maxlen. При одновременной записи из разных процессов профиль может занять ячейку соседнего:
+    для отладочного буфера это допустимо.
+    """
+
+    def __init__(self, maxlen, prefix='profiling'):
+        self.maxlen = maxlen
+        self.prefix = prefix
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'SHARED_CACHE', 'default')]
+
+    def _slot_key(self, slot):
+        return f'{self.prefix}:slot:{slot}'
+
+    def add(self, profile):
+        cache = self._cache()
+        counter_key = f'{self.prefix}:counter'
+        cache.add(counter_key, 0, None)
+        try:
+            number = cache.incr(counter_key)
+        except ValueError:
+            # счетчик вытеснен из кэша между add и incr
+            number = 0
+            cache.set(counter_key, number, None)
+        # без срока хранения: профиль вытесняет только следующий профиль, попавший в ту же ячейку
+        cache.set(self._slot_key(number % self.maxlen), profile, None)
+
+    def get(self, profile_id):
+        for profile in self.list():
+            if profile['id'] == profile_id:
+                return profile
+        return None
+
+    def list(self):
+        profiles = self._cache().get_many([self._slot_key(slot) for slot in range(self.maxlen)]).values()
+        return sorted(profiles, key=itemgetter('started_at'), reverse=True)
+
+
+store = ProfileStore(maxlen=getattr(settings, 'PROFILING_BUFFER_SIZE', 50))
+
+
+class ProfilingMiddleware:
+    """
+    Middleware для профилирования запросов: профилирует запрос с подписанным заголовком X-Profile
+    или случайную долю запросов (PROFILING_SAMPLE_RATE). Профиль cProfile и список SQL-запросов
+    сохраняются в общий для процессов кольцевой буфер, идентификатор профиля возвращается в заголовке X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        token = request.META.get(PROFILE_HEADER)
+        if token:
+            return is_valid_profile_token(token)
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        return bool(rate) and random.random() < rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        stats = metrics.RequestStats()
+        profiler = cProfile.Profile()
+        started_at = timezone.now()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_STATS_LIMIT)
+        profile_id = uuid.uuid4().hex
+        store.add({
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'started_at': started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'db_time_ms': round(stats.db_time * 1000, 3),
+            'queries': [{'sql': sql, 'duration_ms': round(query_time * 1000, 3)} for sql, query_time in stats.queries],
+            'profile': output.getvalue(),
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,45 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Рендерер для Server-Sent Events. Поток событий отдается как StreamingHttpResponse,
+    рендерер нужен для согласования формата и для ответов об ошибках.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f'event: error\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'.encode(self.charset)
+
+
+class PrerenderedJSONResponse(Response):
+    """
+    Ответ DRF с уже закодированным JSON (например, из кэша): тело не рендерится повторно,
+    а data декодируется только при обращении к нему.
+    """
+
+    def __init__(self, content, data=None, **kwargs):
+        self._content_bytes = content
+        self._data = data
+        super().__init__(**kwargs)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self._content_bytes)
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        if value is not None:
+            self._data = value
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return self._content_bytes
@@ -0,0 +1,98 @@
+import json
+from collections import Counter
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from app_surveys import archive, live
+from app_surveys.models import Choice, Question, SurveyResults
+
+
+def is_closed(survey, now=None):
+    """Опрос завершен: ответы на него больше не принимаются, и результаты не изменятся."""
+    if now is None:
+        now = timezone.now()
+    return survey.date_end < now
+
+
+def compute_results(survey):
+    """
+    Итоги опроса: количество ответов на каждый вопрос, по каждому варианту и количество текстовых ответов,
+    а также число респондентов (различных пользователей и анонимных респондентов с токеном; анонимные ответы
+    без токена учитываются только в счетчиках ответов).
+    """
+    counts = live.results_counts(survey.id)
+    answers, respondents = Counter(), set()
+    for queryset in archive.survey_answers(survey.id):
+        answers.update(dict(queryset.values_list('question_id').annotate(count=Count('id')).order_by()))
+        respondents.update(queryset.filter(user__isnull=False).values_list('user_id', flat=True).distinct())
+        respondents.update(queryset.filter(user__isnull=True, respondent__isnull=False)
+                           .values_list('respondent', flat=True).distinct())
+
+    choices = {}
+    for question_id, choice_id, choice_text in (Choice.objects.filter(question__survey_id=survey.id)
+                                                .values_list('question_id', 'id', 'choice_text').order_by('id')):
+        choices.setdefault(question_id, []).append(
+            {'choice': choice_id, 'choice_text': choice_text, 'count': counts[(question_id, choice_id)]})
+
+    questions = []
+    for question_id, question_text, question_type in (Question.objects.filter(survey_id=survey.id)
+                                                      .values_list('id', 'question_text', 'question_type')
+                                                      .order_by('id')):
+        question = {'question': question_id, 'question_text': question_text, 'question_type': question_type,
+                    'answers': answers[question_id]}
+        if question_type == 'text':
+            question['text_answers'] = counts[(question_id, None)]
+        else:
+            question['choices'] = choices.get(question_id, [])
+        questions.append(question)
+
+    return {
+        'survey': survey.id,
+        'title': survey.title,
+        'date_end': survey.date_end.isoformat(),
+        'respondents': len(respondents),
+        'questions': questions,
+    }
+
+
+def encode(results):
+    return json.dumps(results, ensure_ascii=False, separators=(',', ':'))
+
+
+def get_results_payload(survey):
+    """
+    JSON итогов опроса. Для завершенного опроса результаты считаются один раз при первом обращении
+    и сохраняются в SurveyResults; дальнейшие обращения читают готовую строку.
+    Возвращает пару (JSON, снимок ли это).
+    """
+    if not is_closed(survey):
+        return encode(compute_results(survey)), False
+    payload = SurveyResults.objects.filter(survey_id=survey.id).values_list('payload', flat=True).first()
+    if payload is None:
+        payload = freeze(survey).payload
+    return payload, True
+
+
+def freeze(survey, refresh=False):
+    """Считает и сохраняет снимок результатов завершенного опроса (refresh - пересчитать существующий)."""
+    using = router.db_for_write(SurveyResults)
+    if not refresh:
+        snapshot = SurveyResults.objects.using(using).filter(survey_id=survey.id).first()
+        if snapshot is not None:
+            return snapshot
+    payload = encode(compute_results(survey))
+    try:
+        with transaction.atomic(using=using):
+            snapshot, _ = SurveyResults.objects.using(using).update_or_create(
+                survey_id=survey.id, defaults={'payload': payload})
+    except IntegrityError:
+        # снимок одновременно сохранил другой процесс
+        snapshot = SurveyResults.objects.using(using).get(survey_id=survey.id)
+    return snapshot
+
+
+def invalidate(survey_id):
+    """Удаляет снимок (опрос продлен или изменены его вопросы и варианты)."""
+    SurveyResults.objects.filter(survey_id=survey_id).delete()
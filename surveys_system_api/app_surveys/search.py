@@ -0,0 +1,80 @@
+import re
+
+from django.db import connections, router
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from app_surveys.models import QuestionTerm
+
+# Конфигурация полнотекстового поиска PostgreSQL; должна совпадать с выражением GIN-индексов в миграции 0010
+SEARCH_CONFIG = 'russian'
+
+# Правила разбиения на слова скопированы в миграцию 0010 (начальное заполнение частот слов)
+TERM_MIN_LENGTH = 3
+TERM_MAX_LENGTH = 100
+STOP_WORDS = frozenset("""
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от
+    меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+    вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без
+    будто чего раз тоже себе под будет тогда кто этот того потому этого какой совсем ним здесь этом один
+    почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после
+    над больше тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед
+    иногда лучше чуть том нельзя такой им более всегда конечно всю между
+    the and for are but not you all any can had her was one our out has his how its may new now see who
+    did get him let put say she too use that with this from they will would there their what about which
+""".split())
+
+
+def tokenize(text):
+    """Множество значимых слов текста в нижнем регистре."""
+    return {word for word in re.findall(r'\w+', (text or '').lower())
+            if TERM_MIN_LENGTH <= len(word) <= TERM_MAX_LENGTH and word not in STOP_WORDS and not word.isdigit()}
+
+
+def _fts5_query(query):
+    """Запрос FTS5 из пользовательской строки: все слова в кавычках, соединенные через И."""
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+def _search(queryset, field, query):
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        return queryset.filter(RawSQL(
+            f"to_tsvector('{SEARCH_CONFIG}', coalesce({table}.{field}, '')) "
+            f"@@ plainto_tsquery('{SEARCH_CONFIG}', %s)",
+            [query], output_field=BooleanField()))
+    if connection.vendor == 'sqlite':
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s', [_fts5_query(query)]))
+    return queryset.filter(**{f'{field}__icontains': query})
+
+
+def search_answers(queryset, query):
+    """Полнотекстовый поиск по текстовым ответам (GIN-индекс в PostgreSQL, FTS5 в SQLite)."""
+    return _search(queryset, 'answer_text', query)
+
+
+def search_questions(queryset, query):
+    """Полнотекстовый поиск по текстам вопросов (GIN-индекс в PostgreSQL, FTS5 в SQLite)."""
+    return _search(queryset, 'question_text', query)
+
+
+def update_terms(question_id, counts):
+    """
+    Прибавляет к частотам слов вопроса значения из counts {слово: изменение} одним запросом
+    INSERT ... ON CONFLICT (поддерживается PostgreSQL и SQLite).
+    """
+    counts = {term: delta for term, delta in counts.items() if delta}
+    if not counts:
+        return
+    table = QuestionTerm._meta.db_table
+    values = ', '.join(['(%s, %s, %s)'] * len(counts))
+    params = [value for term, delta in counts.items() for value in (question_id, term, delta)]
+    with connections[router.db_for_write(QuestionTerm)].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (question_id, term, count) VALUES {values} '
+            f'ON CONFLICT (question_id, term) DO UPDATE SET count = {table}.count + EXCLUDED.count',
+            params)
+        if any(delta < 0 for delta in counts.values()):
+            cursor.execute(f'DELETE FROM {table} WHERE question_id = %s AND count <= 0', [question_id])
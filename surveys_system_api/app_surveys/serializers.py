@@ -1,9 +1,20 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from app_surveys.models import Survey, Question, Choice, Answer
-from datetime import datetime
+from app_surveys import metrics, sharding
+from app_surveys.authentication import get_respondent
 
 
-class ChoiceSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Учитывает время сериализации в метриках текущего запроса."""
+
+    def to_representation(self, instance):
+        with metrics.serialization_timer():
+            return super().to_representation(instance)
+
+
+class ChoiceSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериалайзер модели Выбор"""
 
     question_text = serializers.CharField(source='question.question_text', read_only=True)
@@ -16,7 +27,7 @@ class ChoiceSerializer(serializers.ModelSerializer):
         fields = ['id', 'question', 'question_text', 'choice_text']
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериалайзер модели Вопрос"""
 
     survey = serializers.CharField(source='survey.title', read_only=True)
@@ -38,7 +49,7 @@ class QuestionSerializer(serializers.ModelSerializer):
         raise serializers.ValidationError(f'В базе данных отсутствует опрос с id = {survey_id}')
 
 
-class SurveySerializer(serializers.ModelSerializer):
+class SurveySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериалайзер модели Опрос"""
 
     questions = QuestionSerializer(many=True, read_only=True)
@@ -48,7 +59,7 @@ class SurveySerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'date_start', 'date_end', 'description', 'questions']
 
 
-class AnswerSerializer(serializers.ModelSerializer):
+class AnswerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериалайзер модели Ответ"""
 
     user = serializers.ReadOnlyField(source='user.username')
@@ -58,30 +69,98 @@ class AnswerSerializer(serializers.ModelSerializer):
                                           required=False)
     choice_text = serializers.CharField(source='choice.choice_text', allow_null=True, required=False, read_only=True)
 
+    choices = serializers.ListField(child=serializers.IntegerField(), allow_null=True, required=False)
+
     answer_text = serializers.CharField(max_length=200, allow_null=True, required=False)
-    survey = serializers.ReadOnlyField(source='question.survey.title')
+    survey = serializers.ReadOnlyField(source='survey.title')
 
     class Meta:
         model = Answer
-        fields = ['id', 'user', 'survey', 'question', 'question_text', 'choice', 'choice_text', 'answer_text']
+        fields = ['id', 'user', 'survey', 'question', 'question_text', 'choice', 'choice_text', 'choices',
+                  'answer_text']
 
     def validate(self, attrs):
-        question_type = Question.objects.get(id=attrs['question'].id).question_type
-        try:
-            if question_type == "one_option" or question_type == "text":
-                obj = Answer.objects.get(question=attrs['question'].id)
-            elif question_type == "many_options":
-                obj = Answer.objects.get(question=attrs['question'].id,
-                                         choice=attrs['choice'].id)
-        except Answer.DoesNotExist:
+        if self.instance is not None and not Survey.objects.active().filter(id=self.instance.survey_id).exists():
+            # ответы завершенного опроса не меняются: его итоги сохранены снимком
+            raise serializers.ValidationError('Опрос, содержащий данный ответ, завершен.')
+        question = attrs.get('question') or self.instance.question
+        if question.question_type == 'many_options':
+            if self.partial and self.instance is not None and 'choices' not in attrs and 'choice' not in attrs:
+                # частичное изменение без вариантов ответа оставляет выбранные ранее варианты
+                attrs['choices'] = self.instance.choices
+            attrs['choices'] = self._validate_choices(question, attrs)
+            attrs['choice'] = None
+        elif attrs.get('choices'):
+            raise serializers.ValidationError(
+                'Несколько вариантов можно выбрать только в вопросе с выбором нескольких вариантов ответа.')
+
+        request = self.context.get('request')
+        if request is None:
             return attrs
+        if request.user.is_authenticated:
+            answers = Answer.objects.filter(user=request.user, question=question)
+        elif get_respondent(request) is not None:
+            answers = Answer.objects.filter(respondent=get_respondent(request).id, user__isnull=True,
+                                            question=question)
         else:
+            return attrs
+        if self.instance is not None:
+            answers = answers.exclude(pk=self.instance.pk)
+        if sharding.for_survey(answers, question.survey_id).exists():
             raise serializers.ValidationError('Вы уже отвечали на этот вопрос.')
+        return attrs
+
+    @staticmethod
+    def _validate_choices(question, attrs):
+        """Все выбранные варианты ответа на вопрос с выбором нескольких вариантов сохраняются одной строкой."""
+        choice_ids = set(attrs.get('choices') or [])
+        if attrs.get('choice') is not None:
+            choice_ids.add(attrs['choice'].id)
+        if not choice_ids:
+            raise serializers.ValidationError({'choices': 'Выберите хотя бы один вариант ответа.'})
+        foreign = choice_ids - set(Choice.objects.filter(question=question, id__in=choice_ids)
+                                   .values_list('id', flat=True))
+        if foreign:
+            raise serializers.ValidationError(
+                {'choices': f'Варианты {sorted(foreign)} не относятся к вопросу с id = {question.id}'})
+        return sorted(choice_ids)
 
     def validate_question(self, value):
-        survey_id = value.survey.id
-        active_surveys = Survey.objects.filter(date_end__gte=datetime.now(), date_start__lte=datetime.now())
-        active_surveys_ids = active_surveys.values_list('id', flat=True)
-        if survey_id in active_surveys_ids:
+        if Survey.objects.active().filter(id=value.survey_id).exists():
             return value
         raise serializers.ValidationError(f'Опрос, содержащий данный вопрос, завершен.')
+
+
+class SurveyCloneSerializer(serializers.Serializer):
+    """Сериалайзер параметров копирования опроса"""
+
+    title = serializers.CharField(max_length=200, required=False)
+    date_end = serializers.DateTimeField()
+
+    def validate_date_end(self, value):
+        if value <= timezone.now():
+            raise serializers.ValidationError('Дата окончания копии опроса должна быть в будущем.')
+        return value
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Сериалайзер вложенного запроса пакета"""
+
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False, allow_null=True)
+
+
+class BatchSerializer(serializers.Serializer):
+    """Сериалайзер пакетного запроса"""
+
+    atomic = serializers.BooleanField(default=False)
+    requests = BatchItemSerializer(many=True)
+
+    def validate_requests(self, value):
+        limit = settings.BATCH_MAX_REQUESTS
+        if not value:
+            raise serializers.ValidationError('Пакет не содержит запросов.')
+        if len(value) > limit:
+            raise serializers.ValidationError(f'Пакет может содержать не более {limit} запросов.')
+        return value
@@ -0,0 +1,165 @@
+"""
+Шардирование ответов по опросам. При непустом settings.ANSWER_SHARDS ответы и архивные ответы опроса хранятся
+в одном из шардов (см. db_routers.shard_for_survey), остальные модели - в основной базе. На каждом шарде
+применяются все миграции; таблицы других моделей там остаются пустыми, поэтому внешние ключи ответов
+не проверяются базой данных шарда (в основной базе ограничения остаются).
+
+Выборки ответов без подсказки роутеру (instance) читают только основную базу, поэтому ответы опроса
+выбираются через for_survey, а ответы всех опросов - через scatter/gather; админка ответов выбирает шард
+фильтром (app_surveys.admin.AnswerAdmin).
+
+ID ответов уникальны между шардами: каждый шард выдает ID из своего диапазона (номер шарда * 2**SHARD_ID_BITS),
+поэтому ответы переносятся между шардами с сохранением ID. Это верно для PostgreSQL; SQLite (локальный запуск)
+выдает следующий ID после наибольшего в таблице, поэтому ответ, перенесенный в шард с меньшим номером,
+сдвигает выдачу ID этого шарда в чужой диапазон.
+"""
+import heapq
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from operator import attrgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction
+
+from app_surveys.db_routers import PRIMARY_DB, answer_shards, shard_for_survey
+from app_surveys.models import Answer, ArchivedAnswer
+
+# Размер диапазона ID одного шарда. ID первых 32 шардов меньше 2**53 и без потерь читаются клиентами на JavaScript.
+SHARD_ID_BITS = 48
+BATCH_SIZE = 1000
+
+
+def db_for_survey(survey_id):
+    """База для записи ответов опроса: его шард или, без шардирования, основная база."""
+    if answer_shards():
+        return shard_for_survey(survey_id)
+    return router.db_for_write(Answer)
+
+
+def for_survey(queryset, survey_id):
+    """Набор запросов к ответам опроса в его шарде; без шардирования возвращается без изменений."""
+    if answer_shards():
+        return queryset.using(shard_for_survey(survey_id))
+    return queryset
+
+
+def scatter(queryset):
+    """Копии набора запросов для каждого шарда (без шардирования - сам набор)."""
+    return [queryset.using(alias) for alias in answer_shards()] or [queryset]
+
+
+def gather(queryset):
+    """Объекты набора запросов из всех шардов, упорядоченные по ID: шарды опрашиваются по очереди."""
+    return list(heapq.merge(*(answers.order_by('pk') for answers in scatter(queryset)), key=attrgetter('pk')))
+
+
+@contextmanager
+def atomic(using=PRIMARY_DB):
+    """
+    Транзакции в базе using и во всех шардах ответов; возвращает список баз для transaction.set_rollback.
+    Транзакции шардов вложены в транзакцию основной базы и фиксируются раньше нее: ошибка в любой базе
+    до фиксации откатывает изменения во всех.
+    """
+    databases = list(dict.fromkeys([using, *answer_shards()]))
+    with ExitStack() as stack:
+        for alias in databases:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield databases
+
+
+def split(items, survey_id, default=None):
+    """Раскладывает элементы по шардам их опросов: {алиас: [элементы]}. survey_id(элемент) - опрос элемента."""
+    if not answer_shards():
+        return {default or router.db_for_write(Answer): list(items)} if items else {}
+    groups = defaultdict(list)
+    for item in items:
+        groups[shard_for_survey(survey_id(item))].append(item)
+    return groups
+
+
+def move_rows(queryset, target, batch_size=BATCH_SIZE):
+    """
+    Переносит строки набора запросов в базу target пачками с сохранением ID: пачка вставляется в target
+    (уже перенесенные строки пропускаются) и удаляется из исходной базы. Общей транзакции у баз нет, поэтому
+    прерванный перенос оставляет копии последней пачки в обеих базах, а повторный запуск его завершает.
+    Сигналы не отправляются: ответы не меняются, меняется только их база.
+    """
+    model, source = queryset.model, queryset.db
+    table = model._meta.db_table
+    moved = 0
+    while True:
+        rows = list(queryset.order_by('id')[:batch_size])
+        if not rows:
+            return moved
+        model._base_manager.using(target).bulk_create(rows, ignore_conflicts=True)
+        ids = [row.id for row in rows]
+        with connections[source].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+        moved += len(ids)
+
+
+def move_question(question_id, previous_survey_id, survey_id):
+    """Ответы вопроса, перенесенного в другой опрос, переходят в этот опрос и, если нужно, в его шард."""
+    source, target = db_for_survey(previous_survey_id), db_for_survey(survey_id)
+    for model in (Answer, ArchivedAnswer):
+        answers = model.objects.using(source).filter(question_id=question_id)
+        answers.update(survey_id=survey_id)
+        if source != target:
+            move_rows(answers, target)
+
+
+def delete_answers(using, filters, survey_id=None):
+    """
+    Удаляет ответы по условиям filters, до которых не дошло каскадное удаление в базе using: они лежат в других
+    шардах (в шарде опроса survey_id или, если опрос не известен, во всех). Сигналы удаления ответов отправляются.
+    """
+    if not answer_shards():
+        return
+    shards = [shard_for_survey(survey_id)] if survey_id is not None else answer_shards()
+    for alias in shards:
+        if alias != using:
+            for model in (Answer, ArchivedAnswer):
+                model.objects.using(alias).filter(**filters).delete()
+
+
+def misplaced_surveys():
+    """Пары (опрос, шард) для ответов, лежащих не в шарде своего опроса (например, после добавления шарда)."""
+    for alias in answer_shards():
+        survey_ids = set()
+        for model in (Answer, ArchivedAnswer):
+            survey_ids.update(model.objects.using(alias).filter(survey_id__isnull=False)
+                              .values_list('survey_id', flat=True).distinct())
+        for survey_id in sorted(survey_ids):
+            if shard_for_survey(survey_id) != alias:
+                yield survey_id, alias
+
+
+def move_survey(survey_id, source, batch_size=BATCH_SIZE):
+    """Переносит ответы и архивные ответы опроса из шарда source в его шард. Возвращает количество строк."""
+    target = shard_for_survey(survey_id)
+    return sum(move_rows(model.objects.using(source).filter(survey_id=survey_id), target, batch_size)
+               for model in (Answer, ArchivedAnswer))
+
+
+def reserve_ids(sender, using, **kwargs):
+    """
+    Обработчик post_migrate: сдвигает счетчик ID ответов шарда к началу его диапазона, если счетчик еще не там.
+    Номер шарда - его позиция в ANSWER_SHARDS, поэтому новые шарды добавляются только в конец списка.
+    """
+    shards = answer_shards()
+    if using not in shards or shards.index(using) == 0:
+        return
+    start = shards.index(using) << SHARD_ID_BITS
+    table = Answer._meta.db_table
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(%s, COALESCE("
+                           "pg_sequence_last_value(pg_get_serial_sequence(%s, 'id')::regclass), 0)))",
+                           [table, start, table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute('UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s', [start, table])
+            if not cursor.rowcount:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+        else:
+            raise ImproperlyConfigured(f'Шардирование ответов не поддерживается для {connection.vendor}')
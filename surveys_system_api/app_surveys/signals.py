@@ -0,0 +1,172 @@
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from app_surveys import compression, crosstab, live, results, search, sharding, timeline
+from app_surveys.models import Answer, Choice, Question, Survey
+
+
+def _apply_changes(changes, using=None):
+    """
+    После фиксации транзакции в базе using (шарде ответа) применяет изменения ответов
+    [(survey_id, question_id, choice_id, респондент, ±1), ...] к индексам таблиц сопряженности
+    и публикует изменения счетчиков в поток результатов.
+    """
+    def apply():
+        deltas = defaultdict(Counter)
+        for survey_id, question_id, choice_id, respondent, delta in changes:
+            crosstab.registry.apply(survey_id, question_id, choice_id, respondent, delta)
+            deltas[survey_id][(question_id, choice_id)] += delta
+        for survey_id, survey_deltas in deltas.items():
+            survey_deltas = {key: delta for key, delta in survey_deltas.items() if delta}
+            if survey_deltas:
+                live.feed.publish(survey_id, survey_deltas)
+
+    transaction.on_commit(apply, using=using)
+
+
+def _answer_changes(survey_id, question_id, choice_id, choices, respondent, delta):
+    return [(survey_id, question_id, key, respondent, delta) for key in Answer.choice_keys(choice_id, choices)]
+
+
+def _current(answer):
+    respondent = crosstab.respondent_key(answer.user_id, answer.respondent)
+    return answer.survey_id, answer.question_id, answer.choice_id, answer.choices, respondent
+
+
+def _update_terms(previous, current):
+    """
+    Обновляет частоты слов вопросов в текущей транзакции. previous и current - пары (question_id, answer_text)
+    до и после изменения ответа (None, если ответа не было). Слово учитывается не более одного раза на ответ.
+    """
+    counts = defaultdict(Counter)
+    for state, delta in ((previous, -1), (current, 1)):
+        if state is not None:
+            question_id, answer_text = state
+            for term in search.tokenize(answer_text):
+                counts[question_id][term] += delta
+    for question_id, question_counts in counts.items():
+        search.update_terms(question_id, question_counts)
+
+
+@receiver(pre_save, sender=Answer)
+def remember_previous_answer(sender, instance, using, **kwargs):
+    """Запоминает прежнее состояние изменяемого ответа, чтобы отправить корректное изменение счетчиков."""
+    instance._previous = instance._previous_text = None
+    if instance.pk and not instance._state.adding:
+        previous = (Answer.objects.using(using).filter(pk=instance.pk)
+                    .values_list('survey_id', 'question_id', 'choice_id', 'choices', 'user_id', 'respondent',
+                                 'answer_text')
+                    .first())
+        if previous is not None:
+            instance._previous = (*previous[:4], crosstab.respondent_key(previous[4], previous[5]))
+            instance._previous_text = (previous[1], previous[-1])
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, created, using, **kwargs):
+    previous_text = getattr(instance, '_previous_text', None)
+    current_text = (instance.question_id, instance.answer_text)
+    if previous_text != current_text:
+        _update_terms(previous_text, current_text)
+    current = _current(instance)
+    previous = getattr(instance, '_previous', None)
+    if not created:
+        # изменение ответа (например, через админку) сбрасывает снимок итогов завершенного опроса
+        results.invalidate(instance.survey_id)
+        if previous is not None and previous[0] != instance.survey_id:
+            results.invalidate(previous[0])
+    if created:
+        timeline.update(timeline.changes(instance.survey_id, instance.created_at, 1))
+    elif previous is not None and previous[0] != instance.survey_id:
+        counts = timeline.changes(previous[0], instance.created_at, -1)
+        counts.update(timeline.changes(instance.survey_id, instance.created_at, 1))
+        timeline.update(counts)
+    if previous == current:
+        return
+    changes = _answer_changes(*previous, -1) if previous is not None else []
+    _apply_changes(changes + _answer_changes(*current, 1), using)
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, using, **kwargs):
+    _update_terms((instance.question_id, instance.answer_text), None)
+    timeline.update(timeline.changes(instance.survey_id, instance.created_at, -1))
+    results.invalidate(instance.survey_id)
+    _apply_changes(_answer_changes(*_current(instance), -1), using)
+
+
+def _invalidate_definition(survey_id):
+    """
+    Сбрасывает кэш описания опроса сразу и еще раз после фиксации транзакции: иначе параллельный запрос
+    успел бы закэшировать прежнее описание, прочитанное до фиксации.
+    """
+    compression.invalidate_survey_definition(survey_id)
+    transaction.on_commit(lambda: compression.invalidate_survey_definition(survey_id))
+
+
+def _survey_changed(survey_id):
+    """Сбрасывает построенные по структуре опроса индексы, кэш описания и снимок итогов."""
+    results.invalidate(survey_id)
+    _invalidate_definition(survey_id)
+    transaction.on_commit(lambda: crosstab.registry.invalidate(survey_id))
+
+
+@receiver(pre_save, sender=Question)
+def remember_previous_survey(sender, instance, **kwargs):
+    instance._previous_survey_id = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_survey_id = Question.objects.filter(pk=instance.pk).values_list('survey_id', flat=True).first()
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    previous_survey_id = getattr(instance, '_previous_survey_id', None)
+    if previous_survey_id is not None and previous_survey_id != instance.survey_id:
+        # вопрос перенесен в другой опрос: опрос, продублированный в ответах, переносится вместе с ним
+        sharding.move_question(instance.id, previous_survey_id, instance.survey_id)
+        timeline.rebuild(previous_survey_id)
+        timeline.rebuild(instance.survey_id)
+        _survey_changed(previous_survey_id)
+    _survey_changed(instance.survey_id)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, using, **kwargs):
+    sharding.delete_answers(using, {'question_id': instance.id}, instance.survey_id)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    _survey_changed(instance.question.survey_id)
+
+
+@receiver(post_delete, sender=Choice)
+def choice_deleted(sender, instance, using, **kwargs):
+    sharding.delete_answers(using, {'choice_id': instance.id}, instance.question.survey_id)
+
+
+@receiver(post_save, sender=Survey)
+def survey_saved(sender, instance, created, **kwargs):
+    """Изменение опроса (например, продление) сбрасывает снимок итоговых результатов и кэш описания."""
+    if not created:
+        results.invalidate(instance.id)
+    _invalidate_definition(instance.id)
+
+
+@receiver(post_delete, sender=Survey)
+def survey_deleted(sender, instance, using, **kwargs):
+    sharding.delete_answers(using, {'survey_id': instance.id}, instance.id)
+    timeline.clear(instance.id)
+    _invalidate_definition(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, using, **kwargs):
+    """Каскадное удаление пользователя доходит только до ответов в основной базе; в шардах они удаляются здесь."""
+    sharding.delete_answers(using, {'user_id': instance.id})
@@ -0,0 +1,117 @@
+"""
+Проверка планов SQL-запросов представлений: запросы, выполненные при обращении к представлению,
+перехватываются, для каждого выполняется EXPLAIN (PostgreSQL) или EXPLAIN QUERY PLAN (SQLite),
+и по плану определяются таблицы, читаемые полным просмотром. Результат сравнивается с эталоном
+базы данных из query_plans_<vendor>.json: число запросов и планы у PostgreSQL и SQLite различаются.
+Эталон перезаписывается при запуске тестов с UPDATE_QUERY_PLANS=1.
+
+На PostgreSQL EXPLAIN выполняется с enable_seqscan = off: в тестовой базе таблицы малы, и планировщик
+выбрал бы полный просмотр даже при подходящем индексе. С выключенным Seq Scan он остается в плане,
+только если индекса для запроса нет.
+"""
+import json
+import os
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app_surveys.overload import TIMEOUT_PREFIX
+
+BASELINE_DIR = os.path.dirname(__file__)
+UPDATE_BASELINE = os.environ.get('UPDATE_QUERY_PLANS') == '1'
+
+# Таблицы, которые в рабочей базе содержат миллионы строк: полный просмотр любой из них - регрессия
+LARGE_TABLES = frozenset({
+    'app_surveys_survey', 'app_surveys_question', 'app_surveys_choice', 'app_surveys_answer',
+    'app_surveys_archivedanswer', 'app_surveys_questionterm',
+})
+
+_explainable_re = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+# лимит времени запроса представления (app_surveys.overload) на PostgreSQL передается в строке запроса
+_timeout_prefix_re = re.compile('^' + re.escape(TIMEOUT_PREFIX).replace(r'\{\}', r'\d+'))
+_alias_re = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)"?')
+_sqlite_scan_re = re.compile(r'^SCAN (\w+)')
+
+
+def _explain(sql):
+    """Таблицы, которые запрос читает полным просмотром."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return _postgresql_scans(plan[0]['Plan'])
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        aliases = dict((alias, table) for table, alias in _alias_re.findall(sql))
+        scans = set()
+        for row in cursor.fetchall():
+            match = _sqlite_scan_re.match(row[-1])
+            if match:
+                scans.add(aliases.get(match[1], match[1]))
+        return scans
+
+
+def _postgresql_scans(node):
+    scans = {node['Relation Name']} if node.get('Node Type') == 'Seq Scan' else set()
+    for child in node.get('Plans', ()):
+        scans |= _postgresql_scans(child)
+    return scans
+
+
+class QueryPlanRecorder(CaptureQueriesContext):
+    """Перехватывает запросы блока и собирает полные просмотры больших таблиц."""
+
+    def __init__(self):
+        super().__init__(connection)
+
+    @property
+    def statements(self):
+        statements = (_timeout_prefix_re.sub('', query['sql']) for query in self.captured_queries)
+        return [sql for sql in statements if _explainable_re.match(sql)]
+
+    def full_scans(self):
+        scans = set()
+        for sql in self.statements:
+            scans |= _explain(sql) & LARGE_TABLES
+        return sorted(scans)
+
+
+class QueryPlanBaseline:
+    """
+    Эталон базы данных тестов: для каждого сценария - допустимое число запросов и разрешенные полные просмотры.
+    Эталона для новой базы данных еще нет: он создается запуском тестов с UPDATE_QUERY_PLANS=1.
+    """
+
+    def __init__(self):
+        self.path = os.path.join(BASELINE_DIR, f'query_plans_{connection.vendor}.json')
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as file:
+                self.entries = json.load(file)
+        self.updated = {}
+
+    def check(self, test_case, name, recorder):
+        observed = {'max_queries': len(recorder), 'full_scans': recorder.full_scans()}
+        if UPDATE_BASELINE:
+            self.updated[name] = observed
+            return
+        expected = self.entries.get(name)
+        test_case.assertIsNotNone(expected, f'Нет эталона для {name}: запустите тесты с UPDATE_QUERY_PLANS=1')
+        test_case.assertLessEqual(
+            observed['max_queries'], expected['max_queries'],
+            f'{name}: {observed["max_queries"]} запросов при бюджете {expected["max_queries"]}:\n'
+            + '\n'.join(query['sql'] for query in recorder.captured_queries))
+        new_scans = set(observed['full_scans']) - set(expected['full_scans'])
+        test_case.assertFalse(new_scans, f'{name}: полный просмотр таблиц {sorted(new_scans)} вместо индекса')
+
+    def save(self):
+        if UPDATE_BASELINE and self.updated:
+            entries = {**self.entries, **self.updated}
+            with open(self.path, 'w', encoding='utf-8') as file:
+                json.dump(dict(sorted(entries.items())), file, ensure_ascii=False, indent=2)
+                file.write('\n')
@@ -0,0 +1,69 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from app_surveys.admin import EstimatedCountPaginator
+from app_surveys.models import Survey, Question, Choice, Answer
+
+
+class AdminChangelistTest(TestCase):
+    """ Класс тестов для списков объектов в админке """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question = Question.objects.create(question_text='Вопрос', question_type='one_option',
+                                                survey=self.survey)
+        self.choice = Choice.objects.create(question=self.question, choice_text='Вариант')
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.client = Client()
+        self.client.force_login(self.superuser)
+
+    def add_answers(self, count):
+        for number in range(count):
+            user = get_user_model().objects.create_user(username=f'user_{Answer.objects.count()}_{number}')
+            Answer.objects.create(user=user, question=self.question, choice=self.choice)
+
+    def changelist_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_answer_changelist_query_count_does_not_grow(self):
+        url = reverse('admin:app_surveys_answer_changelist')
+        self.add_answers(2)
+        few = self.changelist_queries(url)
+        self.add_answers(20)
+        self.assertEqual(self.changelist_queries(url), few)
+
+    def test_question_and_choice_changelists(self):
+        for name in ('question', 'choice'):
+            url = reverse(f'admin:app_surveys_{name}_changelist')
+            few = self.changelist_queries(url)
+            for number in range(10):
+                question = Question.objects.create(question_text=f'Вопрос {number}', question_type='text',
+                                                   survey=self.survey)
+                Choice.objects.create(question=question, choice_text='Вариант')
+            self.assertEqual(self.changelist_queries(url), few)
+
+    def test_survey_filter(self):
+        other_survey = Survey.objects.create(title='Другой опрос', description='Описание',
+                                             date_end=timezone.now() + timedelta(days=1))
+        other_question = Question.objects.create(question_text='Вопрос', question_type='text', survey=other_survey)
+        Answer.objects.create(question=other_question, answer_text='Текст')
+        self.add_answers(2)
+        response = self.client.get(reverse('admin:app_surveys_answer_changelist'), {'survey': other_survey.id})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_paginator_counts_exactly_without_estimate(self):
+        self.add_answers(3)
+        paginator = EstimatedCountPaginator(Answer.objects.order_by('id'), 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
@@ -0,0 +1,63 @@
+from datetime import timedelta
+from importlib import import_module
+from types import SimpleNamespace
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from app_surveys import archive
+from app_surveys.models import Survey, Question, Answer, ArchivedAnswer
+
+backfill = import_module('app_surveys.migrations.0015_backfill_answer_survey')
+
+
+class AnswerSurveyTest(TestCase):
+    """ Класс тестов для опроса, продублированного в ответе """
+
+    def setUp(self):
+        now = timezone.now()
+        self.survey = Survey.objects.create(title='Опрос', description='Описание', date_end=now + timedelta(days=30))
+        self.other = Survey.objects.create(title='Другой опрос', description='Описание',
+                                           date_end=now + timedelta(days=30))
+        self.question = Question.objects.create(question_text='Вопрос', question_type='text', survey=self.survey)
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+
+    def test_survey_is_set_on_save(self):
+        answer = Answer.objects.create(user=self.user, question=self.question, answer_text='Ответ')
+        self.assertEqual(Answer.objects.get(pk=answer.pk).survey_id, self.survey.id)
+        answer.question = Question.objects.create(question_text='Вопрос', question_type='text', survey=self.other)
+        answer.save()
+        self.assertEqual(Answer.objects.get(pk=answer.pk).survey_id, self.other.id)
+
+    def test_survey_is_set_on_bulk_create(self):
+        with self.assertNumQueries(2):  # опросы вопросов и вставка
+            Answer.objects.bulk_create([Answer(question=self.question, answer_text='Ответ') for _ in range(3)])
+        self.assertEqual(Answer.objects.filter(survey=self.survey).count(), 3)
+
+    def test_moved_question_moves_answers(self):
+        archived = Answer.objects.create(question=self.question, answer_text='Архив')
+        archive.archive_survey(self.survey.id)
+        answer = Answer.objects.create(question=self.question, answer_text='Ответ')
+        self.question.survey = self.other
+        self.question.save()
+        self.assertEqual(Answer.objects.get(pk=answer.pk).survey_id, self.other.id)
+        self.assertEqual(ArchivedAnswer.objects.get(pk=archived.pk).survey_id, self.other.id)
+
+    def test_archive_keeps_survey(self):
+        answer = Answer.objects.create(question=self.question, answer_text='Ответ')
+        archive.archive_survey(self.survey.id)
+        self.assertEqual(ArchivedAnswer.objects.get(pk=answer.pk).survey_id, self.survey.id)
+        archive.restore_survey(self.survey.id)
+        self.assertEqual(Answer.objects.get(pk=answer.pk).survey_id, self.survey.id)
+
+    def test_survey_answers_do_not_join_questions(self):
+        for queryset in archive.survey_answers(self.survey.id):
+            self.assertNotIn('JOIN', str(queryset.query))
+
+    def test_backfill(self):
+        answers = Answer.objects.bulk_create([Answer(question=self.question, answer_text='Ответ') for _ in range(5)])
+        Answer.objects.update(survey=None)
+        # миграции нужно только соединение редактора схемы
+        backfill.backfill_survey(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(Answer.objects.filter(survey=self.survey).count(), len(answers))
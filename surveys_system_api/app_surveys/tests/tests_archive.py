@@ -0,0 +1,68 @@
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from app_surveys import archive, crosstab, live
+from app_surveys.models import Survey, Question, Choice, Answer, ArchivedAnswer, QuestionTerm
+
+
+class ArchiveTest(TestCase):
+    """ Класс тестов для архивации ответов завершенных опросов """
+
+    def setUp(self):
+        crosstab.registry.clear()
+        self.old_survey = Survey.objects.create(title='Старый опрос', description='Описание',
+                                                date_end=timezone.now() - timedelta(days=200))
+        self.recent_survey = Survey.objects.create(title='Недавний опрос', description='Описание',
+                                                   date_end=timezone.now() - timedelta(days=10))
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        self.question = Question.objects.create(question_text='Вопрос', question_type='many_options',
+                                                survey=self.old_survey)
+        self.text_question = Question.objects.create(question_text='Комментарий', question_type='text',
+                                                     survey=self.old_survey)
+        self.x = Choice.objects.create(question=self.question, choice_text='X')
+        self.y = Choice.objects.create(question=self.question, choice_text='Y')
+        self.answers = [
+            Answer.objects.create(user=self.user, question=self.question, choices=[self.x.id, self.y.id]),
+            Answer.objects.create(question=self.question, choices=[self.y.id]),
+            Answer.objects.create(user=self.user, question=self.text_question, answer_text='Отличный сервис'),
+        ]
+        recent_question = Question.objects.create(question_text='Вопрос', question_type='text',
+                                                  survey=self.recent_survey)
+        self.recent_answer = Answer.objects.create(user=self.user, question=recent_question, answer_text='Текст')
+
+    def test_surveys_to_archive(self):
+        self.assertEqual(list(archive.surveys_to_archive(90)), [self.old_survey])
+        self.assertEqual(set(archive.surveys_to_archive(5)), {self.old_survey, self.recent_survey})
+
+    def test_archive_keeps_results(self):
+        counts = live.results_counts(self.old_survey.id)
+        terms = list(QuestionTerm.objects.values_list('question_id', 'term', 'count'))
+
+        out = StringIO()
+        call_command('archive_answers', after_days=90, batch_size=2, stdout=out)
+
+        self.assertIn('всего перенесено: 3', out.getvalue())
+        self.assertFalse(Answer.objects.filter(question__survey=self.old_survey).exists())
+        self.assertTrue(Answer.objects.filter(id=self.recent_answer.id).exists())
+        self.assertEqual(set(ArchivedAnswer.objects.values_list('id', flat=True)),
+                         {answer.id for answer in self.answers})
+        self.assertEqual(live.results_counts(self.old_survey.id), counts)
+        self.assertEqual(list(QuestionTerm.objects.values_list('question_id', 'term', 'count')), terms)
+        index = crosstab.registry.get(self.old_survey.id)
+        self.assertEqual(index.distribution(self.question.id), [(self.x.id, 1), (self.y.id, 1)])
+
+    def test_restore(self):
+        archive.archive_survey(self.old_survey.id)
+        call_command('archive_answers', restore=[self.old_survey.id], stdout=StringIO())
+        self.assertFalse(ArchivedAnswer.objects.exists())
+        restored = Answer.objects.get(id=self.answers[0].id)
+        self.assertEqual((restored.user, restored.choices), (self.user, [self.x.id, self.y.id]))
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('archive_answers', after_days=90, dry_run=True, stdout=out)
+        self.assertIn('Старый опрос', out.getvalue())
+        self.assertFalse(ArchivedAnswer.objects.exists())
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from app_surveys.models import Survey, Question, Choice, Answer
+
+
+class BatchTest(TestCase):
+    """ Класс тестов для пакетных запросов """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question_1 = Question.objects.create(question_text='Вопрос 1', question_type='one_option',
+                                                  survey=self.survey)
+        self.question_2 = Question.objects.create(question_text='Вопрос 2', question_type='text',
+                                                  survey=self.survey)
+        self.choice = Choice.objects.create(question=self.question_1, choice_text='Вариант')
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, requests, atomic=False):
+        return self.client.post(reverse('batch'), {'atomic': atomic, 'requests': requests}, format='json')
+
+    def test_batch(self):
+        response = self.batch([
+            {'method': 'GET', 'path': f'/api/surveys/{self.survey.id}/'},
+            {'method': 'POST', 'path': '/api/answers/', 'body': {'question': self.question_1.id,
+                                                                 'choice': self.choice.id}},
+            {'method': 'POST', 'path': '/api/answers/', 'body': {'question': self.question_2.id,
+                                                                 'answer_text': 'Текст'}},
+            {'method': 'GET', 'path': '/api/answers/'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        responses = response.data['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 201, 201, 200])
+        self.assertEqual(responses[0]['body']['title'], 'Тестовый опрос')
+        self.assertEqual(len(responses[3]['body']), 2)
+        self.assertEqual(Answer.objects.filter(user=self.user).count(), 2)
+
+    def test_sub_request_errors_do_not_stop_batch(self):
+        response = self.batch([
+            {'method': 'POST', 'path': '/api/answers/', 'body': {'question': 100500}},
+            {'method': 'GET', 'path': '/api/unknown/'},
+            {'method': 'POST', 'path': '/api/answers/', 'body': {'question': self.question_2.id,
+                                                                 'answer_text': 'Текст'}},
+        ])
+        self.assertEqual([item['status'] for item in response.data['responses']], [400, 404, 201])
+        self.assertFalse(response.data['rolled_back'])
+
+    def test_atomic_batch_is_rolled_back(self):
+        response = self.batch([
+            {'method': 'POST', 'path': '/api/answers/', 'body': {'question': self.question_2.id,
+                                                                 'answer_text': 'Текст'}},
+            {'method': 'POST', 'path': '/api/answers/', 'body': {'question': self.question_2.id,
+                                                                 'answer_text': 'Повтор'}},
+            {'method': 'GET', 'path': '/api/answers/'},
+        ], atomic=True)
+        self.assertTrue(response.data['rolled_back'])
+        self.assertEqual([item['status'] for item in response.data['responses']], [201, 400])
+        self.assertFalse(Answer.objects.exists())
+
+    def test_permissions_are_checked_per_request(self):
+        response = self.batch([{'method': 'DELETE', 'path': f'/api/surveys/{self.survey.id}/'}])
+        self.assertEqual(response.data['responses'][0]['status'], status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Survey.objects.exists())
+
+    def test_anonymous_batch(self):
+        client = APIClient()
+        response = client.post(reverse('batch'), {'requests': [
+            {'method': 'GET', 'path': '/api/surveys/'},
+            {'method': 'GET', 'path': '/api/answers/'},
+        ]}, format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [200, 403])
+
+    def test_invalid_paths(self):
+        response = self.batch([
+            {'method': 'GET', 'path': '/admin/'},
+            {'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}},
+        ])
+        self.assertEqual([item['status'] for item in response.data['responses']], [400, 400])
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_batch_size_limit(self):
+        response = self.batch([{'method': 'GET', 'path': '/api/surveys/'}] * 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,68 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys.models import Survey, Question, Choice, Answer
+
+
+class CloneSurveyTest(TestCase):
+    """ Класс тестов для копирования опроса """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            title='Квартальный опрос',
+            date_end=timezone.now() - timedelta(days=1),
+            description='Тестовое описание'
+        )
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        for number in range(3):
+            question = Question.objects.create(question_text=f'Вопрос {number}', question_type='one_option',
+                                               survey=self.survey)
+            for choice_number in range(2):
+                Choice.objects.create(question=question, choice_text=f'Вариант {number}.{choice_number}')
+            Answer.objects.create(user=self.user, question=question, choice=question.choices.first())
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+        self.url = reverse('survey-clone', kwargs={'pk': self.survey.pk})
+        self.date_end = (timezone.now() + timedelta(days=90)).isoformat()
+
+    @staticmethod
+    def structure(survey):
+        return [(question.question_text, question.question_type,
+                 list(question.choices.order_by('id').values_list('choice_text', flat=True)))
+                for question in survey.questions.order_by('id')]
+
+    def test_clone(self):
+        response = self.admin_client.post(self.url, {'date_end': self.date_end}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        copy = Survey.objects.get(pk=response.data['id'])
+        self.assertEqual(copy.title, 'Квартальный опрос')
+        self.assertEqual(
+            self.structure(copy), self.structure(self.survey))
+        self.assertFalse(Answer.objects.filter(question__survey=copy).exists())
+        self.assertEqual(len(response.data['questions']), 3)
+
+    def test_clone_query_count_does_not_depend_on_size(self):
+        # опрос, выборка и вставка вопросов, выборка и вставка вариантов, а также точка сохранения транзакции
+        with self.assertNumQueries(7):
+            self.survey.clone(timezone.now() + timedelta(days=1))
+        for number in range(10):
+            question = Question.objects.create(question_text='Еще вопрос', question_type='many_options',
+                                               survey=self.survey)
+            Choice.objects.create(question=question, choice_text='Вариант')
+        with self.assertNumQueries(7):
+            self.survey.clone(timezone.now() + timedelta(days=1), title='Новое название')
+
+    def test_clone_requires_future_date_end(self):
+        response = self.admin_client.post(self.url, {'date_end': timezone.now().isoformat()},
+                                          content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_clone_is_staff_only(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(self.url, {'date_end': self.date_end}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
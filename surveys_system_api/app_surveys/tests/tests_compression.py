@@ -0,0 +1,119 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from unittest import mock, skipIf
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from app_surveys import compression
+from app_surveys.models import Survey, Question, Choice
+
+
+class CompressionTest(TestCase):
+    """ Класс тестов для сжатия ответов и кэша описаний опросов """
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        for number in range(30):
+            question = Question.objects.create(question_text=f'Вопрос {number}', question_type='one_option',
+                                               survey=self.survey)
+            Choice.objects.create(question=question, choice_text='Вариант')
+        self.client = Client()
+        self.url = reverse('survey-detail', kwargs={'pk': self.survey.pk})
+
+    def test_negotiate(self):
+        self.assertEqual(compression.negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(compression.negotiate('gzip;q=0, identity'), None)
+        self.assertEqual(compression.negotiate(''), None)
+        self.assertEqual(compression.negotiate('*'), compression.available_encodings()[0])
+
+    def test_gzip_response(self):
+        response = self.client.get(reverse('survey-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))[0]['title'], 'Тестовый опрос')
+
+    def test_small_and_uncompressed_responses(self):
+        response = self.client.get(reverse('survey-list'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(reverse('choice-detail', kwargs={'pk': Choice.objects.first().pk}),
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_html_is_not_compressed(self):
+        user = get_user_model().objects.create_superuser(username='admin', password='password')
+        self.client.force_login(user)
+        response = self.client.get(reverse('survey-list'), {'format': 'api'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_response_with_csrf_cookie_is_not_compressed(self):
+        response = self.client.get(reverse('survey-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        with mock.patch('app_surveys.views.SurveysViewSet.list', autospec=True,
+                        side_effect=lambda view, request: self._with_csrf_cookie(request)):
+            response = self.client.get(reverse('survey-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @staticmethod
+    def _with_csrf_cookie(request):
+        get_token(request)
+        return Response([{'title': 'Тестовый опрос'}] * 50)
+
+    def test_survey_definition_is_cached_compressed(self):
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.content, compression.get_survey_definition(self.survey.id)['gzip'])
+        self.assertEqual(len(json.loads(gzip.decompress(second.content))['questions']), 30)
+
+    def test_survey_definition_cache_is_invalidated(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(question_text='Новый вопрос', question_type='text', survey=self.survey)
+        self.assertIsNone(compression.get_survey_definition(self.survey.id))
+        self.assertEqual(len(self.client.get(self.url).json()['questions']), 31)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_cache_miss_reads_primary(self):
+        # реплики 'replica_0' не существует: чтение с нее завершилось бы ошибкой
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(compression.get_survey_definition(self.survey.id)['identity'], response.content)
+
+    def test_invalidation_reaches_other_processes(self):
+        self.client.get(self.url)
+        # опрос изменен в другом процессе сервера
+        pid = os.fork()
+        if pid == 0:
+            try:
+                compression.invalidate_survey_definition(self.survey.id)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertIsNone(compression.get_survey_definition(self.survey.id))
+
+    def test_cache_miss_is_compressed_with_fast_levels(self):
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(compress.called)
+        self.assertFalse(any(call.kwargs.get('cached') for call in compress.call_args_list))
+
+    @skipIf(compression.brotli is None, 'пакет Brotli не установлен')
+    def test_brotli_response(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(compression.brotli.decompress(response.content))['title'], 'Тестовый опрос')
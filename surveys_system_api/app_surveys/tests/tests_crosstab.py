@@ -0,0 +1,154 @@
+import threading
+import time
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys import crosstab, results
+from app_surveys.models import Survey, Question, Choice, Answer
+
+
+class CrosstabTest(TestCase):
+    """ Класс тестов для таблиц сопряженности """
+
+    def setUp(self):
+        crosstab.registry.clear()
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.q1 = Question.objects.create(question_text='Вопрос 1', question_type='one_option', survey=self.survey)
+        self.q2 = Question.objects.create(question_text='Вопрос 2', question_type='many_options', survey=self.survey)
+        self.a = Choice.objects.create(question=self.q1, choice_text='A')
+        self.b = Choice.objects.create(question=self.q1, choice_text='B')
+        self.x = Choice.objects.create(question=self.q2, choice_text='X')
+        self.y = Choice.objects.create(question=self.q2, choice_text='Y')
+        self.users = [get_user_model().objects.create_user(username=f'user_{i}', password='test_password')
+                      for i in range(4)]
+        answers = [(0, self.a), (0, self.x), (0, self.y),
+                   (1, self.a), (1, self.y),
+                   (2, self.b), (2, self.x),
+                   (3, self.b)]
+        for user_index, choice in answers:
+            Answer.objects.create(user=self.users[user_index], question=choice.question, choice=choice)
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+
+    def get_crosstab(self, **params):
+        return self.admin_client.get(reverse('survey-crosstab', kwargs={'pk': self.survey.pk}), params)
+
+    def cells(self, response):
+        return {row['choice']: (row['total'], {cell['choice']: cell['count'] for cell in row['cells']})
+                for row in response.data['rows']}
+
+    def test_crosstab(self):
+        response = self.get_crosstab(q1=self.q1.id, q2=self.q2.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['respondents'], 3)
+        self.assertEqual(self.cells(response), {
+            self.a.id: (2, {self.x.id: 1, self.y.id: 2}),
+            self.b.id: (2, {self.x.id: 1, self.y.id: 0}),
+        })
+
+    def test_filtered_distribution(self):
+        response = self.get_crosstab(q1=self.q1.id, q2=self.q2.id, filter=str(self.x.id))
+        self.assertEqual(self.cells(response), {
+            self.a.id: (1, {self.x.id: 1, self.y.id: 1}),
+            self.b.id: (1, {self.x.id: 1, self.y.id: 0}),
+        })
+
+    def test_index_is_updated_incrementally(self):
+        self.get_crosstab(q1=self.q1.id, q2=self.q2.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(user=self.users[3], question=self.q2, choice=self.y)
+            Answer.objects.filter(user=self.users[0], choice=self.x).get().delete()
+        index = crosstab.registry.peek(self.survey.id)
+        with self.assertNumQueries(0):
+            self.assertIs(crosstab.registry.get(self.survey.id), index)
+            self.assertEqual(index.distribution(self.q2.id), [(self.x.id, 1), (self.y.id, 3)])
+
+    @override_settings(CROSSTAB_INDEX_TTL=60)
+    def test_expired_index_is_rebuilt_in_background(self):
+        index = crosstab.registry.get(self.survey.id)
+        index.built_at -= 61
+        with mock.patch.object(crosstab.threading, 'Thread') as thread, self.assertNumQueries(0):
+            # до готовности нового индекса отдается прежний, а перестраивает его один поток
+            self.assertIs(crosstab.registry.get(self.survey.id), index)
+            self.assertIs(crosstab.registry.get(self.survey.id), index)
+        thread.assert_called_once()
+        # построение без закрытия соединений, которое выполняет фоновый поток
+        crosstab.registry._build(*thread.call_args.kwargs['args'])
+        rebuilt = crosstab.registry.peek(self.survey.id)
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.distribution(self.q2.id), index.distribution(self.q2.id))
+
+    def test_index_is_built_once_for_concurrent_requests(self):
+        started, release, indexes = threading.Event(), threading.Event(), []
+
+        def build(survey_id):
+            started.set()
+            release.wait(5)
+            return SimpleNamespace(built_at=time.monotonic())
+
+        with mock.patch.object(crosstab.SurveyIndex, 'build', side_effect=build) as survey_index_build:
+            threads = [threading.Thread(target=lambda: indexes.append(crosstab.registry.get(self.survey.id)))
+                       for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            started.wait(5)
+            release.set()
+            for thread in threads:
+                thread.join()
+        survey_index_build.assert_called_once_with(self.survey.id)
+        self.assertEqual(len(indexes), 5)
+        self.assertTrue(all(index is indexes[0] for index in indexes))
+
+    def test_invalidated_index_is_not_stored_by_rebuild(self):
+        index = crosstab.registry.get(self.survey.id)
+        index.built_at -= 3600
+        with mock.patch.object(crosstab.threading, 'Thread') as thread:
+            crosstab.registry.get(self.survey.id)
+        crosstab.registry.invalidate(self.survey.id)
+        crosstab.registry._build(*thread.call_args.kwargs['args'])
+        self.assertIsNone(crosstab.registry.peek(self.survey.id))
+
+    def test_anonymous_respondents(self):
+        respondent = uuid.uuid4()
+        Answer.objects.create(respondent=respondent, question=self.q1, choice=self.a)
+        Answer.objects.create(respondent=str(respondent), question=self.q2, choice=self.x)
+        # анонимный ответ без токена не связать с другими ответами
+        Answer.objects.create(question=self.q1, choice=self.b)
+        response = self.get_crosstab(q1=self.q1.id, q2=self.q2.id)
+        # столько же респондентов, сколько в итогах опроса
+        self.assertEqual(results.compute_results(self.survey)['respondents'], 5)
+        self.assertEqual(response.data['respondents'], 4)
+        self.assertEqual(self.cells(response)[self.a.id], (3, {self.x.id: 2, self.y.id: 2}))
+
+        other = uuid.uuid4()
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(respondent=str(other), question=self.q1, choice=self.b)
+            Answer.objects.create(respondent=other, question=self.q2, choice=self.y)
+        index = crosstab.registry.peek(self.survey.id)
+        self.assertEqual(index.crosstab(self.q1.id, self.q2.id)[0], 5)
+
+    def test_invalid_question(self):
+        response = self.get_crosstab(q1=self.q1.id, q2=100500)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_crosstab_is_staff_only(self):
+        client = Client()
+        client.force_login(self.users[0])
+        response = client.get(reverse('survey-crosstab', kwargs={'pk': self.survey.pk}),
+                              {'q1': self.q1.id, 'q2': self.q2.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bitset(self):
+        self.assertEqual(crosstab._bitset([0, 3, 9]), 0b1000001001)
+        self.assertEqual(crosstab._bitset([]), 0)
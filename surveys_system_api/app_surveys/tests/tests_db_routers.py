@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.connection import ConnectionDoesNotExist
+from rest_framework import status
+from app_surveys.db_routers import PrimaryReplicaRouter, use_primary, pin_user, is_pinned
+from app_surveys.models import Survey, Question, Answer
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+class PrimaryReplicaRouterTest(TestCase):
+    """ Класс тестов для роутера баз данных """
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_replicas(self):
+        for model in (Survey, Question, Answer):
+            with self.subTest(model=model):
+                self.assertIn(self.router.db_for_read(model), ['replica_0', 'replica_1'])
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Survey), 'default')
+
+    def test_foreign_apps_are_not_routed(self):
+        self.assertIsNone(self.router.db_for_read(get_user_model()))
+        self.assertIsNone(self.router.db_for_write(get_user_model()))
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Survey), 'default')
+        self.assertNotEqual(self.router.db_for_read(Survey), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertTrue(self.router.allow_migrate('default', 'app_surveys'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'app_surveys'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(Survey), 'default')
+
+    def test_pin_user(self):
+        self.assertFalse(is_pinned(1))
+        pin_user(1)
+        self.assertTrue(is_pinned(1))
+
+    def test_pin_is_shared_between_processes(self):
+        # следующий запрос пользователя обрабатывает другой процесс сервера
+        pid = os.fork()
+        if pid == 0:
+            try:
+                pin_user('respondent:1')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertTrue(is_pinned('respondent:1'))
+
+
+class ReadYourWritesTest(TestCase):
+    """
+    Класс тестов закрепления пользователя за основной базой после записи.
+    Реплика 'replica_0' не существует, поэтому любое чтение с нее завершается ошибкой.
+    """
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question = Question.objects.create(
+            question_text='Тестовый вопрос',
+            question_type='text',
+            survey=self.survey
+        )
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_reads_after_answer_go_to_primary(self):
+        with self.assertRaises(ConnectionDoesNotExist):
+            self.authorized_client.get(reverse('answer-list'))
+
+        response = self.authorized_client.post(
+            reverse('answer-list'),
+            data=json.dumps({'question': self.question.id, 'answer_text': 'Ответ'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.authorized_client.get(reverse('answer-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['answer_text'], 'Ответ')
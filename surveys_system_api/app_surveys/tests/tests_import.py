@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from app_surveys import importer
+from app_surveys.models import Survey, Question, Choice, Answer, AnswerRollup, QuestionTerm
+
+RECORDS = [
+    {'type': 'survey', 'id': 's1', 'title': 'Опрос 2019', 'description': 'Описание',
+     'date_start': '2019-01-01T00:00:00', 'date_end': '2019-03-01T00:00:00'},
+    {'type': 'question', 'id': 'q1', 'survey': 's1', 'question_text': 'Цвет', 'question_type': 'one_option'},
+    {'type': 'question', 'id': 'q2', 'survey': 's1', 'question_text': 'Фрукты', 'question_type': 'many_options'},
+    {'type': 'question', 'id': 'q3', 'survey': 's1', 'question_text': 'Отзыв', 'question_type': 'text'},
+    {'type': 'choice', 'id': 'c1', 'question': 'q1', 'choice_text': 'Красный'},
+    {'type': 'choice', 'id': 'c2', 'question': 'q2', 'choice_text': 'Яблоко'},
+    {'type': 'choice', 'id': 'c3', 'question': 'q2', 'choice_text': 'Груша'},
+    {'type': 'answer', 'question': 'q1', 'user': 'test_user', 'choice': 'c1'},
+    {'type': 'answer', 'question': 'q2', 'user': 'test_user', 'choices': ['c3', 'c2']},
+    {'type': 'answer', 'question': 'q3', 'answer_text': 'Отличная доставка'},
+    {'type': 'answer', 'question': 'q1', 'choice': 'c2'},
+    {'type': 'answer', 'question': 'q9', 'answer_text': 'Нет такого вопроса'},
+]
+
+
+class ImportSurveysTest(TestCase):
+    """ Класс тестов для массового импорта опросов """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def write_jsonl(self, records):
+        return self.write('data.jsonl', '\n'.join(json.dumps(record, ensure_ascii=False) for record in records))
+
+    def import_file(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_surveys', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_jsonl(self):
+        out, err = self.import_file(self.write_jsonl(RECORDS), batch_size=4)
+        survey = Survey.objects.get()
+        self.assertEqual(survey.date_start.year, 2019)
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertEqual(Choice.objects.count(), 3)
+        self.assertEqual(Answer.objects.count(), 3)
+        multi = Answer.objects.get(question__question_text='Фрукты')
+        self.assertEqual(multi.user, self.user)
+        choice_ids = Choice.objects.filter(question=multi.question).values_list('id', flat=True)
+        self.assertEqual(multi.choices, sorted(choice_ids))
+        self.assertTrue(QuestionTerm.objects.filter(term='доставка', count=1).exists())
+        self.assertIn('некорректных записей: 2', out)
+        self.assertIn('записей/с', out)
+        self.assertIn('запись 11: вариант ответа не относится к вопросу q1', err)
+        self.assertIn('запись 12', err)
+
+    def test_import_answer_dates(self):
+        records = RECORDS[:5] + [
+            {'type': 'answer', 'question': 'q1', 'choice': 'c1', 'created_at': '2019-01-10T12:05:30'},
+            {'type': 'answer', 'question': 'q1', 'choice': 'c1', 'created_at': '2019-01-10T12:05:50'},
+        ]
+        self.import_file(self.write_jsonl(records))
+        survey = Survey.objects.get()
+        self.assertEqual({answer.isoformat() for answer in Answer.objects.values_list('created_at', flat=True)},
+                         {'2019-01-10T12:05:30+00:00', '2019-01-10T12:05:50+00:00'})
+        rollups = AnswerRollup.objects.filter(survey=survey, bucket='minute').values_list('start', 'count')
+        self.assertEqual([(start.isoformat(), count) for start, count in rollups], [('2019-01-10T12:05:00+00:00', 2)])
+
+    def test_import_csv(self):
+        path = self.write('data.csv', '\n'.join([
+            'type,id,survey,question,choice,choices,title,description,date_end,question_text,question_type,'
+            'choice_text,user,answer_text',
+            'survey,s1,,,,,Опрос,Описание,2020-01-01T00:00:00,,,,,',
+            'question,q1,s1,,,,,,,Фрукты,many_options,,,',
+            'choice,c1,,q1,,,,,,,,Яблоко,,',
+            'choice,c2,,q1,,,,,,,,Груша,,',
+            'answer,,,q1,,c1|c2,,,,,,,test_user,',
+        ]))
+        self.import_file(path)
+        self.assertEqual(len(Answer.objects.get().choices), 2)
+
+    def test_resume_from_checkpoint(self):
+        path = self.write_jsonl(RECORDS[:7] + [RECORDS[-1]] * 2 + RECORDS[7:])
+        with self.assertRaises(CommandError):
+            # первая пачка загружена, после нее импорт прерывается из-за лимита ошибок
+            self.import_file(path, batch_size=9, max_errors=1)
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertEqual(Answer.objects.count(), 0)
+        out, _ = self.import_file(path, batch_size=9)
+        self.assertIn('продолжение импорта с записи 10', out)
+        self.assertEqual(Survey.objects.count(), 1)
+        self.assertEqual(Answer.objects.count(), 3)
+
+    def test_restart_ignores_checkpoint(self):
+        path = self.write_jsonl(RECORDS)
+        self.import_file(path)
+        self.import_file(path, restart=True)
+        self.assertEqual(Survey.objects.count(), 2)
+
+    def test_repeated_user_answers_are_rejected(self):
+        records = RECORDS[:7] + [
+            {'type': 'answer', 'question': 'q1', 'user': 'test_user', 'choice': 'c1'},
+            {'type': 'answer', 'question': 'q1', 'user': 'test_user', 'choice': 'c1'},
+        ]
+        _, err = self.import_file(self.write_jsonl(records))
+        self.assertEqual(Answer.objects.filter(user=self.user).count(), 1)
+        self.assertIn('запись 9: пользователь test_user уже отвечал на вопрос q1', err)
+
+    def test_resume_does_not_repeat_user_answers(self):
+        path = self.write_jsonl(RECORDS)
+        self.import_file(path, batch_size=7)
+        # контрольная точка отстала от загруженных ответов (например, после восстановления базы из копии)
+        state = importer.load_checkpoint(os.path.abspath(path))
+        importer.save_checkpoint(os.path.abspath(path), {**state, 'position': 7})
+        _, err = self.import_file(path, batch_size=7)
+        self.assertEqual(Answer.objects.filter(user=self.user).count(), 2)
+        self.assertIn('запись 8: пользователь test_user уже отвечал на вопрос q1', err)
+
+    def test_checkpoint_is_saved_with_batch(self):
+        path = self.write_jsonl(RECORDS)
+        with mock.patch.object(importer, 'save_checkpoint', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.import_file(path)
+        # пачка откатывается вместе с контрольной точкой
+        self.assertEqual(Survey.objects.count(), 0)
+        self.assertIsNone(importer.load_checkpoint(os.path.abspath(path)))
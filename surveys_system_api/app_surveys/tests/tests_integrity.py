@@ -0,0 +1,47 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from app_surveys import integrity
+from app_surveys.models import Survey, Question, Answer, AnswerRollup
+
+
+class IntegrityTest(TestCase):
+    """ Класс тестов для проверки ссылочной целостности ответов """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(title='Тестовый опрос', description='Описание',
+                                            date_end=timezone.now() + timedelta(days=30))
+        self.question = Question.objects.create(question_text='Вопрос', question_type='text', survey=self.survey)
+        self.other = Question.objects.create(question_text='Другой вопрос', question_type='text', survey=self.survey)
+        self.orphan = Answer.objects.create(question=self.question, answer_text='Ответ')
+        self.answer = Answer.objects.create(question=self.other, answer_text='Ответ')
+
+    def test_clean_database(self):
+        out = StringIO()
+        call_command('check_answer_integrity', stdout=out)
+        self.assertIn('висячих ссылок нет', out.getvalue())
+
+    def test_orphans_are_found_and_deleted(self):
+        # внешний ключ счетчиков графика не проверяется базой данных: опрос удален в обход ORM
+        missing_id = self.survey.id + 1000
+        AnswerRollup.objects.create(survey_id=missing_id, bucket='day', start=timezone.now(), count=1)
+        self.assertEqual(integrity.orphans('default'), [(AnswerRollup, 'survey', {missing_id})])
+        with self.assertRaises(CommandError):
+            call_command('check_answer_integrity', stdout=StringIO())
+
+        out = StringIO()
+        call_command('check_answer_integrity', '--delete', stdout=out)
+        self.assertIn('удалено строк: 1', out.getvalue())
+        self.assertFalse(AnswerRollup.objects.filter(survey_id=missing_id).exists())
+        self.assertEqual(Answer.objects.count(), 2)
+        call_command('check_answer_integrity', stdout=StringIO())
+
+    def test_primary_database_keeps_foreign_keys(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Answer._meta.db_table)
+        foreign_keys = {constraint['columns'][0] for constraint in constraints.values() if constraint['foreign_key']}
+        self.assertEqual(foreign_keys, {'user_id', 'question_id', 'survey_id', 'choice_id'})
@@ -0,0 +1,140 @@
+import json
+import os
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys import live
+from app_surveys.models import Survey, Question, Choice, Answer
+
+
+def parse_event(chunk):
+    lines = (chunk.decode() if isinstance(chunk, bytes) else chunk).strip().split('\n')
+    event = lines[0][len('event: '):]
+    data = json.loads(lines[1][len('data: '):])
+    return event, data
+
+
+@override_settings(RESULTS_STREAM_HEARTBEAT_SECONDS=0.01, RESULTS_STREAM_POLL_SECONDS=0.005)
+class ResultsStreamTest(TestCase):
+    """ Класс тестов для потока результатов опроса """
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question = Question.objects.create(
+            question_text='Тестовый вопрос',
+            question_type='one_option',
+            survey=self.survey
+        )
+        self.choice_1 = Choice.objects.create(question=self.question, choice_text='Вариант 1')
+        self.choice_2 = Choice.objects.create(question=self.question, choice_text='Вариант 2')
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        Answer.objects.create(question=self.question, choice=self.choice_1, user=self.user)
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+
+    def open_stream(self):
+        response = self.admin_client.get(reverse('survey-results-stream', kwargs={'pk': self.survey.pk}),
+                                         HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response, iter(response.streaming_content)
+
+    def test_snapshot_then_deltas(self):
+        response, stream = self.open_stream()
+        event, data = parse_event(next(stream))
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual(data, [{'question': self.question.id, 'choice': self.choice_1.id, 'count': 1}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            answer = Answer.objects.create(question=self.question, choice=self.choice_2, user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.choice = self.choice_1
+            answer.save()
+
+        event, data = parse_event(next(stream))
+        self.assertEqual(event, 'delta')
+        self.assertEqual(data, [{'question': self.question.id, 'choice': self.choice_1.id, 'delta': 1}])
+        self.assertEqual(next(stream), b': keepalive\n\n')
+        response.close()
+        self.assertEqual(live.feed.subscriber_count(self.survey.id), 0)
+
+    def test_one_publish_fans_out(self):
+        streams = [self.open_stream() for _ in range(3)]
+        for _, stream in streams:
+            next(stream)
+        self.assertEqual(live.feed.subscriber_count(self.survey.id), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, choice=self.choice_2, user=self.user)
+        for response, stream in streams:
+            event, data = parse_event(next(stream))
+            self.assertEqual(data, [{'question': self.question.id, 'choice': self.choice_2.id, 'delta': 1}])
+            response.close()
+
+    def test_not_committed_answers_are_not_published(self):
+        response, stream = self.open_stream()
+        next(stream)
+        Answer.objects.create(question=self.question, choice=self.choice_2, user=self.user)
+        self.assertEqual(next(stream), b': keepalive\n\n')
+        response.close()
+
+    def test_deltas_from_other_processes(self):
+        response, stream = self.open_stream()
+        next(stream)
+        # ответ сохранен в другом процессе сервера
+        pid = os.fork()
+        if pid == 0:
+            try:
+                live.feed.publish(self.survey.id, {(self.question.id, self.choice_2.id): 1})
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        event, data = parse_event(next(stream))
+        self.assertEqual(event, 'delta')
+        self.assertEqual(data, [{'question': self.question.id, 'choice': self.choice_2.id, 'delta': 1}])
+        response.close()
+
+    def test_snapshot_is_reconciled_with_sequence(self):
+        results_counts = live.results_counts
+
+        def counts_with_concurrent_answer(survey_id):
+            if not Answer.objects.filter(choice=self.choice_2).exists():
+                # ответ зафиксирован и опубликован во время подсчета снимка
+                with self.captureOnCommitCallbacks(execute=True):
+                    Answer.objects.create(question=self.question, choice=self.choice_2, user=self.user)
+            return results_counts(survey_id)
+
+        with mock.patch.object(live, 'results_counts', side_effect=counts_with_concurrent_answer):
+            response, stream = self.open_stream()
+        event, data = parse_event(next(stream))
+        self.assertEqual(data, [{'question': self.question.id, 'choice': self.choice_1.id, 'count': 1},
+                                {'question': self.question.id, 'choice': self.choice_2.id, 'count': 1}])
+        # изменение уже учтено в снимке и повторно не отправляется
+        self.assertEqual(next(stream), b': keepalive\n\n')
+        response.close()
+
+    def test_expired_deltas_reset_stream(self):
+        response, stream = self.open_stream()
+        next(stream)
+        live.feed.publish(self.survey.id, {(self.question.id, self.choice_2.id): 1})
+        caches[settings.SHARED_CACHE].delete(live.feed.delta_key(self.survey.id, 1))
+        event, _ = parse_event(next(stream))
+        self.assertEqual(event, 'reset')
+        response.close()
+
+    def test_stream_is_staff_only(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('survey-results-stream', kwargs={'pk': self.survey.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,62 @@
+from datetime import timedelta
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from app_surveys import metrics
+from app_surveys.models import Survey, Question
+
+client = Client()
+
+
+class MetricsTest(TestCase):
+    """ Класс тестов для сбора метрик запросов """
+
+    def setUp(self):
+        metrics.registry = metrics.MetricsRegistry()
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        Question.objects.create(question_text='Тестовый вопрос', question_type='text', survey=self.survey)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test', 'Тест.', (1, 5))
+        for value in (0.5, 3, 7):
+            histogram.observe('view', value)
+        lines = histogram.render()
+        self.assertIn('test_bucket{view="view",le="1"} 1', lines)
+        self.assertIn('test_bucket{view="view",le="5"} 2', lines)
+        self.assertIn('test_bucket{view="view",le="+Inf"} 3', lines)
+        self.assertIn('test_sum{view="view"} 10.5', lines)
+
+    def test_request_is_recorded_per_action(self):
+        client.get(reverse('survey-list'))
+        client.get(reverse('survey-detail', kwargs={'pk': self.survey.pk}))
+        response = client.get(reverse('metrics'))
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('api_request_duration_seconds_count{view="SurveysViewSet.list"} 1', body)
+        self.assertIn('api_request_duration_seconds_count{view="SurveysViewSet.retrieve"} 1', body)
+        self.assertIn('api_db_queries_count{view="SurveysViewSet.list"} 1', body)
+        self.assertIn('api_serialization_duration_seconds_count{view="SurveysViewSet.list"} 1', body)
+
+    def test_stats_are_collected(self):
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        try:
+            with metrics.serialization_timer():
+                with metrics.serialization_timer():
+                    pass
+        finally:
+            metrics.current_stats.reset(token)
+        self.assertGreater(stats.serialization_time, 0)
+        self.assertEqual(stats._serialization_depth, 0)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=1e-9)
+    def test_slow_request_is_logged(self):
+        with self.assertLogs('app_surveys.metrics', level='WARNING') as logs:
+            client.get(reverse('survey-list'))
+        self.assertIn('"view": "SurveysViewSet.list"', logs.output[0])
+        self.assertIn('"db_queries": ', logs.output[0])
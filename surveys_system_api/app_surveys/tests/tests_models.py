@@ -1,5 +1,14 @@
 from django.contrib.auth import get_user_model
+from datetime import timedelta
+from importlib import import_module
+from types import SimpleNamespace
+from unittest import mock
+from django.apps import apps
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import connection, migrations
+from django.db.migrations.loader import MigrationLoader
 from django.test import TestCase
+from django.utils import timezone
 from app_surveys.models import Survey, Question, Choice, Answer
 
 
@@ -31,6 +40,13 @@ class SurveyModelTest(TestCase):
         survey = SurveyModelTest.survey
         self.assertEqual(survey.__str__(), 'Тестовый опрос')
 
+    def test_active_surveys(self):
+        now = timezone.now()
+        active = Survey.objects.create(title='Активный', date_end=now + timedelta(days=1), description='')
+        self.assertIn(active, Survey.objects.active())
+        self.assertNotIn(SurveyModelTest.survey, Survey.objects.active())
+        self.assertNotIn(active, Survey.objects.active(now=now + timedelta(days=2)))
+
 
 class QuestionModelTest(TestCase):
 
@@ -149,3 +165,89 @@ class AnswerModelTest(TestCase):
         self.assertEqual(answer_1.__str__(), 'тестовый ответ')
         answer_2 = AnswerModelTest.answer_2
         self.assertEqual(answer_2.__str__(), 'тестовый выбор')
+
+
+class MergeMultipleChoiceAnswersMigrationTest(TestCase):
+
+    def test_merge_answers(self):
+        migration = import_module('app_surveys.migrations.0008_merge_multiple_choice_answers')
+        survey = Survey.objects.create(title='Тестовый опрос', date_end=timezone.now(), description='')
+        question = Question.objects.create(question_text='Тестовый вопрос', question_type='many_options',
+                                           survey=survey)
+        choices = [Choice.objects.create(question=question, choice_text=f'вариант {i}') for i in range(3)]
+        user = get_user_model().objects.create_user(username='testuser', password='secret')
+        for choice in (choices[2], choices[0]):
+            Answer.objects.create(user=user, question=question, choice=choice)
+        Answer.objects.create(question=question, choice=choices[1])
+
+        migration.merge_answers(apps, SimpleNamespace(connection=connection))
+
+        answer = Answer.objects.get(user=user)
+        self.assertEqual(answer.choices, [choices[0].id, choices[2].id])
+        self.assertIsNone(answer.choice)
+        self.assertEqual(Answer.objects.get(user__isnull=True).choices, [choices[1].id])
+        self.assertEqual(str(answer), 'вариант 0, вариант 2')
+
+    def test_merge_answers_in_several_batches(self):
+        migration = import_module('app_surveys.migrations.0008_merge_multiple_choice_answers')
+        survey = Survey.objects.create(title='Тестовый опрос', date_end=timezone.now(), description='')
+        question = Question.objects.create(question_text='Тестовый вопрос', question_type='many_options',
+                                           survey=survey)
+        choices = [Choice.objects.create(question=question, choice_text=f'вариант {i}') for i in range(2)]
+        users = [get_user_model().objects.create_user(username=f'user_{i}', password='secret') for i in range(5)]
+        # строки одного пользователя попадают в разные диапазоны ID
+        for choice in choices:
+            for user in users:
+                Answer.objects.create(user=user, question=question, choice=choice)
+        Answer.objects.create(question=question, choice=choices[0])
+
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.merge_answers(apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(Answer.objects.count(), len(users) + 1)
+        for user in users:
+            self.assertEqual(Answer.objects.get(user=user).choices, [choice.id for choice in choices])
+        self.assertEqual(Answer.objects.get(user__isnull=True).choices, [choices[0].id])
+
+    def test_split_answers(self):
+        migration = import_module('app_surveys.migrations.0008_merge_multiple_choice_answers')
+        survey = Survey.objects.create(title='Тестовый опрос', date_end=timezone.now(), description='')
+        question = Question.objects.create(question_text='Тестовый вопрос', question_type='many_options',
+                                           survey=survey)
+        choices = [Choice.objects.create(question=question, choice_text=f'вариант {i}') for i in range(3)]
+        users = [get_user_model().objects.create_user(username=f'user_{i}', password='secret') for i in range(3)]
+        for user in users:
+            Answer.objects.create(user=user, question=question, choices=[choice.id for choice in choices])
+
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.split_answers(apps, SimpleNamespace(connection=connection))
+
+        self.assertFalse(Answer.objects.filter(choices__isnull=False).exists())
+        for user in users:
+            self.assertEqual(sorted(Answer.objects.filter(user=user).values_list('choice', flat=True)),
+                             [choice.id for choice in choices])
+
+
+class AnswerIndexMigrationsTest(TestCase):
+    """ Класс тестов для построения индексов таблиц ответов в миграциях """
+
+    def test_answer_indexes_are_built_concurrently(self):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        for (app_label, name), migration in loader.disk_migrations.items():
+            if app_label != 'app_surveys':
+                continue
+            for operation in migration.operations:
+                if isinstance(operation, migrations.AddIndex) and operation.model_name in ('answer', 'archivedanswer'):
+                    with self.subTest(migration=name, index=operation.index.name):
+                        self.assertIsInstance(operation, AddIndexConcurrently)
+                        self.assertFalse(migration.atomic)
+
+    def test_search_indexes_are_built_concurrently(self):
+        migration = import_module('app_surveys.migrations.0010_text_search')
+        schema_editor = mock.Mock(connection=SimpleNamespace(vendor='postgresql'))
+        migration.create_search_indexes(apps, schema_editor)
+        statements = [call.args[0] for call in schema_editor.execute.call_args_list]
+        self.assertEqual(len(statements), len(migration.SEARCH_FIELDS))
+        for statement in statements:
+            self.assertTrue(statement.startswith('CREATE INDEX CONCURRENTLY'))
+        self.assertFalse(migration.Migration.atomic)
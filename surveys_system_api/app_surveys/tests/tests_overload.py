@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+from unittest import mock
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.response import Response
+from app_surveys import metrics
+from app_surveys.overload import LoadSheddingMiddleware, StatementTimeout, _TimeoutWrapper, statement_timeout
+from app_surveys.views import SurveysViewSet
+
+# запрос, который выполняется заметно дольше лимитов в тестах
+SLOW_SQL = 'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) SELECT count(*) FROM c'
+
+
+def slow_list(self, request, *args, **kwargs):
+    with connection.cursor() as cursor:
+        cursor.execute(SLOW_SQL)
+    return Response([])
+
+
+class StatementTimeoutTest(TestCase):
+    """ Класс тестов для ограничения времени SQL-запросов представлений """
+
+    def setUp(self):
+        metrics.registry = metrics.MetricsRegistry()
+
+    def test_slow_statement_is_interrupted(self):
+        with self.assertRaises(StatementTimeout):
+            with statement_timeout(50, 'test'):
+                with connection.cursor() as cursor:
+                    cursor.execute(SLOW_SQL)
+        self.assertIn('api_statement_timeouts_total{view="test"} 1', metrics.registry.render())
+
+    def test_limit_is_removed_after_block(self):
+        with statement_timeout(50):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        self.assertEqual(connection.execute_wrappers, [])
+        with connection.cursor() as cursor:
+            cursor.execute('WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000) '
+                           'SELECT count(*) FROM c')
+            self.assertEqual(cursor.fetchone()[0], 100000)
+
+    def test_postgresql_limit_is_sent_with_statement(self):
+        wrapper = _TimeoutWrapper(1500, 'test')
+        execute = mock.Mock()
+        for in_atomic_block in (False, True):
+            pg_connection = mock.Mock(vendor='postgresql', alias='default', in_atomic_block=in_atomic_block)
+            cursor = SimpleNamespace(cursor=SimpleNamespace(name=None))
+            wrapper(execute, 'SELECT 1', None, False, {'connection': pg_connection, 'cursor': cursor})
+            execute.assert_called_with('SET LOCAL statement_timeout = 1500; SELECT 1', None, False, mock.ANY)
+        # сбросить лимит после блока нужно только в транзакции, которая продолжается
+        self.assertEqual(wrapper.in_transaction, {'default'})
+
+    def test_postgresql_server_side_cursor_gets_plain_statement(self):
+        # QuerySet.iterator на PostgreSQL выполняет запрос в именованном курсоре connection.chunked_cursor():
+        # psycopg2 оборачивает его в DECLARE ... CURSOR FOR, куда префикс с SET попасть не должен
+        wrapper = _TimeoutWrapper(1500, 'test')
+        in_transaction = ['SET LOCAL statement_timeout = %s']
+        autocommit = ['SET statement_timeout = %s', 'SET statement_timeout TO DEFAULT']
+        for in_atomic_block, statements in ((True, in_transaction), (False, autocommit)):
+            execute = mock.Mock()
+            pg_connection = mock.MagicMock(vendor='postgresql', alias='default', in_atomic_block=in_atomic_block)
+            plain_cursor = pg_connection.connection.cursor.return_value.__enter__.return_value
+            named_cursor = SimpleNamespace(cursor=SimpleNamespace(name='_django_curs_1'))
+            wrapper(execute, 'SELECT 1', None, False, {'connection': pg_connection, 'cursor': named_cursor})
+            execute.assert_called_once_with('SELECT 1', None, False, mock.ANY)
+            self.assertEqual([call.args[0] for call in plain_cursor.execute.call_args_list], statements)
+
+    @mock.patch.object(SurveysViewSet, 'statement_timeouts', {'list': 50})
+    @mock.patch.object(SurveysViewSet, 'list', slow_list)
+    def test_view_responds_503(self):
+        response = Client().get(reverse('survey-list'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['detail'], 'Запрос выполнялся слишком долго, повторите его позже.')
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertIn('api_statement_timeouts_total{view="SurveysViewSet.list"} 1', metrics.registry.render())
+
+
+class LoadSheddingTest(TestCase):
+    """ Класс тестов для сброса нагрузки при превышении числа одновременных запросов """
+
+    def setUp(self):
+        metrics.registry = metrics.MetricsRegistry()
+        self.factory = RequestFactory()
+
+    @override_settings(LOAD_SHEDDING_MAX_IN_FLIGHT=1, LOAD_SHEDDING_RETRY_AFTER=3)
+    def test_excess_request_is_shed(self):
+        inner = {}
+
+        def get_response(request):
+            # пока обрабатывается первый запрос, приходит второй
+            inner['response'] = middleware(self.factory.post(reverse('answer-list')))
+            return HttpResponse('ok')
+
+        middleware = LoadSheddingMiddleware(get_response)
+        response = middleware(self.factory.get(reverse('survey-list')))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(inner['response'].status_code, 503)
+        self.assertEqual(inner['response']['Retry-After'], '3')
+        # место освобождается, когда сервер закрывает ответ
+        self.assertEqual(middleware.in_flight, 1)
+        response.close()
+        self.assertEqual(middleware.in_flight, 0)
+        self.assertIn('api_shed_requests_total{view="AnswersViewSet.create"} 1', metrics.registry.render())
+
+    @override_settings(LOAD_SHEDDING_MAX_IN_FLIGHT=1)
+    def test_metrics_are_not_shed(self):
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse('ok'))
+        middleware.in_flight = 1
+        self.assertEqual(middleware(self.factory.get(reverse('metrics'))).status_code, 200)
+        self.assertEqual(middleware(self.factory.get(reverse('survey-list'))).status_code, 503)
+
+    @override_settings(LOAD_SHEDDING_MAX_IN_FLIGHT=1)
+    def test_stream_holds_slot_until_closed(self):
+        middleware = LoadSheddingMiddleware(lambda request: StreamingHttpResponse(iter(['data: {}\n\n'])))
+        response = middleware(self.factory.get(reverse('survey-list')))
+        self.assertEqual(middleware.in_flight, 1)
+        self.assertEqual(middleware(self.factory.get(reverse('survey-list'))).status_code, 503)
+        response.close()
+        response.close()
+        self.assertEqual(middleware.in_flight, 0)
+
+    @override_settings(LOAD_SHEDDING_MAX_IN_FLIGHT=1)
+    def test_slot_is_released_on_error(self):
+        def get_response(request):
+            raise RuntimeError('ошибка представления')
+
+        middleware = LoadSheddingMiddleware(get_response)
+        with self.assertRaises(RuntimeError):
+            middleware(self.factory.get(reverse('survey-list')))
+        self.assertEqual(middleware.in_flight, 0)
@@ -0,0 +1,67 @@
+import os
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from rest_framework import status
+from app_surveys import profiling
+
+
+class ProfilingTest(TestCase):
+    """ Класс тестов для профилирования запросов """
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        patcher = mock.patch.object(profiling, 'store', profiling.ProfileStore(maxlen=2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.user = get_user_model().objects.create_user(username='test_user', email='email', password='test_password')
+        self.client = Client()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+
+    def test_signed_header_profiles_request(self):
+        response = self.client.get(reverse('survey-list'), HTTP_X_PROFILE=profiling.make_profile_token())
+        profile_id = response['X-Profile-Id']
+
+        response = self.admin_client.get(reverse('profile-detail', kwargs={'pk': profile_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['path'], reverse('survey-list'))
+        self.assertTrue(response.data['queries'])
+        self.assertIn('cumulative', response.data['profile'])
+
+    def test_invalid_signature_is_ignored(self):
+        response = self.client.get(reverse('survey-list'), HTTP_X_PROFILE='forged:token')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(profiling.store.list(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampling_and_ring_buffer(self):
+        for _ in range(3):
+            self.client.get(reverse('survey-list'))
+        profiles = profiling.store.list()
+        self.assertEqual(len(profiles), 2)
+
+    def test_profiles_are_shared_between_processes(self):
+        # профиль снимает один процесс сервера, а API профилей обслуживает другой
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.client.get(reverse('survey-list'), HTTP_X_PROFILE=profiling.make_profile_token())
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        profiles = self.admin_client.get(reverse('profile-list')).data
+        self.assertEqual([profile['path'] for profile in profiles], [reverse('survey-list')])
+
+    def test_profiles_are_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('profile-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_profile(self):
+        response = self.admin_client.get(reverse('profile-detail', kwargs={'pk': 'missing'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
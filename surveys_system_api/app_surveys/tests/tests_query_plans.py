@@ -0,0 +1,122 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from app_surveys import crosstab
+from app_surveys.models import Survey, Question, Choice, Answer
+from app_surveys.tests.query_plans import QueryPlanBaseline, QueryPlanRecorder
+
+
+class QueryPlanTest(TestCase):
+    """
+    Класс тестов для планов SQL-запросов представлений: число запросов не превышает бюджета,
+    а большие таблицы читаются по индексам (эталоны - app_surveys/tests/query_plans_<vendor>.json)
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baseline = QueryPlanBaseline()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.baseline.save()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Survey.objects.bulk_create(Survey(title='Архивный опрос', description='Описание', date_end=now - timedelta(days=day))
+                                   for day in range(1, 20))
+        cls.survey = Survey.objects.create(title='Тестовый опрос', description='Описание',
+                                           date_end=now + timedelta(days=30))
+        cls.questions = Question.objects.bulk_create(
+            Question(survey=cls.survey, question_text=f'Вопрос {number}', question_type=question_type)
+            for number, question_type in enumerate(['one_option', 'many_options', 'text'] * 3)
+        )
+        cls.choices = {question.id: Choice.objects.bulk_create(
+            Choice(question=question, choice_text=f'Вариант {number}') for number in range(4))
+            for question in cls.questions if question.question_type != 'text'}
+        cls.users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'user_{number}') for number in range(20))
+        answers = []
+        for user in cls.users:
+            for question in cls.questions:
+                choices = cls.choices.get(question.id)
+                if question.question_type == 'text':
+                    answers.append(Answer(user=user, question=question, answer_text='Быстрая доставка'))
+                elif question.question_type == 'many_options':
+                    answers.append(Answer(user=user, question=question, choices=[choices[0].id, choices[1].id]))
+                else:
+                    answers.append(Answer(user=user, question=question, choice=choices[user.id % 4]))
+        Answer.objects.bulk_create(answers, batch_size=1000)
+        cls.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        cls.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        crosstab.registry.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+        self.question = self.questions[0]
+        self.answer = Answer.objects.create(user=self.user, question=self.question,
+                                            choice=self.choices[self.question.id][0])
+
+    def check(self, name, request):
+        with QueryPlanRecorder() as recorder:
+            response = request()
+        self.assertLess(response.status_code, 400, response.content)
+        self.baseline.check(self, name, recorder)
+
+    def test_survey_list(self):
+        self.check('survey-list', lambda: self.client.get(reverse('survey-list')))
+
+    def test_active_survey_list(self):
+        self.check('survey-list-active', lambda: self.client.get(reverse('survey-list'), {'active': 1}))
+
+    def test_survey_detail(self):
+        self.check('survey-detail', lambda: self.client.get(reverse('survey-detail', args=[self.survey.id])))
+
+    def test_question_detail(self):
+        self.check('question-detail', lambda: self.client.get(reverse('question-detail', args=[self.question.id])))
+
+    def test_choice_detail(self):
+        choice = self.choices[self.question.id][0]
+        self.check('choice-detail', lambda: self.client.get(reverse('choice-detail', args=[choice.id])))
+
+    def test_answer_list(self):
+        self.check('answer-list', lambda: self.client.get(reverse('answer-list')))
+
+    def test_answer_detail(self):
+        self.check('answer-detail', lambda: self.client.get(reverse('answer-detail', args=[self.answer.id])))
+
+    def test_answer_create(self):
+        question = self.questions[2]
+        self.check('answer-create', lambda: self.client.post(
+            reverse('answer-list'), {'question': question.id, 'answer_text': 'Текст'}, content_type='application/json'))
+
+    def test_multiple_choice_answer_create(self):
+        question = self.questions[1]
+        choice_ids = [choice.id for choice in self.choices[question.id][:2]]
+        self.check('answer-create-many-options', lambda: self.client.post(
+            reverse('answer-list'), {'question': question.id, 'choices': choice_ids}, content_type='application/json'))
+
+    def test_answer_update(self):
+        choice = self.choices[self.question.id][1]
+        self.check('answer-update', lambda: self.client.patch(
+            reverse('answer-detail', args=[self.answer.id]), {'choice': choice.id}, content_type='application/json'))
+
+    def test_survey_results(self):
+        self.check('survey-results', lambda: self.admin_client.get(reverse('survey-results', args=[self.survey.id])))
+
+    def test_survey_crosstab(self):
+        self.check('survey-crosstab', lambda: self.admin_client.get(
+            reverse('survey-crosstab', args=[self.survey.id]), {'q1': self.questions[0].id, 'q2': self.questions[1].id}))
+
+    def test_question_terms(self):
+        self.check('question-terms', lambda: self.admin_client.get(reverse('question-terms', args=[self.questions[2].id])))
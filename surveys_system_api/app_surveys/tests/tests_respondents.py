@@ -0,0 +1,69 @@
+from datetime import timedelta
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from app_surveys.authentication import make_respondent_token, parse_respondent_token
+from app_surveys.models import Survey, Question, Choice, Answer
+
+
+class RespondentTokenTest(TestCase):
+    """ Класс тестов для ответов анонимных респондентов по токену """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question = Question.objects.create(question_text='Вопрос', question_type='one_option',
+                                                survey=self.survey)
+        self.choice = Choice.objects.create(question=self.question, choice_text='Вариант')
+        self.client = APIClient()
+        response = self.client.post(reverse('respondent-token'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.token = response.data['token']
+        self.client.credentials(HTTP_X_RESPONDENT_TOKEN=self.token)
+
+    def answer(self, client=None):
+        return (client or self.client).post(reverse('answer-list'),
+                                            {'question': self.question.id, 'choice': self.choice.id}, format='json')
+
+    def test_anonymous_answer(self):
+        response = self.answer()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        answer = Answer.objects.get()
+        self.assertIsNone(answer.user)
+        self.assertEqual(answer.respondent, parse_respondent_token(self.token).id)
+        self.assertFalse(Session.objects.exists())
+
+    def test_respondent_sees_only_own_answers(self):
+        self.answer()
+        other = APIClient()
+        other.credentials(HTTP_X_RESPONDENT_TOKEN=make_respondent_token())
+        self.assertEqual(self.answer(other).status_code, status.HTTP_201_CREATED)
+        response = self.client.get(reverse('answer-list'))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(other.get(reverse('answer-list')).data), 1)
+
+    def test_duplicate_answer_is_rejected(self):
+        self.answer()
+        response = self.answer()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Answer.objects.count(), 1)
+
+    def test_forged_token(self):
+        client = APIClient()
+        client.credentials(HTTP_X_RESPONDENT_TOKEN=self.token[:-1] + 'x')
+        response = self.answer(client)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RESPONDENT_TOKEN_MAX_AGE=-1)
+    def test_expired_token(self):
+        self.assertEqual(self.answer().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_respondent_cannot_manage_surveys(self):
+        response = self.client.delete(reverse('survey-detail', kwargs={'pk': self.survey.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,106 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys.models import Survey, Question, Choice, Answer, SurveyResults
+
+
+class ResultsTest(TestCase):
+    """ Класс тестов для итогов опроса и их снимков """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question = Question.objects.create(question_text='Вопрос', question_type='many_options',
+                                                survey=self.survey)
+        self.text_question = Question.objects.create(question_text='Комментарий', question_type='text',
+                                                     survey=self.survey)
+        self.x = Choice.objects.create(question=self.question, choice_text='X')
+        self.y = Choice.objects.create(question=self.question, choice_text='Y')
+        self.users = [get_user_model().objects.create_user(username=f'user_{i}', password='test_password')
+                      for i in range(2)]
+        Answer.objects.create(user=self.users[0], question=self.question, choices=[self.x.id, self.y.id])
+        Answer.objects.create(user=self.users[1], question=self.question, choices=[self.y.id])
+        Answer.objects.create(question=self.question, choices=[self.y.id])
+        Answer.objects.create(user=self.users[0], question=self.text_question, answer_text='Хорошо')
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+        self.url = reverse('survey-results', kwargs={'pk': self.survey.pk})
+
+    def close_survey(self):
+        Survey.objects.filter(pk=self.survey.pk).update(date_end=timezone.now() - timedelta(days=1))
+
+    def test_results(self):
+        response = self.admin_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Results-Frozen'], 'false')
+        data = json.loads(response.content)
+        self.assertEqual(data['respondents'], 2)
+        question, text_question = data['questions']
+        self.assertEqual(question['answers'], 3)
+        self.assertEqual([(choice['choice_text'], choice['count']) for choice in question['choices']],
+                         [('X', 1), ('Y', 3)])
+        self.assertEqual((text_question['answers'], text_question['text_answers']), (1, 1))
+        self.assertFalse(SurveyResults.objects.exists())
+
+    def test_closed_survey_results_are_frozen(self):
+        self.close_survey()
+        first = self.admin_client.get(self.url)
+        self.assertEqual(first['X-Results-Frozen'], 'true')
+        self.assertTrue(SurveyResults.objects.filter(survey=self.survey).exists())
+
+        Answer.objects.create(user=self.users[1], question=self.text_question, answer_text='Ещё ответ')
+        with self.assertNumQueries(4):  # сессия, пользователь, опрос, снимок
+            second = self.admin_client.get(self.url)
+        self.assertEqual(second.content, first.content)
+
+    def test_closed_survey_answers_are_frozen(self):
+        self.close_survey()
+        frozen = self.admin_client.get(self.url).content
+        answer = Answer.objects.get(user=self.users[0], question=self.text_question)
+        client = Client()
+        client.force_login(self.users[0])
+        url = reverse('answer-detail', kwargs={'pk': answer.pk})
+        self.assertEqual(client.delete(url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = client.patch(url, {'answer_text': 'Плохо'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.admin_client.get(self.url).content, frozen)
+
+    def test_changing_answers_resets_snapshot(self):
+        self.close_survey()
+        self.admin_client.get(self.url)
+        Answer.objects.get(user=self.users[0], question=self.text_question).delete()
+        self.assertFalse(SurveyResults.objects.exists())
+        response = self.admin_client.get(self.url)
+        self.assertEqual(response.json()['questions'][1]['answers'], 0)
+
+    def test_extending_survey_resets_snapshot(self):
+        self.close_survey()
+        self.admin_client.get(self.url)
+        survey = Survey.objects.get(pk=self.survey.pk)
+        survey.date_end = timezone.now() + timedelta(days=1)
+        survey.save()
+        self.assertFalse(SurveyResults.objects.exists())
+
+    def test_results_are_staff_only(self):
+        client = Client()
+        client.force_login(self.users[0])
+        self.assertEqual(client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_freeze_results_command(self):
+        self.close_survey()
+        out = StringIO()
+        call_command('freeze_results', stdout=out)
+        self.assertIn('сохранено снимков итогов: 1', out.getvalue())
+        call_command('freeze_results', stdout=out)
+        self.assertIn('сохранено снимков итогов: 0', out.getvalue())
+        self.assertEqual(json.loads(SurveyResults.objects.get().payload)['respondents'], 2)
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.inspectors import SwaggerAutoSchema
+from rest_framework import status
+from surveys_system_api import schema
+
+client = Client()
+
+
+@override_settings(OPENAPI_SCHEMA_FILE=None)
+class SchemaAPITest(TestCase):
+    """ Класс тестов для кэшированной OpenAPI-схемы """
+
+    def setUp(self):
+        schema.reset_schema()
+
+    def tearDown(self):
+        schema.reset_schema()
+
+    def test_schema_is_served(self):
+        response = client.get(reverse('schema-json'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('/surveys/', json.loads(response.content)['paths'])
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_no_introspection_after_warm_up(self):
+        client.get(reverse('schema-json'))
+        with mock.patch.object(SwaggerAutoSchema, 'get_operation') as get_operation:
+            with mock.patch.object(OpenAPISchemaGenerator, 'get_schema') as get_schema:
+                for _ in range(3):
+                    response = client.get(reverse('schema-json'))
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+            get_schema.assert_not_called()
+            response = client.get(reverse('schema-swagger-ui'), HTTP_ACCEPT='text/html')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        get_operation.assert_not_called()
+
+    def test_swagger_ui_schema_is_cached(self):
+        client.get(reverse('schema-json'))
+        with mock.patch.object(OpenAPISchemaGenerator, 'get_schema') as get_schema:
+            for _ in range(3):
+                response = client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.content, schema.get_schema()[0])
+                self.assertEqual(response['ETag'], '"%s"' % schema.get_schema()[1])
+            response = client.get(reverse('schema-swagger-ui'), HTTP_ACCEPT='text/html')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertContains(response, 'SurveySystem API')
+        get_schema.assert_not_called()
+
+    def test_not_modified(self):
+        etag = client.get(reverse('schema-json'))['ETag']
+        response = client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'openapi.json')
+            call_command('generate_openapi_schema', output=path, stdout=open(os.devnull, 'w'))
+            with override_settings(OPENAPI_SCHEMA_FILE=path), \
+                    mock.patch.object(schema, 'generate_schema') as generate_schema:
+                response = client.get(reverse('schema-json'))
+            generate_schema.assert_not_called()
+            with open(path, 'rb') as schema_file:
+                self.assertEqual(response.content, schema_file.read())
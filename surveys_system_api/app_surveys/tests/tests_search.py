@@ -0,0 +1,97 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys import search
+from app_surveys.models import Survey, Question, Answer, QuestionTerm
+
+
+class SearchTest(TestCase):
+    """ Класс тестов для полнотекстового поиска и частот слов текстовых ответов """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(
+            title='Тестовый опрос',
+            date_end=timezone.now() + timedelta(days=30),
+            description='Тестовое описание'
+        )
+        self.question = Question.objects.create(question_text='Что вам понравилось в сервисе?',
+                                                question_type='text', survey=self.survey)
+        self.other_question = Question.objects.create(question_text='Какой у вас город?',
+                                                      question_type='text', survey=self.survey)
+        self.users = [get_user_model().objects.create_user(username=f'user_{i}', password='test_password')
+                      for i in range(3)]
+        self.answers = [
+            Answer.objects.create(user=self.users[0], question=self.question, answer_text='Быстрая доставка, доставка!'),
+            Answer.objects.create(user=self.users[1], question=self.question, answer_text='Вежливый курьер и доставка'),
+            Answer.objects.create(user=self.users[2], question=self.question, answer_text='Удобное приложение'),
+        ]
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+
+    def terms(self, question=None):
+        return dict(QuestionTerm.objects.filter(question=question or self.question).values_list('term', 'count'))
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('Это и ЭТО: быстрая доставка 2024, доставка'), {'это', 'быстрая', 'доставка'})
+
+    def test_terms_are_counted_once_per_answer(self):
+        terms = self.terms()
+        self.assertEqual(terms['доставка'], 2)
+        self.assertEqual(terms['курьер'], 1)
+        self.assertNotIn('и', terms)
+
+    def test_terms_follow_updates_and_deletes(self):
+        answer = self.answers[0]
+        answer.answer_text = 'Быстрый курьер'
+        answer.save()
+        terms = self.terms()
+        self.assertEqual(terms['доставка'], 1)
+        self.assertEqual(terms['курьер'], 2)
+        self.assertNotIn('быстрая', terms)
+
+        answer.question = self.other_question
+        answer.save()
+        self.assertEqual(self.terms()['курьер'], 1)
+        self.assertEqual(self.terms(self.other_question), {'быстрый': 1, 'курьер': 1})
+
+        self.answers[1].delete()
+        self.assertNotIn('курьер', self.terms())
+        self.assertEqual(self.terms()['приложение'], 1)
+
+    def test_terms_endpoint(self):
+        response = self.admin_client.get(reverse('question-terms', kwargs={'pk': self.question.pk}), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0], {'term': 'доставка', 'count': 2})
+        self.assertEqual(len(response.data), 2)
+
+    def test_terms_endpoint_is_staff_only(self):
+        client = Client()
+        client.force_login(self.users[0])
+        response = client.get(reverse('question-terms', kwargs={'pk': self.question.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_limit(self):
+        response = self.admin_client.get(reverse('question-terms', kwargs={'pk': self.question.pk}), {'limit': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_answers(self):
+        response = self.admin_client.get(reverse('question-search-answers', kwargs={'pk': self.question.pk}),
+                                         {'q': 'доставка'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({answer['id'] for answer in response.data}, {self.answers[0].id, self.answers[1].id})
+
+    def test_search_follows_updates(self):
+        self.answers[2].answer_text = 'Удобная доставка'
+        self.answers[2].save()
+        self.answers[0].delete()
+        found = search.search_answers(Answer.objects.all(), 'доставка')
+        self.assertEqual({answer.id for answer in found}, {self.answers[1].id, self.answers[2].id})
+
+    def test_search_questions(self):
+        response = self.admin_client.get(reverse('question-list'), {'search': 'город'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([question['id'] for question in response.data], [self.other_question.id])
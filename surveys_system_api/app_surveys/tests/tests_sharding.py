@@ -0,0 +1,272 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from app_surveys import archive, importer, results
+from app_surveys.db_routers import AnswerShardRouter, shard_for_survey
+from app_surveys.models import Survey, Question, Answer, AnswerRollup, ArchivedAnswer
+from app_surveys.sharding import SHARD_ID_BITS
+
+SHARD = 'answers_test'
+SHARDS = ['default', SHARD]
+
+
+@override_settings(ANSWER_SHARDS=SHARDS)
+class ShardingTest(TestCase):
+    """
+    Класс тестов для шардирования ответов по опросам. Второй шард - отдельная тестовая база,
+    которая создается на время класса тестов.
+    """
+    # шарда еще нет в настройках, когда запускающий тесты проверяет базы; '__all__' раскрывается уже с ним
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections['default'].settings_dict
+        connections.settings[SHARD] = {**default, 'NAME': f'{default["NAME"]}_{SHARD}',
+                                       'TEST': {**default['TEST'], 'NAME': None}}
+        with override_settings(ANSWER_SHARDS=SHARDS):
+            cls.shard_name = connections[SHARD].creation.create_test_db(verbosity=0, autoclobber=True,
+                                                                        serialize=False)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[SHARD].creation.destroy_test_db(cls.shard_name, verbosity=0)
+        del connections[SHARD]
+        del connections.settings[SHARD]
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        self.surveys = {alias: self._survey_on(alias) for alias in SHARDS}
+        self.questions = {alias: Question.objects.create(question_text='Вопрос', question_type='text', survey=survey)
+                          for alias, survey in self.surveys.items()}
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def _survey_on(alias):
+        """Опрос, ответы которого хранятся в шарде alias."""
+        while True:
+            survey = Survey.objects.create(title='Опрос', description='Описание',
+                                           date_end=timezone.now() + timedelta(days=30))
+            if shard_for_survey(survey.id) == alias:
+                return survey
+            survey.delete()
+
+    def _answer(self, alias, **kwargs):
+        return Answer.objects.create(question=self.questions[alias], answer_text='Ответ', **kwargs)
+
+    def test_shard_for_survey(self):
+        shards = {survey_id: shard_for_survey(survey_id) for survey_id in range(1, 200)}
+        self.assertEqual(set(shards.values()), set(SHARDS))
+        with override_settings(ANSWER_SHARDS=SHARDS + ['answers_new']):
+            moved = {survey_id for survey_id, alias in shards.items() if shard_for_survey(survey_id) != alias}
+            # при добавлении шарда ответы опросов переезжают только в новый шард
+            self.assertEqual({shard_for_survey(survey_id) for survey_id in moved}, {'answers_new'})
+
+    def test_answers_are_written_to_survey_shard(self):
+        for alias in SHARDS:
+            answer = self._answer(alias, user=self.user)
+            self.assertEqual(answer._state.db, alias)
+            for other in SHARDS:
+                self.assertEqual(Answer.objects.using(other).filter(pk=answer.pk).exists(), other == alias)
+        # шард выдает ID из своего диапазона
+        self.assertGreater(Answer.objects.using(SHARD).get().id, 1 << SHARD_ID_BITS)
+        self.assertLess(Answer.objects.using('default').get().id, 1 << SHARD_ID_BITS)
+
+    def test_bulk_create_splits_by_shard(self):
+        Answer.objects.bulk_create([Answer(question=question, answer_text='Ответ')
+                                    for question in self.questions.values() for _ in range(2)])
+        for alias in SHARDS:
+            self.assertEqual(Answer.objects.using(alias).filter(survey=self.surveys[alias]).count(), 2)
+
+    def test_user_answers_are_gathered_from_shards(self):
+        for alias in SHARDS:
+            response = self.client.post(reverse('answer-list'),
+                                        {'question': self.questions[alias].id, 'answer_text': 'Ответ'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Answer.objects.using(SHARD).filter(user=self.user).exists())
+
+        response = self.client.get(reverse('answer-list'))
+        ids = [answer['id'] for answer in response.json()]
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual({answer['survey'] for answer in response.json()}, {'Опрос'})
+
+        shard_answer = Answer.objects.using(SHARD).get()
+        response = self.client.get(reverse('answer-detail', kwargs={'pk': shard_answer.pk}))
+        self.assertEqual(response.json()['question'], self.questions[SHARD].id)
+        response = self.client.post(reverse('answer-list'),
+                                    {'question': self.questions[SHARD].id, 'answer_text': 'Еще раз'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(reverse('answer-detail', kwargs={'pk': shard_answer.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Answer.objects.using(SHARD).exists())
+        response = self.client.get(reverse('answer-detail', kwargs={'pk': shard_answer.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_results_are_read_from_survey_shard(self):
+        self._answer(SHARD, user=self.user)
+        survey = self.surveys[SHARD]
+        self.assertEqual({answers.db for answers in archive.survey_answers(survey.id)}, {SHARD})
+        summary = results.compute_results(survey)
+        self.assertEqual(summary['respondents'], 1)
+        self.assertEqual(summary['questions'][0]['answers'], 1)
+
+    def test_archive_within_shard(self):
+        answer = self._answer(SHARD)
+        survey = self.surveys[SHARD]
+        Survey.objects.filter(id=survey.id).update(date_end=timezone.now() - timedelta(days=200))
+        self.assertEqual(list(archive.surveys_to_archive(90)), [survey])
+        self.assertEqual(archive.archive_survey(survey.id), 1)
+        self.assertTrue(ArchivedAnswer.objects.using(SHARD).filter(id=answer.id).exists())
+        self.assertEqual(list(archive.surveys_to_archive(90)), [])
+
+    def test_answer_moves_with_question(self):
+        answer = self._answer(SHARD)
+        question = self.questions[SHARD]
+        question.survey = self.surveys['default']
+        question.save()
+        self.assertFalse(Answer.objects.using(SHARD).exists())
+        self.assertEqual(Answer.objects.using('default').get(id=answer.id).survey_id, self.surveys['default'].id)
+
+    def test_answer_moves_with_changed_question(self):
+        answer = self._answer('default')
+        answer.question = self.questions[SHARD]
+        answer.save()
+        self.assertFalse(Answer.objects.using('default').exists())
+        self.assertEqual(Answer.objects.using(SHARD).get().id, answer.id)
+
+    def test_deletion_reaches_shards(self):
+        self._answer(SHARD)
+        self.surveys[SHARD].delete()
+        self.assertFalse(Answer.objects.using(SHARD).exists())
+
+        self._answer('default', user=self.user)
+        question = Question.objects.create(question_text='Вопрос', question_type='text',
+                                           survey=self._survey_on(SHARD))
+        Answer.objects.create(question=question, answer_text='Ответ', user=self.user)
+        self.user.delete()
+        self.assertFalse(Answer.objects.using('default').exists())
+        self.assertFalse(Answer.objects.using(SHARD).exists())
+
+    def test_rebalance(self):
+        with override_settings(ANSWER_SHARDS=['default']):
+            answers = {alias: self._answer(alias) for alias in SHARDS}
+            archived = self._answer(SHARD)
+            ArchivedAnswer.objects.create(id=archived.id, question_id=archived.question_id,
+                                          survey_id=archived.survey_id, answer_text='Архив')
+            archived_id = archived.id
+            archived.delete()
+        self.assertEqual(Answer.objects.using('default').count(), 2)
+
+        out = StringIO()
+        call_command('rebalance_answers', dry_run=True, stdout=out)
+        self.assertIn(f'опрос {self.surveys[SHARD].id}: default -> {SHARD}', out.getvalue())
+        self.assertEqual(Answer.objects.using(SHARD).count(), 0)
+
+        out = StringIO()
+        call_command('rebalance_answers', batch_size=1, stdout=out)
+        self.assertIn('всего перенесено: 2', out.getvalue())
+        self.assertEqual(list(Answer.objects.using(SHARD).values_list('id', flat=True)), [answers[SHARD].id])
+        self.assertEqual(list(Answer.objects.using('default').values_list('id', flat=True)), [answers['default'].id])
+        self.assertTrue(ArchivedAnswer.objects.using(SHARD).filter(id=archived_id).exists())
+        # счетчики графика ответов переезжают вместе с ответами
+        rollups = AnswerRollup.objects.filter(survey=self.surveys[SHARD], bucket='day')
+        self.assertFalse(rollups.using('default').exists())
+        self.assertEqual(rollups.using(SHARD).get().count, 1)
+
+        out = StringIO()
+        call_command('rebalance_answers', stdout=out)
+        self.assertIn('всего перенесено: 0', out.getvalue())
+
+    def test_admin_reads_answers_from_shards(self):
+        answers = {alias: self._answer(alias, user=self.user) for alias in SHARDS}
+        superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        client = Client()
+        client.force_login(superuser)
+        url = reverse('admin:app_surveys_answer_changelist')
+        for params, alias in (({'shard': SHARD}, SHARD), ({'survey': self.surveys[SHARD].id}, SHARD), ({}, 'default')):
+            response = client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([answer.id for answer in response.context['cl'].result_list], [answers[alias].id])
+        response = client.get(reverse('admin:app_surveys_answer_change', args=[answers[SHARD].id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context['original'], answers[SHARD])
+
+    def test_foreign_keys_are_dropped_only_on_shards(self):
+        for alias, expected in (('default', {'user_id', 'question_id', 'survey_id', 'choice_id'}), (SHARD, set())):
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, Answer._meta.db_table)
+            self.assertEqual({constraint['columns'][0] for constraint in constraints.values()
+                              if constraint['foreign_key']}, expected)
+
+    def test_import_batch_is_rolled_back_on_shards(self):
+        records = []
+        for number in range(10):
+            records += [
+                {'type': 'survey', 'id': f's{number}', 'title': 'Опрос', 'description': 'Описание',
+                 'date_end': '2030-01-01T00:00:00'},
+                {'type': 'question', 'id': f'q{number}', 'survey': f's{number}', 'question_text': 'Вопрос',
+                 'question_type': 'text'},
+                {'type': 'answer', 'question': f'q{number}', 'user': 'test_user', 'answer_text': 'Ответ'},
+            ]
+        shard_answers = []
+
+        def fail(*args, **kwargs):
+            shard_answers.append(Answer.objects.using(SHARD).count())
+            raise RuntimeError
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.jsonl')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('\n'.join(json.dumps(record) for record in records))
+            with mock.patch.object(importer, 'save_checkpoint', side_effect=fail), self.assertRaises(RuntimeError):
+                call_command('import_surveys', path, stdout=StringIO(), stderr=StringIO())
+        # ответы успели попасть в шард, но откатились вместе с контрольной точкой в основной базе
+        self.assertGreater(shard_answers[0], 0)
+        self.assertFalse(Answer.objects.using(SHARD).exists())
+        self.assertFalse(AnswerRollup.objects.using(SHARD).exists())
+
+    def test_atomic_batch_is_rolled_back_on_shards(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        requests = [{'method': 'POST', 'path': '/api/answers/',
+                     'body': {'question': self.questions[alias].id, 'answer_text': 'Ответ'}} for alias in SHARDS]
+        # повторный ответ на вопрос отклоняется и откатывает весь пакет
+        response = client.post(reverse('batch'), {'atomic': True, 'requests': requests + requests[-1:]},
+                               format='json')
+        self.assertEqual([item['status'] for item in response.data['responses']], [201, 201, 400])
+        self.assertTrue(response.data['rolled_back'])
+        for alias in SHARDS:
+            self.assertFalse(Answer.objects.using(alias).exists())
+            self.assertFalse(AnswerRollup.objects.using(alias).exists())
+
+        response = client.post(reverse('batch'), {'atomic': True, 'requests': requests}, format='json')
+        self.assertFalse(response.data['rolled_back'])
+        for alias in SHARDS:
+            self.assertEqual(Answer.objects.using(alias).get().survey, self.surveys[alias])
+
+    @override_settings(ANSWER_SHARDS=[])
+    def test_without_shards(self):
+        router = AnswerShardRouter()
+        answer = Answer(question=self.questions[SHARD], survey=self.surveys[SHARD])
+        self.assertIsNone(router.db_for_write(Answer, instance=answer))
+        self.assertIsNone(router.db_for_read(get_user_model(), instance=answer))
+        self.assertEqual(self._answer(SHARD)._state.db, 'default')
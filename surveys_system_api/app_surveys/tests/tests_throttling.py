@@ -0,0 +1,128 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys import metrics, throttling
+from app_surveys.models import Survey, Question
+from app_surveys.throttling import BucketStore, TokenBucketThrottle
+
+
+@override_settings(THROTTLE_CACHE='default', THROTTLE_SYNC_INTERVAL=1.0)
+class BucketStoreTest(TestCase):
+    """ Класс тестов для корзин token bucket с общим состоянием """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills(self):
+        store = BucketStore()
+        self.assertEqual([store.consume('key', 3, 1.0, now=100)[0] for _ in range(4)], [True, True, True, False])
+        allowed, wait = store.consume('key', 3, 1.0, now=100)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0)
+        self.assertTrue(store.consume('key', 3, 1.0, now=101)[0])
+
+    def test_cache_is_not_read_on_every_request(self):
+        store = BucketStore()
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            for _ in range(3):
+                store.consume('key', 10, 1.0, now=100)
+            store.consume('key', 10, 1.0, now=100.5)
+            self.assertEqual(get.call_count, 1)
+            store.consume('key', 10, 1.0, now=101)
+            self.assertEqual(get.call_count, 2)
+
+    def test_processes_share_bucket(self):
+        first, second = BucketStore(), BucketStore()
+        for _ in range(3):
+            first.consume('key', 3, 1.0, now=100)
+        # первый процесс списал свои токены в общую корзину, и второй видит ее долг
+        self.assertTrue(first.consume('key', 3, 1.0, now=101)[0])
+        allowed, wait = second.consume('key', 3, 1.0, now=101)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 2.0)
+
+    def test_processes_do_not_lose_updates(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                CACHES={**settings.CACHES, 'throttle': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}},
+                THROTTLE_CACHE='throttle'):
+            store = BucketStore()
+            pids = []
+            for _ in range(4):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        for _ in range(50):
+                            store._sync('key', 1000, 0.001, 1, now=100)
+                    finally:
+                        os._exit(0)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+            self.assertEqual(store.cache.get('key')[0], 800)
+
+    def test_eviction_keeps_consumed_tokens(self):
+        store = BucketStore(max_buckets=1)
+        for _ in range(3):
+            store.consume('first', 3, 1.0, now=100)
+        store.consume('second', 3, 1.0, now=100)
+        self.assertFalse(store.consume('first', 3, 1.0, now=100)[0])
+
+
+@override_settings(THROTTLE_CACHE='default')
+@mock.patch.object(TokenBucketThrottle, 'THROTTLE_RATES', {'anon': '2/min', 'answers': '2/min'})
+class ThrottleTest(TestCase):
+    """ Класс тестов для ограничения частоты отправки ответов и анонимных запросов """
+
+    def setUp(self):
+        cache.clear()
+        # корзины с тестовыми лимитами не должны достаться другим тестам
+        self.addCleanup(setattr, throttling, 'buckets', throttling.buckets)
+        throttling.buckets = BucketStore()
+        metrics.registry = metrics.MetricsRegistry()
+        survey = Survey.objects.create(title='Тестовый опрос', description='Описание',
+                                       date_end=timezone.now() + timedelta(days=30))
+        self.questions = [Question.objects.create(question_text=f'Вопрос {number}', question_type='text',
+                                                  survey=survey) for number in range(3)]
+        self.user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post_answer(self, client, question):
+        return client.post(reverse('answer-list'), {'question': question.id, 'answer_text': 'Ответ'},
+                           content_type='application/json')
+
+    def test_answer_submission_is_throttled(self):
+        for question in self.questions[:2]:
+            self.assertEqual(self.post_answer(self.client, question).status_code, status.HTTP_201_CREATED)
+        response = self.post_answer(self.client, self.questions[2])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertIn('api_throttled_requests_total{view="AnswersViewSet.create"} 1', metrics.registry.render())
+        # чтение ответов лимитом отправки не ограничено
+        self.assertEqual(self.client.get(reverse('answer-list')).status_code, status.HTTP_200_OK)
+
+    def test_users_have_separate_buckets(self):
+        other = get_user_model().objects.create_user(username='other_user', password='test_password')
+        other_client = Client()
+        other_client.force_login(other)
+        for question in self.questions[:2]:
+            self.post_answer(self.client, question)
+        self.assertEqual(self.post_answer(other_client, self.questions[0]).status_code, status.HTTP_201_CREATED)
+
+    def test_anonymous_requests_are_throttled_by_ip(self):
+        anonymous = Client()
+        for _ in range(2):
+            self.assertEqual(anonymous.get(reverse('survey-list')).status_code, status.HTTP_200_OK)
+        # новый токен респондента не сбрасывает лимит адреса
+        response = anonymous.post(reverse('respondent-token'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.client.get(reverse('survey-list')).status_code, status.HTTP_200_OK)
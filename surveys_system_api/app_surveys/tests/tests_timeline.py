@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from app_surveys import archive, timeline
+from app_surveys.models import Survey, Question, Answer, AnswerRollup, ArchivedAnswer
+
+START = datetime(2026, 3, 1, 10, 0, tzinfo=dt_timezone.utc)
+
+
+class TimelineTest(TestCase):
+    """ Класс тестов для графика поступления ответов опроса """
+
+    def setUp(self):
+        self.survey = Survey.objects.create(title='Тестовый опрос', description='Тестовое описание',
+                                            date_end=START + timedelta(days=30))
+        # дата начала заполняется при создании опроса
+        Survey.objects.filter(id=self.survey.id).update(date_start=START)
+        self.question = Question.objects.create(question_text='Вопрос', question_type='text', survey=self.survey)
+        self.superuser = get_user_model().objects.create_superuser(username='admin', email='email', password='admin')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.superuser)
+
+    def _answer(self, minutes, question=None):
+        return Answer.objects.create(question=question or self.question, answer_text='Ответ',
+                                     created_at=START + timedelta(minutes=minutes))
+
+    def _rollups(self, bucket='minute', survey=None):
+        return dict(AnswerRollup.objects.filter(survey=survey or self.survey, bucket=bucket)
+                    .values_list('start', 'count'))
+
+    def get_timeline(self, **params):
+        return self.admin_client.get(reverse('survey-timeline', kwargs={'pk': self.survey.pk}), params)
+
+    def test_created_at_is_filled(self):
+        before = timezone.now()
+        answer = Answer.objects.create(question=self.question, answer_text='Ответ')
+        self.assertGreaterEqual(answer.created_at, before)
+        bulk, = Answer.objects.bulk_create([Answer(question=self.question, answer_text='Ответ')])
+        self.assertIsNotNone(bulk.created_at)
+
+    def test_rollups_follow_answers(self):
+        first = self._answer(0)
+        self._answer(0.5)
+        self._answer(65)
+        self.assertEqual(self._rollups(), {START: 2, START + timedelta(minutes=65): 1})
+        self.assertEqual(self._rollups('hour'), {START: 2, START + timedelta(hours=1): 1})
+        self.assertEqual(self._rollups('day'), {START.replace(hour=0): 3})
+
+        first.answer_text = 'Другой ответ'
+        first.save()
+        self.assertEqual(self._rollups('day'), {START.replace(hour=0): 3})
+        first.delete()
+        self.assertEqual(self._rollups(), {START: 1, START + timedelta(minutes=65): 1})
+
+    def test_rollups_follow_moved_question(self):
+        self._answer(0)
+        other = Survey.objects.create(title='Другой опрос', description='Описание', date_end=START)
+        self.question.survey = other
+        self.question.save()
+        self.assertEqual(self._rollups(), {})
+        self.assertEqual(self._rollups(survey=other), {START: 1})
+
+    def test_rebuild(self):
+        answer = self._answer(0)
+        self._answer(1)
+        Answer.objects.filter(id=answer.id).update(created_at=START + timedelta(minutes=1))
+        AnswerRollup.objects.all().delete()
+        timeline.rebuild(self.survey.id)
+        self.assertEqual(self._rollups(), {START + timedelta(minutes=1): 2})
+
+    def test_archived_answers_keep_rollups(self):
+        answer = self._answer(0)
+        self.assertEqual(archive.archive_survey(self.survey.id), 1)
+        self.assertEqual(ArchivedAnswer.objects.get(id=answer.id).created_at, answer.created_at)
+        timeline.rebuild(self.survey.id)
+        self.assertEqual(self._rollups(), {START: 1})
+
+    def test_timeline(self):
+        for minutes in (0, 1, 1, 150):
+            self._answer(minutes)
+        response = self.get_timeline(bucket='hour', until=(START + timedelta(hours=3)).isoformat())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'survey': self.survey.id,
+            'bucket': 'hour',
+            'points': [{'start': (START + timedelta(hours=hours)).isoformat(), 'count': count}
+                       for hours, count in ((0, 3), (1, 0), (2, 1), (3, 0))],
+        })
+
+        response = self.get_timeline(bucket='minute', since=START.isoformat(),
+                                     until=(START + timedelta(minutes=1, seconds=30)).isoformat())
+        self.assertEqual([point['count'] for point in response.json()['points']], [1, 2])
+
+    def test_timeline_reads_rollups(self):
+        self._answer(0)
+        # сессия, пользователь, опрос и счетчики: таблица ответов не читается
+        with self.assertNumQueries(4):
+            self.get_timeline(bucket='day', until=START.isoformat())
+
+    @override_settings(TIMELINE_MAX_POINTS=3)
+    def test_timeline_is_limited(self):
+        points = self.get_timeline(bucket='minute', until=(START + timedelta(minutes=10)).isoformat()).json()['points']
+        self.assertEqual([point['start'] for point in points],
+                         [(START + timedelta(minutes=minutes)).isoformat() for minutes in (8, 9, 10)])
+
+    def test_timeline_validation(self):
+        self.assertEqual(self.get_timeline(bucket='week').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.get_timeline(since='вчера').status_code, status.HTTP_400_BAD_REQUEST)
+        user = get_user_model().objects.create_user(username='test_user', password='test_password')
+        client = Client()
+        client.force_login(user)
+        response = client.get(reverse('survey-timeline', kwargs={'pk': self.survey.pk}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
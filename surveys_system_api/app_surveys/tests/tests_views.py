@@ -5,7 +5,8 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from app_surveys.models import Survey, Question, Choice, Answer
 from app_surveys.serializers import SurveySerializer, ChoiceSerializer, QuestionSerializer, AnswerSerializer
-from datetime import datetime
+from datetime import timedelta
+from django.utils import timezone
 
 client = Client()
 
@@ -16,7 +17,7 @@ class SurveysAPITest(TestCase):
     def setUp(self):
         self.survey_1 = Survey.objects.create(
             title='Тестовый опрос 1',
-            date_end='2023-04-23 23:15:12',
+            date_end=timezone.now() + timedelta(days=30),
             description='Тестовое описание 1'
         )
         self.survey_2 = Survey.objects.create(
@@ -54,14 +55,13 @@ class SurveysAPITest(TestCase):
         self.assertEqual(response.data, serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-    # def test_get_active_surveys(self):
-    #     response = client.get(reverse('survey-list'), kwargs={'active': 'true'})
-    #     surveys = Survey.objects.filter(date_end__gte=datetime.now(), date_start__lte=datetime.now())
-    #     serializer = SurveySerializer(surveys, many=True)
-    #     print(response.data)
-    #     print(serializer.data)
-    #     self.assertEqual(response.data, serializer.data)
-    #     self.assertEqual(response.status_code, status.HTTP_200_OK)
+    def test_get_active_surveys(self):
+        response = client.get(reverse('survey-list'), {'active': 'true'})
+        surveys = Survey.objects.active()
+        serializer = SurveySerializer(surveys, many=True)
+        self.assertEqual(response.data, serializer.data)
+        self.assertEqual([survey['id'] for survey in response.data], [self.survey_1.id])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_get_valid_single_survey(self):
         response = client.get(
@@ -291,7 +291,7 @@ class AnswersAPITest(TestCase):
         super().setUp()
         self.survey_1 = Survey.objects.create(
             title='Тестовый опрос 1',
-            date_end='2023-04-23 23:15:12',
+            date_end=timezone.now() + timedelta(days=30),
             description='Тестовое описание 1'
         )
 
@@ -399,6 +399,63 @@ class AnswersAPITest(TestCase):
     #     self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
     #     # self.assertEqual(response.text, 'Вы уже отвечали на этот вопрос.')
 
+    def test_create_multiple_choice_answer(self):
+        question = Question.objects.create(question_text='Тестовый вопрос 3', question_type='many_options',
+                                           survey=self.survey_1)
+        choices = [Choice.objects.create(choice_text=f'Вариант {i}', question=question) for i in range(3)]
+        response = self.authorized_client.post(
+            reverse('answer-list'),
+            data=json.dumps({'question': question.id, 'choices': [choices[2].id, choices[0].id]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['choices'], [choices[0].id, choices[2].id])
+        self.assertEqual(Answer.objects.filter(question=question).count(), 1)
+
+        response = self.authorized_client.post(
+            reverse('answer-list'),
+            data=json.dumps({'question': question.id, 'choices': [choices[1].id]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_partial_update_keeps_multiple_choices(self):
+        question = Question.objects.create(question_text='Тестовый вопрос 3', question_type='many_options',
+                                           survey=self.survey_1)
+        choices = [Choice.objects.create(choice_text=f'Вариант {i}', question=question) for i in range(3)]
+        response = self.authorized_client.post(
+            reverse('answer-list'),
+            data=json.dumps({'question': question.id, 'choices': [choices[0].id, choices[1].id]}),
+            content_type='application/json'
+        )
+        answer_id = response.data['id']
+        response = self.authorized_client.patch(
+            reverse('answer-detail', kwargs={'pk': answer_id}),
+            data=json.dumps({'answer_text': 'Комментарий'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['choices'], [choices[0].id, choices[1].id])
+        self.assertEqual(response.data['answer_text'], 'Комментарий')
+
+        response = self.authorized_client.patch(
+            reverse('answer-detail', kwargs={'pk': answer_id}),
+            data=json.dumps({'choices': [choices[2].id]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Answer.objects.get(id=answer_id).choices, [choices[2].id])
+
+    def test_create_multiple_choice_answer_with_foreign_choice(self):
+        question = Question.objects.create(question_text='Тестовый вопрос 3', question_type='many_options',
+                                           survey=self.survey_1)
+        response = self.authorized_client.post(
+            reverse('answer-list'),
+            data=json.dumps({'question': question.id, 'choices': [self.choice.id]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_invalid_answer(self):
         response = self.authorized_client.post(
             reverse('answer-list'),
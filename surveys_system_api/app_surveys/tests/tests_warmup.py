@@ -0,0 +1,96 @@
+import importlib
+import sys
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from app_surveys import compression, warmup
+from app_surveys.models import Survey, Question, Choice
+
+
+class WarmupTest(TestCase):
+    """ Класс тестов для прогрева воркера и эндпоинта готовности """
+
+    def setUp(self):
+        caches[settings.SHARED_CACHE].clear()
+        self.addCleanup(setattr, warmup, 'state', warmup.state)
+        warmup.state = warmup.WarmupState()
+        now = timezone.now()
+        self.survey = Survey.objects.create(title='Активный опрос', description='Описание',
+                                            date_end=now + timedelta(days=30))
+        question = Question.objects.create(question_text='Цвет', question_type='one_option', survey=self.survey)
+        Choice.objects.create(question=question, choice_text='Красный')
+        self.closed = Survey.objects.create(title='Закрытый опрос', description='Описание',
+                                            date_end=now - timedelta(days=1))
+
+    def test_not_ready_before_warmup(self):
+        response = Client().get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['ready'])
+
+    def test_warmup_caches_active_survey_definitions(self):
+        warmup.warm_up()
+        payloads = compression.get_survey_definition(self.survey.id)
+        self.assertIsNotNone(payloads)
+        self.assertIsNone(compression.get_survey_definition(self.closed.id))
+
+        response = Client().get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body['ready'])
+        self.assertEqual(body['errors'], [])
+        self.assertEqual(body['steps']['survey_definitions']['result'], 1)
+        self.assertEqual(set(body['steps']), {'urls', 'serializers', 'survey_definitions'})
+
+        # прогретое описание совпадает с тем, что построило бы представление
+        caches[settings.SHARED_CACHE].clear()
+        response = Client().get(reverse('survey-detail', args=[self.survey.id]))
+        self.assertEqual(response.content, payloads['identity'])
+
+    @override_settings(DATABASE_REPLICAS=['replica_0'])
+    def test_survey_definitions_are_read_from_primary(self):
+        # реплики 'replica_0' не существует: чтение с нее завершилось бы ошибкой
+        self.assertEqual(warmup.warm_survey_definitions(), 1)
+        self.assertIsNotNone(compression.get_survey_definition(self.survey.id))
+
+    def test_failed_step_does_not_block_readiness(self):
+        def broken():
+            raise RuntimeError('нет соединения с базой')
+
+        steps = warmup.STEPS
+        self.addCleanup(setattr, warmup, 'STEPS', steps)
+        warmup.STEPS = (('broken', broken),) + steps
+        with self.assertLogs('app_surveys.warmup', level='ERROR'):
+            warmup.warm_up()
+        self.assertTrue(warmup.state.ready)
+        self.assertEqual(warmup.state.errors, ['broken: нет соединения с базой'])
+        self.assertIn('survey_definitions', warmup.state.steps)
+
+    def test_entry_points_warm_up(self):
+        for module in ('surveys_system_api.wsgi', 'surveys_system_api.asgi'):
+            self.addCleanup(sys.modules.pop, module, None)
+            sys.modules.pop(module, None)
+            with self.subTest(module=module), mock.patch.object(warmup, 'warm_up') as warm_up:
+                importlib.import_module(module)
+                warm_up.assert_called_once_with()
+
+    def test_not_ready_without_database(self):
+        warmup.warm_up()
+        connection = mock.MagicMock(alias='default')
+        connection.cursor.side_effect = OperationalError('connection refused')
+        with mock.patch.object(warmup.connections, 'all', return_value=[connection]):
+            response = Client().get(reverse('readiness'))
+        self.assertEqual(response.status_code, 503)
+        body = response.json()
+        self.assertFalse(body['ready'])
+        self.assertEqual(body['databases'], {'default': 'connection refused'})
+
+    @override_settings(WARMUP_ON_BOOT=False)
+    def test_ready_without_warmup_on_boot(self):
+        response = Client().get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['databases'], {'default': 'ok'})
@@ -0,0 +1,207 @@
+"""
+Ограничение частоты запросов алгоритмом token bucket. Решение принимается по корзине в памяти процесса,
+без обращения к кэшу на каждый запрос; раз в THROTTLE_SYNC_INTERVAL секунд процесс списывает
+израсходованные токены из общей корзины в кэше THROTTLE_CACHE и берет ее уровень себе. Так корзина
+одного клиента общая для всех процессов хоста (файловый кэш) или всех хостов (Redis, memcached).
+Между синхронизациями клиент может превысить лимит не больше чем на емкость корзины в каждом процессе.
+"""
+import fcntl
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from rest_framework.throttling import SimpleRateThrottle
+
+from app_surveys import metrics
+from app_surveys.authentication import get_respondent
+
+# сколько клиентов процесс помнит локально; давно не обращавшиеся вытесняются
+MAX_LOCAL_BUCKETS = 10000
+# файлов блокировок общих корзин в каталоге файлового кэша: корзины распределяются по ним хешем ключа
+LOCK_FILES = 64
+# сколько ждать блокировку записи общего кэша без атомарного flock (memcached, Redis), в секундах
+SHARED_LOCK_TIMEOUT = 0.5
+
+
+@contextmanager
+def shared_lock(cache, key):
+    """
+    Блокировка записи key общего кэша между процессами на время чтения и записи: иначе одновременные
+    обновления теряют изменения друг друга. add файлового кэша не атомарен, поэтому процессы хоста
+    блокируют файл через flock; в остальных кэшах блокировкой служит атомарный add.
+    """
+    if isinstance(cache, FileBasedCache):
+        # каталог блокировок не виден кэшу: его файлы не считаются записями и не вытесняются
+        directory = os.path.join(cache._dir, 'locks')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{zlib.crc32(key.encode()) % LOCK_FILES}.lock')
+        with open(path, 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        return
+    lock_key, deadline = f'{key}:lock', time.monotonic() + SHARED_LOCK_TIMEOUT
+    acquired = cache.add(lock_key, True, timeout=1)
+    # держатель блокировки мог завершиться, не сняв ее: после таймаута запись обновляется без блокировки
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.001)
+        acquired = cache.add(lock_key, True, timeout=1)
+    try:
+        yield
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+class _Bucket:
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated', 'pending', 'synced_at')
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+        self.pending = 0
+        self.synced_at = now
+
+
+class BucketStore:
+    """
+    Корзины процесса с пакетной синхронизацией через общий кэш. Блокировка процесса защищает только
+    корзины в памяти; обращения к кэшу выполняются вне ее, под блокировкой общей корзины между процессами.
+    """
+
+    def __init__(self, max_buckets=MAX_LOCAL_BUCKETS):
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def consume(self, key, capacity, rate, now=None):
+        """Берет токен из корзины key. Возвращает (разрешено ли, через сколько секунд появится токен)."""
+        # время общее для процессов, поэтому не monotonic
+        now = time.time() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+        if bucket is None:
+            # первое обращение клиента к процессу: уровень корзины берется из общей
+            tokens = self._sync(key, capacity, rate, 0, now)
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = _Bucket(capacity, rate, now)
+                    bucket.tokens = tokens
+                evicted = self._evict()
+            for evicted_key, evicted_bucket, pending in evicted:
+                self._sync(evicted_key, evicted_bucket.capacity, evicted_bucket.rate, pending, now)
+
+        pending = None
+        with self._lock:
+            if key in self._buckets:
+                self._buckets.move_to_end(key)
+            bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+            allowed = bucket.tokens >= 1
+            if allowed:
+                bucket.tokens -= 1
+                bucket.pending += 1
+            wait = 0.0 if allowed else (1 - bucket.tokens) / rate
+            if now - bucket.synced_at >= getattr(settings, 'THROTTLE_SYNC_INTERVAL', 1.0):
+                pending, bucket.pending, bucket.synced_at = bucket.pending, 0, now
+        if pending is not None:
+            tokens = self._sync(key, capacity, rate, pending, now)
+            with self._lock:
+                # токены, взятые другими потоками во время синхронизации, спишутся при следующей
+                bucket.tokens, bucket.updated = tokens - bucket.pending, now
+        return allowed, wait
+
+    def _sync(self, key, capacity, rate, pending, now):
+        """Списывает pending токенов из общей корзины key и возвращает ее уровень."""
+        with shared_lock(self.cache, key):
+            shared = self.cache.get(key)
+            if shared is None:
+                tokens = capacity
+            else:
+                tokens, updated = shared
+                tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+            # долг ограничен емкостью корзины: клиент, превысивший лимит, ждет не дольше полного восполнения
+            tokens = max(tokens - pending, -capacity)
+            # через время полного восполнения корзина снова полна, и запись больше не нужна
+            self.cache.set(key, (tokens, now), timeout=int((capacity - tokens) / rate) + 1)
+        return tokens
+
+    def _evict(self):
+        """Вытесняет давно не обращавшихся клиентов; возвращает [(ключ, корзина, несписанные токены)]."""
+        evicted = []
+        while len(self._buckets) > self.max_buckets:
+            key, bucket = self._buckets.popitem(last=False)
+            if bucket.pending:
+                evicted.append((key, bucket, bucket.pending))
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+buckets = BucketStore()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Ограничение частоты по token bucket. Лимит scope из DEFAULT_THROTTLE_RATES ('120/min') задает
+    и емкость корзины, и скорость ее восполнения. Клиент - пользователь, анонимный респондент с токеном
+    или IP-адрес.
+    """
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            respondent = get_respondent(request)
+            ident = f'respondent:{respondent.id}' if respondent is not None else f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self._wait = buckets.consume(self.key, self.num_requests, self.num_requests / self.duration)
+        if not allowed:
+            action = getattr(view, 'action', None) or request.method.lower()
+            metrics.registry.observe_throttled(f'{type(view).__name__}.{action}')
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AnonymousThrottle(TokenBucketThrottle):
+    """
+    Лимит анонимных запросов по IP-адресу. Токен респондента здесь не учитывается: его может получить
+    кто угодно, и смена токена не должна сбрасывать лимит.
+    """
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f'throttle:{self.scope}:ip:{self.get_ident(request)}'
+
+
+class AnswerSubmissionThrottle(TokenBucketThrottle):
+    """Лимит отправки ответов для пользователя или анонимного респондента."""
+    scope = 'answers'
@@ -0,0 +1,112 @@
+"""
+График поступления ответов опроса: количество ответов по минутам, часам и дням. Счетчики AnswerRollup
+обновляются инкрементально при сохранении и удалении ответов и при импорте, поэтому чтение графика
+не группирует таблицу ответов. Ответы без даты (сохраненные до появления Answer.created_at) не учитываются.
+"""
+import datetime
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+
+from app_surveys import sharding
+from app_surveys.db_routers import answer_shards
+from app_surveys.models import Answer, AnswerRollup, ArchivedAnswer
+
+STEPS = {
+    'minute': datetime.timedelta(minutes=1),
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+TRUNCATE = {'minute': TruncMinute, 'hour': TruncHour, 'day': TruncDay}
+
+
+def truncate(moment, bucket):
+    """Начало интервала bucket, в который попадает момент; интервалы отсчитываются в UTC."""
+    moment = moment.astimezone(datetime.timezone.utc).replace(second=0, microsecond=0)
+    if bucket in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if bucket == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def changes(survey_id, created_at, delta):
+    """Изменения счетчиков {(survey_id, bucket, начало интервала): delta} для ответа с датой created_at."""
+    if created_at is None:
+        return Counter()
+    return Counter({(survey_id, bucket, truncate(created_at, bucket)): delta for bucket in STEPS})
+
+
+def update(counts):
+    """
+    Прибавляет к счетчикам значения из counts {(survey_id, bucket, начало интервала): изменение} одним запросом
+    INSERT ... ON CONFLICT на шард (поддерживается PostgreSQL и SQLite); обнулившиеся счетчики удаляются.
+    """
+    counts = {key: delta for key, delta in counts.items() if delta}
+    table = AnswerRollup._meta.db_table
+    for using, keys in sharding.split(list(counts), itemgetter(0)).items():
+        connection = connections[using]
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(keys))
+        params = [value for key in keys for value in (
+            key[0], key[1], connection.ops.adapt_datetimefield_value(key[2]), counts[key])]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (survey_id, bucket, start, count) VALUES {values} '
+                f'ON CONFLICT (survey_id, bucket, start) DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                params)
+            survey_ids = sorted({key[0] for key in keys if counts[key] < 0})
+            if survey_ids:
+                cursor.execute(f'DELETE FROM {table} WHERE survey_id IN ({", ".join(["%s"] * len(survey_ids))}) '
+                               f'AND count <= 0', survey_ids)
+
+
+def rebuild(survey_id):
+    """
+    Пересчитывает счетчики опроса по его ответам и архивным ответам (например, после переноса вопроса в другой
+    опрос или ответов в другой шард). Счетчики опроса в остальных шардах удаляются.
+    """
+    using = sharding.db_for_survey(survey_id)
+    counts = Counter()
+    for model in (Answer, ArchivedAnswer):
+        answers = model.objects.using(using).filter(survey_id=survey_id, created_at__isnull=False)
+        for bucket, trunc in TRUNCATE.items():
+            rows = (answers.annotate(start=trunc('created_at', tzinfo=datetime.timezone.utc))
+                    .values_list('start').annotate(count=Count('id')).order_by())
+            for start, count in rows:
+                counts[(bucket, start)] += count
+    for alias in answer_shards():
+        if alias != using:
+            AnswerRollup.objects.using(alias).filter(survey_id=survey_id).delete()
+    with transaction.atomic(using=using):
+        AnswerRollup.objects.using(using).filter(survey_id=survey_id).delete()
+        AnswerRollup.objects.using(using).bulk_create(
+            AnswerRollup(survey_id=survey_id, bucket=bucket, start=start, count=count)
+            for (bucket, start), count in counts.items())
+
+
+def clear(survey_id):
+    """Удаляет счетчики удаленного опроса в шардах: каскадное удаление опроса доходит только до основной базы."""
+    for alias in answer_shards():
+        AnswerRollup.objects.using(alias).filter(survey_id=survey_id).delete()
+
+
+def series(survey_id, bucket, since, until):
+    """
+    Количество ответов опроса по интервалам bucket от since до until включительно: [{'start', 'count'}, ...]
+    без пропусков (пустые интервалы - с нулем), не больше settings.TIMELINE_MAX_POINTS последних интервалов.
+    """
+    step = STEPS[bucket]
+    last = truncate(until, bucket)
+    first = max(truncate(since, bucket), last - step * (settings.TIMELINE_MAX_POINTS - 1))
+    rollups = AnswerRollup.objects.filter(survey_id=survey_id, bucket=bucket, start__gte=first, start__lte=last)
+    counts = dict(sharding.for_survey(rollups, survey_id).values_list('start', 'count'))
+    points = []
+    moment = first
+    while moment <= last:
+        points.append({'start': moment.isoformat(), 'count': counts.get(moment, 0)})
+        moment += step
+    return points
@@ -1,5 +1,6 @@
 from django.urls import path, include, re_path
-from app_surveys.views import SurveysViewSet, QuestionsViewSet, AnswersViewSet, ChoicesViewSet
+from app_surveys.views import SurveysViewSet, QuestionsViewSet, AnswersViewSet, ChoicesViewSet, ProfilesViewSet, \
+    BatchView, RespondentTokenView
 from rest_framework import routers
 
 router = routers.SimpleRouter()
@@ -7,10 +8,13 @@ router.register(r'surveys', SurveysViewSet)
 router.register(r'questions', QuestionsViewSet)
 router.register(r'answers', AnswersViewSet)
 router.register(r'choices', ChoicesViewSet)
+router.register(r'_profiles', ProfilesViewSet, basename='profile')
 
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('respondents/', RespondentTokenView.as_view(), name='respondent-token'),
     path('auth/', include('rest_framework.urls')),
     # path('active_surveys/', SurveysActiveAPIList.as_view()),
     # path('auth/', include('djoser.urls')),
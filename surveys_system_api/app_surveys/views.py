@@ -1,19 +1,30 @@
-from django.shortcuts import render
-from rest_framework import viewsets, generics
-from app_surveys.serializers import SurveySerializer, QuestionSerializer, AnswerSerializer, ChoiceSerializer
-from app_surveys.models import Survey, Question, Answer, Choice
-from rest_framework.authtoken.admin import User
-from rest_framework.generics import GenericAPIView
-from rest_framework.mixins import ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, \
-    DestroyModelMixin
-from rest_framework.pagination import PageNumberPagination
-
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from app_surveys.serializers import SurveySerializer, QuestionSerializer, AnswerSerializer, ChoiceSerializer, \
+    BatchSerializer, SurveyCloneSerializer
+from app_surveys.models import Survey, Question, Answer, Choice, QuestionTerm
+
+from rest_framework.permissions import AllowAny, IsAdminUser
 from app_surveys.permissions import IsAdminOrReadOnly
-from datetime import datetime
+from app_surveys.authentication import IsAuthenticatedOrRespondent, get_respondent, make_respondent_token
+from app_surveys.db_routers import PrimaryPinningMixin, answer_shards, use_primary
+from app_surveys.overload import StatementTimeoutMixin
+from app_surveys.throttling import AnswerSubmissionThrottle
+from app_surveys import batch, compression, crosstab, live, metrics, profiling, results, search, sharding, timeline, \
+    warmup
+from app_surveys.renderers import EventStreamRenderer, PrerenderedJSONResponse
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 
-class SurveysViewSet(viewsets.ModelViewSet):
+class SurveysViewSet(PrimaryPinningMixin, StatementTimeoutMixin, viewsets.ModelViewSet):
     """
     Представление для отображения списка опросов, списка активных опросов, создания опроса, его редактирования
     и удаления.
@@ -21,45 +32,329 @@ class SurveysViewSet(viewsets.ModelViewSet):
     queryset = Survey.objects.all()
     serializer_class = SurveySerializer
     permission_classes = (IsAdminOrReadOnly,)
+    # аналитика по всем ответам опроса дольше обычных запросов
+    statement_timeouts = {'results_summary': 30000, 'crosstab': 30000}
 
     def get_queryset(self):
         queryset = Survey.objects.all()
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        if self.action in ('list', 'retrieve'):
+            # вопросы и варианты сериализуются вложенными: без предзагрузки - по запросу на опрос и вопрос
+            queryset = queryset.prefetch_related('questions__choices')
         active = self.request.query_params.get('active')
         if active:
-            queryset = queryset.filter(date_end__gte=datetime.now(), date_start__lte=datetime.now())
+            queryset = queryset.active()
         return queryset
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Описание опроса. JSON отдается из кэша вместе с заранее сжатыми вариантами,
+        чтобы популярные опросы не сериализовались и не сжимались на каждый запрос.
+        Кэш общий для всех процессов, поэтому при промахе опрос читается из основной базы, а не с реплики:
+        отстающая реплика положила бы в кэш устаревшее описание.
+        """
+        if request.accepted_renderer.format != 'json' or request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        survey_id = self.kwargs[self.lookup_field]
+        payloads, data = compression.get_survey_definition(survey_id), None
+        if payloads is None:
+            with use_primary():
+                survey = self.get_object()
+                data = self.get_serializer(survey).data
+            payloads = compression.store_survey_definition(survey.id, JSONRenderer().render(data))
+        response = PrerenderedJSONResponse(payloads['identity'], data=data)
+        response.precompressed = payloads
+        return response
+
+    @action(detail=True, url_path='results/stream', permission_classes=[IsAdminUser],
+            renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def results_stream(self, request, pk=None):
+        """
+        Поток результатов опроса (Server-Sent Events): снимок количества ответов по вариантам,
+        затем изменения по мере сохранения ответов.
+        """
+        survey = self.get_object()
+        snapshot, position = live.snapshot(survey.id)
+        subscription = live.feed.subscribe(survey.id, position)
+        response = StreamingHttpResponse(live.stream_results(survey.id, subscription, snapshot),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser], serializer_class=SurveyCloneSerializer)
+    def clone(self, request, pk=None):
+        """Копия опроса с вопросами и вариантами ответов и новой датой окончания (и, при необходимости, названием)."""
+        survey = self.get_object()
+        serializer = SurveyCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        copy = survey.clone(**serializer.validated_data)
+        copy = Survey.objects.prefetch_related('questions__choices').get(pk=copy.pk)
+        return Response(SurveySerializer(copy, context=self.get_serializer_context()).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, permission_classes=[IsAdminUser], url_path='results', url_name='results')
+    def results_summary(self, request, pk=None):
+        """
+        Итоги опроса: количество ответов по вопросам и вариантам, количество текстовых ответов и респондентов.
+        Итоги завершенного опроса подсчитываются один раз и далее отдаются из сохраненного снимка.
+        """
+        survey = self.get_object()
+        payload, frozen = results.get_results_payload(survey)
+        response = HttpResponse(payload, content_type='application/json')
+        response['X-Results-Frozen'] = 'true' if frozen else 'false'
+        return response
+
+    @action(detail=True, permission_classes=[IsAdminUser])
+    def crosstab(self, request, pk=None):
+        """
+        Таблица сопряженности двух вопросов опроса (?q1=&q2=): как ответили на q2 респонденты,
+        выбравшие каждый из вариантов q1. Параметр filter (ID вариантов через запятую) оставляет
+        только респондентов, выбравших все указанные варианты.
+        """
+        survey = self.get_object()
+        index = crosstab.registry.get(survey.id)
+        choice_questions = {choice_id: question_id
+                            for question_id, choice_ids in index.questions.items() for choice_id in choice_ids}
+
+        def question_param(name):
+            value = request.query_params.get(name, '')
+            if not value.isdigit() or int(value) not in index.questions:
+                raise ValidationError({name: f'В опросе отсутствует вопрос с id = {value}'})
+            return int(value)
+
+        q1, q2 = question_param('q1'), question_param('q2')
+        given = -1
+        for value in filter(None, request.query_params.get('filter', '').split(',')):
+            if not value.isdigit() or int(value) not in choice_questions:
+                raise ValidationError({'filter': f'В опросе отсутствует вариант ответа с id = {value}'})
+            given &= index.respondents.get((choice_questions[int(value)], int(value)), 0)
+
+        choice_texts = dict(Choice.objects.filter(question_id__in=[q1, q2]).values_list('id', 'choice_text'))
+        respondents, rows = index.crosstab(q1, q2, given)
+        return Response({
+            'q1': q1,
+            'q2': q2,
+            'respondents': respondents,
+            'rows': [{
+                'choice': row_choice,
+                'choice_text': choice_texts.get(row_choice),
+                'total': total,
+                'cells': [{'choice': column_choice, 'choice_text': choice_texts.get(column_choice), 'count': count}
+                          for column_choice, count in cells],
+            } for row_choice, total, cells in rows],
+        })
+
+    @action(detail=True, permission_classes=[IsAdminUser])
+    def timeline(self, request, pk=None):
+        """
+        Количество ответов опроса по интервалам (?bucket=minute|hour|day, по умолчанию hour) с since
+        (по умолчанию - начало опроса) до until (по умолчанию - текущий момент); пустые интервалы - с нулем.
+        Читается из счетчиков, которые обновляются при сохранении ответов.
+        """
+        survey = self.get_object()
+        bucket = request.query_params.get('bucket', 'hour')
+        if bucket not in timeline.STEPS:
+            raise ValidationError({'bucket': f'Ожидается одно из значений: {", ".join(timeline.STEPS)}'})
+
+        def datetime_param(name, default):
+            value = request.query_params.get(name)
+            if not value:
+                return default
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValidationError({name: f'Некорректная дата: {value}'})
+            return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+        since, until = datetime_param('since', survey.date_start), datetime_param('until', timezone.now())
+        return Response({
+            'survey': survey.id,
+            'bucket': bucket,
+            'points': timeline.series(survey.id, bucket, since, until),
+        })
 
-class QuestionsViewSet(viewsets.ModelViewSet):
+
+class QuestionsViewSet(PrimaryPinningMixin, StatementTimeoutMixin, viewsets.ModelViewSet):
     """
     Представление для отображения списка вопросов, создания вопроса, его редактирования и удаления.
     """
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    statement_timeouts = {'terms': 15000, 'search_answers': 15000}
+
+    def get_queryset(self):
+        queryset = Question.objects.select_related('survey').prefetch_related('choices')
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        query = self.request.query_params.get('search', '').strip()
+        if query:
+            queryset = search.search_questions(queryset, query)
+        return queryset
+
+    def get_limit(self, default=50, maximum=500):
+        value = self.request.query_params.get('limit', '')
+        if not value:
+            return default
+        if not value.isdigit() or not 0 < int(value) <= maximum:
+            raise ValidationError({'limit': f'Ожидается целое число от 1 до {maximum}'})
+        return int(value)
+
+    @action(detail=True, permission_classes=[IsAdminUser])
+    def terms(self, request, pk=None):
+        """
+        Самые частые слова текстовых ответов на вопрос (?limit=, по умолчанию 50): для каждого слова -
+        количество ответов, в которых оно встречается.
+        """
+        question = self.get_object()
+        terms = (QuestionTerm.objects.filter(question=question)
+                 .order_by('-count', 'term').values('term', 'count')[:self.get_limit()])
+        return Response(list(terms))
 
+    @action(detail=True, url_path='answers/search', permission_classes=[IsAdminUser])
+    def search_answers(self, request, pk=None):
+        """Полнотекстовый поиск по текстовым ответам на вопрос (?q=, ?limit=, по умолчанию 50)."""
+        question = self.get_object()
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Не указана строка поиска'})
+        answers = sharding.for_survey(Answer.objects.filter(question=question), question.survey_id)
+        answers = search.search_answers(answers, query).order_by('-id')
+        serializer = AnswerSerializer(answers[:self.get_limit()], many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
 
-class AnswersViewSet(viewsets.ModelViewSet):
+
+class AnswersViewSet(PrimaryPinningMixin, StatementTimeoutMixin, viewsets.ModelViewSet):
     """
     Представление для отображения списка ответов конкретного пользователя, создания ответа,
-    его редактирования и удаления.
+    его редактирования и удаления. При шардировании ответы пользователя собираются из всех шардов.
     """
     queryset = Answer.objects.all()
     serializer_class = AnswerSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (IsAuthenticatedOrRespondent,)
+    # прием ответов не должен ждать медленных запросов: лучше быстрый 503, чем занятый воркер
+    statement_timeouts = {'create': 1000, 'update': 1000, 'partial_update': 1000}
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            # схема строится без запроса и пользователя
+            return Answer.objects.none()
         user = self.request.user
-        return Answer.objects.filter(user=user)
+        if answer_shards():
+            # пользователи, опросы и вопросы хранятся не в шардах, а в основной базе: соединение с ними невозможно
+            answers = Answer.objects.prefetch_related('user', 'question', 'survey', 'choice')
+        else:
+            answers = Answer.objects.select_related('user', 'question', 'survey', 'choice')
+        if not user.is_authenticated:
+            return answers.filter(respondent=get_respondent(self.request).id, user__isnull=True)
+        return answers.filter(user=user)
+
+    def list(self, request, *args, **kwargs):
+        if not answer_shards():
+            return super().list(request, *args, **kwargs)
+        answers = sharding.gather(self.filter_queryset(self.get_queryset()))
+        return Response(self.get_serializer(answers, many=True).data)
+
+    def get_object(self):
+        if not answer_shards():
+            return super().get_object()
+        # ID не указывает на шард (ответы переносятся между шардами с сохранением ID), поэтому ответ ищется во всех
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        for answers in sharding.scatter(self.filter_queryset(self.get_queryset())):
+            try:
+                answer = answers.filter(**lookup).first()
+            except (TypeError, ValueError, DjangoValidationError):
+                raise Http404
+            if answer is not None:
+                self.check_object_permissions(self.request, answer)
+                return answer
+        raise Http404
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action == 'create':
+            throttles.append(AnswerSubmissionThrottle())
+        return throttles
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        if not self.request.user.is_authenticated:
+            serializer.save(respondent=get_respondent(self.request).id)
+        else:
+            serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        if not Survey.objects.active().filter(id=instance.survey_id).exists():
+            raise ValidationError('Опрос, содержащий данный ответ, завершен.')
+        super().perform_destroy(instance)
 
 
-class ChoicesViewSet(viewsets.ModelViewSet):
+class ChoicesViewSet(PrimaryPinningMixin, StatementTimeoutMixin, viewsets.ModelViewSet):
     """
     Представление для отображения списка вариантов ответов на вопросы, создания варианта, его редактирования и удаления.
     """
-    queryset = Choice.objects.all()
+    queryset = Choice.objects.select_related('question')
     serializer_class = ChoiceSerializer
     permission_classes = (IsAdminOrReadOnly,)
+
+
+class ProfilesViewSet(viewsets.ViewSet):
+    """
+    Представление для просмотра сохраненных профилей запросов. Доступно только администраторам.
+    """
+    permission_classes = (IsAdminUser,)
+    swagger_schema = None
+
+    def list(self, request):
+        summary = [{key: value for key, value in profile.items() if key not in ('queries', 'profile')}
+                   for profile in profiling.store.list()]
+        return Response(summary)
+
+    def retrieve(self, request, pk=None):
+        profile = profiling.store.get(pk)
+        if profile is None:
+            raise NotFound
+        return Response(profile)
+
+
+class RespondentTokenView(APIView):
+    """
+    Выдает подписанный токен анонимного респондента для заголовка X-Respondent-Token.
+    Токен проверяется по подписи: ни сессия, ни строка в базе данных не создаются.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        return Response({'token': make_respondent_token()}, status=status.HTTP_201_CREATED)
+
+
+class BatchView(APIView):
+    """
+    Пакетный запрос: список вложенных запросов к API выполняется за одно обращение клиента.
+    Аутентификация выполняется один раз для всего пакета; права доступа проверяет каждое вложенное представление.
+    С atomic = true все запросы выполняются в одной транзакции и откатываются при первой ошибке.
+    """
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        prefix = reverse('batch')[:-len('batch/')]
+        responses, rolled_back = batch.run_batch(request, serializer.validated_data['requests'], prefix,
+                                                 atomic=serializer.validated_data['atomic'])
+        return Response({'rolled_back': rolled_back, 'responses': responses})
+
+
+def metrics_view(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def readiness_view(request):
+    """
+    Готовность процесса к приему запросов: 503, пока не завершен прогрев или недоступна одна из баз данных
+    (app_surveys.warmup.readiness).
+    """
+    body = warmup.readiness()
+    return JsonResponse(body, status=200 if body['ready'] else 503, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,140 @@
+"""
+Прогрев процесса перед приемом запросов: разбор URLconf, построение полей сериалайзеров и описания
+активных опросов в кэше (вместе с заранее сжатыми вариантами). Вызывается из wsgi.py и asgi.py сразу
+после загрузки приложения, поэтому воркер начинает принимать запросы уже прогретым. Эндпоинт /ready
+отвечает 503, пока прогрев не завершен или недоступна одна из баз данных.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('app_surveys.warmup')
+
+
+class WarmupState:
+    """Состояние прогрева процесса."""
+
+    def __init__(self):
+        self.started_at = None
+        self.finished_at = None
+        self.steps = {}
+        self.errors = []
+
+    @property
+    def ready(self):
+        return self.finished_at is not None
+
+    def as_dict(self):
+        return {
+            'ready': self.ready,
+            'started_at': self.started_at and self.started_at.isoformat(),
+            'finished_at': self.finished_at and self.finished_at.isoformat(),
+            'steps': self.steps,
+            'errors': self.errors,
+        }
+
+
+state = WarmupState()
+
+
+def warm_urls():
+    """Разбирает URLconf, чтобы первый reverse() и resolve() не строили словари маршрутов."""
+    return len(get_resolver().reverse_dict)
+
+
+def warm_serializers():
+    """Строит поля сериалайзеров: ModelSerializer создает их по метаданным моделей при первом обращении."""
+    from app_surveys.serializers import AnswerSerializer, ChoiceSerializer, QuestionSerializer, SurveySerializer
+
+    serializer_classes = (SurveySerializer, QuestionSerializer, ChoiceSerializer, AnswerSerializer)
+    for serializer_class in serializer_classes:
+        serializer_class().fields
+    return len(serializer_classes)
+
+
+def warm_survey_definitions():
+    """
+    Кладет в кэш описания активных опросов (не больше WARMUP_MAX_SURVEYS самых новых).
+    Опросы читаются из основной базы, чтобы в общий кэш не попали устаревшие данные с реплики.
+    """
+    from app_surveys import compression
+    from app_surveys.db_routers import use_primary
+    from app_surveys.models import Survey
+    from app_surveys.serializers import SurveySerializer
+
+    limit = getattr(settings, 'WARMUP_MAX_SURVEYS', 200)
+    surveys = Survey.objects.active().prefetch_related('questions__choices').order_by('-date_start')[:limit]
+    renderer = JSONRenderer()
+    count = 0
+    with use_primary():
+        for survey in surveys:
+            if compression.get_survey_definition(survey.id) is None:
+                # прогрев идет до приема запросов, поэтому описания сжимаются максимальными уровнями
+                data = SurveySerializer(survey).data
+                compression.store_survey_definition(survey.id, renderer.render(data), best=True)
+            count += 1
+    return count
+
+
+STEPS = (
+    ('urls', warm_urls),
+    ('serializers', warm_serializers),
+    ('survey_definitions', warm_survey_definitions),
+)
+
+
+def warm_up():
+    """
+    Выполняет шаги прогрева. Ошибка шага не мешает запуску воркера: она логируется и попадает в ответ
+    /ready, а воркер работает, как без прогрева.
+    """
+    state.started_at = timezone.now()
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            result = step()
+        except Exception as error:
+            logger.exception('Ошибка прогрева на шаге %s', name)
+            state.errors.append(f'{name}: {error}')
+            continue
+        state.steps[name] = {'result': result, 'duration_ms': round((time.perf_counter() - started) * 1000, 3)}
+    # соединения не должны достаться процессам, порожденным fork после загрузки приложения (gunicorn --preload)
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+    state.finished_at = timezone.now()
+    logger.info(json.dumps({'event': 'warmup', **state.as_dict()}, ensure_ascii=False))
+    return state
+
+
+def check_databases():
+    """Доступность баз данных процесса: {алиас: 'ok' или текст ошибки}."""
+    result = {}
+    for connection in connections.all():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError as error:
+            result[connection.alias] = str(error)
+        else:
+            result[connection.alias] = 'ok'
+    return result
+
+
+def readiness():
+    """
+    Ответ /ready: состояние прогрева и доступность баз данных. Процесс готов, когда прогрев завершен
+    (или отключен WARMUP_ON_BOOT) и все базы отвечают.
+    """
+    body = state.as_dict()
+    databases = check_databases()
+    warmed = state.ready or not getattr(settings, 'WARMUP_ON_BOOT', True)
+    body['ready'] = warmed and all(status == 'ok' for status in databases.values())
+    body['databases'] = databases
+    return body
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'surveys_system_api.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_BOOT:
+    # прогрев до того, как сервер передаст воркеру первый запрос
+    from app_surveys.warmup import warm_up  # noqa: E402
+    warm_up()
@@ -0,0 +1,94 @@
+"""
+OpenAPI-схема API.
+
+Схема строится один раз на процесс (или заранее командой generate_openapi_schema в файл OPENAPI_SCHEMA_FILE)
+и отдается готовыми байтами с ETag, без повторного разбора представлений и сериалайзеров.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import condition, require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import UI_RENDERERS, get_schema_view
+from rest_framework import permissions
+from rest_framework.response import Response
+
+API_INFO = openapi.Info(
+    title="SurveySystem API",
+    default_version='v1',
+    description="Система опросов пользователей",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="romses1994@mail.ru"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=[permissions.AllowAny],
+)
+
+
+class SwaggerUIView(schema_view):
+    """
+    Страница Swagger UI.
+
+    Схему страница подгружает сама по SPEC_URL (schema-json), поэтому здесь отдается только каркас с заголовком
+    и версией API, без генератора. Запросы самой схемы (?format=openapi и т.п.) уходят в schema_json_view.
+    """
+    renderer_classes = UI_RENDERERS['swagger']
+
+    def get(self, request, version='', format=None):
+        return Response(openapi.Swagger(info=API_INFO, _prefix='/', paths=openapi.Paths(paths={})))
+
+
+_swagger_ui_page_view = SwaggerUIView.as_view()
+
+
+def swagger_ui_view(request, *args, **kwargs):
+    """Отдает страницу Swagger UI, а запросы самой схемы перенаправляет в кэширующий schema_json_view."""
+    if request.GET.get('format') or 'html' not in request.headers.get('Accept', 'text/html'):
+        return schema_json_view(request)
+    return _swagger_ui_page_view(request, *args, **kwargs)
+
+_lock = threading.Lock()
+_schema = None
+
+
+def generate_schema():
+    """Строит схему разбором всех представлений и сериалайзеров и возвращает ее в виде JSON-байтов."""
+    generator = OpenAPISchemaGenerator(API_INFO)
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+
+def get_schema():
+    """Возвращает пару (JSON-байты схемы, ETag). Схема читается из файла или строится один раз на процесс."""
+    global _schema
+    if _schema is None:
+        with _lock:
+            if _schema is None:
+                path = getattr(settings, 'OPENAPI_SCHEMA_FILE', None)
+                if path and os.path.exists(path):
+                    with open(path, 'rb') as schema_file:
+                        content = schema_file.read()
+                else:
+                    content = generate_schema()
+                _schema = (content, hashlib.sha256(content).hexdigest())
+    return _schema
+
+
+def reset_schema():
+    global _schema
+    _schema = None
+
+
+@require_safe
+@condition(etag_func=lambda request: get_schema()[1])
+def schema_json_view(request):
+    content, _ = get_schema()
+    return HttpResponse(content, content_type='application/json')
@@ -10,9 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 import environ
+import tempfile
 from .profile import Profile
 import os
 
@@ -22,13 +24,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 env = environ.Env()
 profile = os.environ.get('SURVEYS_PROFILE')
-print(f"profile: {profile}")
 
 env_file_name = os.path.join(BASE_DIR, '.env')
 if profile == Profile.LOCAL:
     env_file_name = os.path.join(BASE_DIR, '.local.env')
 
-environ.Env.read_env(env_file_name)  # reading .env file
+if os.path.exists(env_file_name):
+    environ.Env.read_env(env_file_name)  # reading .env file
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
@@ -52,16 +54,25 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'django.contrib.admindocs',
     'app_surveys',
     'rest_framework',
     'rest_framework.authtoken',
-    'djoser',
-    'drf_yasg',
-
 ]
 
+# Документация API (Swagger UI, admindocs). В облегченном профиле воркера (ENABLE_API_DOCS=False или
+# установка только requirements.txt) drf_yasg и admindocs не загружаются и их адреса не подключаются.
+ENABLE_API_DOCS = env.bool('ENABLE_API_DOCS', default=find_spec('drf_yasg') is not None)
+if ENABLE_API_DOCS:
+    INSTALLED_APPS += [
+        'django.contrib.admindocs',
+        'drf_yasg',
+    ]
+
 MIDDLEWARE = [
+    'app_surveys.middleware.MetricsMiddleware',
+    'app_surveys.overload.LoadSheddingMiddleware',
+    'app_surveys.profiling.ProfilingMiddleware',
+    'app_surveys.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,9 +105,105 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+        'app_surveys.authentication.RespondentTokenAuthentication',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'app_surveys.throttling.AnonymousThrottle',
+    ],
+    # 'число/период': емкость корзины и скорость ее восполнения
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': env.str('THROTTLE_ANON_RATE', default='600/min'),
+        'answers': env.str('THROTTLE_ANSWERS_RATE', default='120/min'),
+    },
+}
+
+# Кэш, через который процессы делят корзины ограничения частоты, и период синхронизации с ним (в секундах).
+# Файловый кэш общий для процессов одного хоста; для нескольких хостов - Redis или memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env.str('THROTTLE_CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'surveys_throttle')),
+        # по умолчанию файловый кэш хранит 300 записей и при переполнении вытесняет корзины активных клиентов;
+        # запись корзины удаляется сама через время ее полного восполнения
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('THROTTLE_CACHE_MAX_ENTRIES', default=100000),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # Состояние, которое должны видеть все процессы сервера (закрепление за основной базой после записи,
+    # кэш описаний опросов, который сбрасывается при их изменении).
+    # Файловый кэш общий для процессов одного хоста; для нескольких хостов - memcached (pymemcache://host:11211)
+    'shared': env.cache_url('SHARED_CACHE_URL', default='filecache://{}?MAX_ENTRIES=10000&CULL_FREQUENCY=4'.format(
+        os.path.join(tempfile.gettempdir(), 'surveys_shared'))),
+}
+THROTTLE_CACHE = 'throttle'
+SHARED_CACHE = 'shared'
+THROTTLE_SYNC_INTERVAL = env.float('THROTTLE_SYNC_INTERVAL', default=1.0)
+
+# Срок действия токена анонимного респондента (в секундах)
+RESPONDENT_TOKEN_MAX_AGE = env.int('RESPONDENT_TOKEN_MAX_AGE', default=30 * 24 * 3600)
+
+# Защита от перегрузки: лимит времени SQL-запроса представления по умолчанию (в миллисекундах, 0 - без лимита),
+# число одновременно обрабатываемых процессом запросов, сверх которого запросы отклоняются с 503 (0 - без лимита),
+# и значение заголовка Retry-After (в секундах)
+DB_STATEMENT_TIMEOUT_MS = env.int('DB_STATEMENT_TIMEOUT_MS', default=5000)
+LOAD_SHEDDING_MAX_IN_FLIGHT = env.int('LOAD_SHEDDING_MAX_IN_FLIGHT', default=100)
+LOAD_SHEDDING_RETRY_AFTER = env.int('LOAD_SHEDDING_RETRY_AFTER', default=1)
+
+# Запросы дольше этого порога (в секундах) логируются в формате JSON; 0 - не логировать
+METRICS_SLOW_REQUEST_SECONDS = env.float('METRICS_SLOW_REQUEST_SECONDS', default=1.0)
+
+# Профилирование запросов: доля случайно профилируемых запросов, размер кольцевого буфера профилей в общем кэше
+# и срок действия подписанного заголовка X-Profile (в секундах)
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+PROFILING_BUFFER_SIZE = env.int('PROFILING_BUFFER_SIZE', default=50)
+PROFILING_TOKEN_MAX_AGE = env.int('PROFILING_TOKEN_MAX_AGE', default=3600)
+
+# Заранее сгенерированная OpenAPI-схема (manage.py generate_openapi_schema).
+# Если файла нет, схема строится один раз при первом обращении.
+OPENAPI_SCHEMA_FILE = env.str('OPENAPI_SCHEMA_FILE', default=os.path.join(BASE_DIR, 'openapi.json'))
+
+# Swagger UI загружает схему из кэшируемого представления вместо построения ее на каждый запрос
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'schema-json',
 }
 
+# Поток результатов опроса (SSE): интервал keepalive-комментариев (в секундах)
+# и максимальная очередь изменений одного клиента
+RESULTS_STREAM_HEARTBEAT_SECONDS = env.int('RESULTS_STREAM_HEARTBEAT_SECONDS', default=15)
+RESULTS_STREAM_QUEUE_SIZE = env.int('RESULTS_STREAM_QUEUE_SIZE', default=1000)
+# Изменения публикуются через общий кэш (SHARED_CACHE): как часто подписчик проверяет новые изменения
+# и сколько изменение хранится для отстающих подписчиков (в секундах)
+RESULTS_STREAM_POLL_SECONDS = env.float('RESULTS_STREAM_POLL_SECONDS', default=0.5)
+RESULTS_STREAM_RETENTION_SECONDS = env.int('RESULTS_STREAM_RETENTION_SECONDS', default=300)
+
+# Индексы таблиц сопряженности: срок жизни индекса опроса (в секундах) и количество индексов в процессе
+CROSSTAB_INDEX_TTL = env.int('CROSSTAB_INDEX_TTL', default=60)
+CROSSTAB_INDEX_MAX_SURVEYS = env.int('CROSSTAB_INDEX_MAX_SURVEYS', default=100)
+
+# Наибольшее количество интервалов в ответе /api/surveys/{id}/timeline/: более ранние интервалы отбрасываются
+TIMELINE_MAX_POINTS = env.int('TIMELINE_MAX_POINTS', default=1000)
+
+# Ответы меньше этого размера (в байтах) не сжимаются; срок хранения описания опроса в кэше (в секундах)
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=500)
+SURVEY_CACHE_SECONDS = env.int('SURVEY_CACHE_SECONDS', default=300)
+
+# Начиная с этого количества строк (по оценке планировщика PostgreSQL) админка не выполняет точный COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100_000)
+
+# Максимальное количество вложенных запросов в пакетном запросе /api/batch/
+BATCH_MAX_REQUESTS = env.int('BATCH_MAX_REQUESTS', default=50)
+
+# Через сколько дней после окончания опроса его ответы переносятся в архив командой archive_answers
+ANSWER_ARCHIVE_AFTER_DAYS = env.int('ANSWER_ARCHIVE_AFTER_DAYS', default=90)
+
+# Прогрев воркера при загрузке WSGI- или ASGI-приложения и сколько активных опросов положить в кэш при прогреве
+WARMUP_ON_BOOT = env.bool('WARMUP_ON_BOOT', default=True)
+WARMUP_MAX_SURVEYS = env.int('WARMUP_MAX_SURVEYS', default=200)
+
 WSGI_APPLICATION = 'surveys_system_api.wsgi.application'
 
 # Database
@@ -113,6 +220,31 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: по одной на каждый хост из POSTGRES_REPLICA_HOSTS.
+# В тестах реплики зеркалируют основную базу.
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(env.list('POSTGRES_REPLICA_HOSTS', default=[])):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': replica_host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+# Шарды ответов: ответы и архивные ответы опроса хранятся в одном шарде (app_surveys.sharding).
+# Шард 0 - основная база, остальные - по одному на каждый хост из POSTGRES_ANSWER_SHARD_HOSTS. Номер шарда задает
+# диапазон ID его ответов, поэтому новые хосты добавляются только в конец списка; после добавления шарда
+# на нем выполняется migrate --database answers_N, а ответы переносятся командой rebalance_answers.
+ANSWER_SHARDS = []
+for index, shard_host in enumerate(env.list('POSTGRES_ANSWER_SHARD_HOSTS', default=[]), start=1):
+    alias = f'answers_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': shard_host}
+    ANSWER_SHARDS.append(alias)
+if ANSWER_SHARDS:
+    ANSWER_SHARDS.insert(0, 'default')
+
+DATABASE_ROUTERS = ['app_surveys.db_routers.AnswerShardRouter', 'app_surveys.db_routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=5)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
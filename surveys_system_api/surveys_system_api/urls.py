@@ -13,30 +13,39 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
-
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="SurveySystem API",
-        default_version='v1',
-        description="Система опросов пользователей",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="romses1994@mail.ru"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
-
-
-urlpatterns = [
-    path('admin/doc/', include('django.contrib.admindocs.urls')),
+from django.utils.module_loading import import_string
+from app_surveys.views import metrics_view, readiness_view
+
+
+def lazy_view(dotted_path):
+    """Импортирует представление при первом обращении, а не при загрузке URLconf."""
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path)
+        return view(request, *args, **kwargs)
+
+    wrapper.__name__ = dotted_path.rsplit('.', 1)[-1]
+    return wrapper
+
+
+urlpatterns = []
+
+if settings.ENABLE_API_DOCS:
+    urlpatterns += [
+        path('admin/doc/', include('django.contrib.admindocs.urls')),
+        path('swagger.json', lazy_view('surveys_system_api.schema.schema_json_view'), name='schema-json'),
+        path('swagger/', lazy_view('surveys_system_api.schema.swagger_ui_view'), name='schema-swagger-ui'),
+    ]
+
+urlpatterns += [
     path('admin/', admin.site.urls),
     path('api/', include('app_surveys.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui')
+    path('metrics', metrics_view, name='metrics'),
+    path('ready', readiness_view, name='readiness'),
 ]